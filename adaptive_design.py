@@ -0,0 +1,364 @@
+"""
+Adaptive scheduling for holiday_test_v3.run_experiment (ADAPTIVE_MODE).
+
+The run goes in blocks of BLOCK_REPS reps per open cell (model x prime x task).
+After each block the finished rows are read back and every prime is compared
+with REFERENCE_PRIME in each model x task on METRIC - a run column (cheap
+proxies like output_tokens or char_count) or a graded score taken from
+GRADED_CSV (e.g. the graded_<run id>.csv pipeline.py writes while the run goes).
+With a graded score the look waits until every trial of the block has been
+graded (up to GRADE_WAIT_SEC), so no decision is made on a partly graded block.
+
+"sequential": each contrast gets an always-valid confidence sequence (normal
+mixture mSPRT, Johari et al.), so looking after every block doesn't inflate the
+error rate. A contrast is settled as an effect once the sequence excludes 0 at
+ALPHA, as no effect once it lies inside +/- EQUIVALENCE_SD pooled SDs, or as
+futile once even diff + FUTILITY_Z standard errors couldn't make the sequence
+exclude 0 by the N_PER_CELL cap (a non-binding futility stop: it can only
+lower the false-positive rate). A settled prime cell gets no more trials; the
+reference cell stops once every contrast in its task is settled.
+
+"neyman": the same total number of trials (cells x N_PER_CELL), but after the
+pilot block each block goes to the cells whose means are least precise - one
+trial at a time to the cell with the biggest drop in sd^2/n, i.e. Neyman
+allocation n ~ sd in whole trials - with the SDs re-estimated after every block
+and at most MAX_PER_CELL_FACTOR x N_PER_CELL per cell.
+
+Every interim look is appended to the interim CSV (one row per contrast or
+cell per block), so the analysis can see when and why each cell stopped or
+grew.
+"""
+
+import csv
+import heapq
+import math
+import os
+import random
+import statistics
+import time
+
+# === CONFIGURATION ===
+BLOCK_REPS = 5             # reps per open cell per block; the first block is the pilot
+METRIC = "output_tokens"   # run column (output_tokens, char_count, ...) or a score column in GRADED_CSV
+GRADED_CSV = None          # graded CSV for a score METRIC (None = the runner's graded_<run id>.csv)
+GRADER = None              # with a grader ensemble, use only this grader_model's scores (None = first seen)
+GRADE_WAIT_SEC = 1800      # score METRIC: how long a look waits for the block's grades before going without them
+GRADE_POLL_SEC = 10
+GRADED_CSV_GRACE_SEC = 60  # ... but only this long for the graded CSV to appear at all (pipeline.py creates it up front)
+REFERENCE_PRIME = "null"
+ALPHA = 0.05               # per contrast, valid at every interim look
+TAU_SD = 0.5               # mixture prior scale for the effect, in pooled SDs
+EQUIVALENCE_SD = 0.25      # settle as "no effect" once the whole sequence is inside +/- this many SDs
+FUTILITY_Z = 1.0           # settle as "futile" once diff + this many SEs couldn't exclude 0 by the cap (None = off)
+
+MAX_PER_CELL_FACTOR = 3    # "neyman": no cell gets more than this x its planned reps
+
+INTERIM_FIELDS = ["block", "model", "task", "prime", "n_prime", "n_reference", "diff", "cs_low", "cs_high",
+                  "pooled_sd", "decision"]
+ALLOCATION_FIELDS = ["block", "model", "prime", "task", "n", "sd", "neyman_target", "scheduled"]
+
+
+def cell_of(trial) -> tuple:
+    """(model, prime, task) of a trial tuple (model, prime, task, trial_num)."""
+    return tuple(trial[:3])
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def load_grades(graded_csv: str, metric: str = METRIC) -> dict:
+    """(model, case_id) -> METRIC score from a graded CSV, None for a failed grading; {} until the file exists."""
+    grades = {}
+    if not graded_csv or not os.path.exists(graded_csv):
+        return grades
+    with open(graded_csv, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames:
+            return grades  # created, header not written yet
+        if metric not in reader.fieldnames:
+            raise ValueError(f"METRIC {metric!r} is neither a run column nor a column of {graded_csv}")
+        for g in reader:
+            if GRADER in (None, g.get("grader_model")):
+                key = (g.get("model"), g.get("case_id"))
+                if grades.get(key) is None:
+                    grades[key] = _to_float(g.get(metric))
+    return grades
+
+
+def metric_values(rows: list, metric: str = METRIC, graded_csv: str = None) -> dict:
+    """(model, prime, task) -> list of METRIC values for the finished rows."""
+    scores = None
+    if rows and metric not in rows[0]:
+        if not graded_csv:
+            raise ValueError(f"METRIC {metric!r} isn't a run column and there's no graded CSV to read it from")
+        scores = load_grades(graded_csv, metric)
+    values = {}
+    for row in rows:
+        value = _to_float(row.get(metric)) if scores is None else scores.get((row.get("model"), row.get("case_id")))
+        if value is not None:
+            values.setdefault((row["model"], row["prime"], row["task"]), []).append(value)
+    return values
+
+
+def block_values(block: list, finished_rows, log=print, graded_csv: str = None) -> dict:
+    """metric_values() for an interim look after a block, once the block's trials are graded.
+
+    A run column is there as soon as the trial is. A score only shows up when
+    the grader gets to it, so this polls graded_csv until every successful trial
+    of the block has a row there (failed gradings count) or GRADE_WAIT_SEC runs out.
+    No graded_csv within GRADED_CSV_GRACE_SEC means nothing is grading: ValueError.
+    """
+    rows = finished_rows()
+    if rows and METRIC not in rows[0] and graded_csv:  # (no graded_csv: metric_values raises)
+        trials = {tuple(t) for t in block}
+        keys = [(r.get("model"), r.get("case_id")) for r in rows
+                if (r["model"], r["prime"], r["task"], int(r["trial_num"])) in trials]
+        start = time.monotonic()
+        while True:
+            if not os.path.exists(graded_csv) and time.monotonic() - start >= GRADED_CSV_GRACE_SEC:
+                raise ValueError(f"No {graded_csv} after {GRADED_CSV_GRACE_SEC}s - is pipeline.py grading this run?")
+            grades = load_grades(graded_csv)
+            n_missing = sum(1 for k in keys if k not in grades)
+            if not n_missing:
+                break
+            if time.monotonic() - start >= GRADE_WAIT_SEC:
+                log(f"⚠ {n_missing} trials of the block still ungraded after {GRADE_WAIT_SEC}s - looking without them")
+                break
+            time.sleep(GRADE_POLL_SEC)
+    return metric_values(rows, METRIC, graded_csv)
+
+
+def confidence_sequence(x: list, y: list, alpha: float = ALPHA, tau_sd: float = TAU_SD):
+    """Always-valid CS for mean(x) - mean(y): (diff, low, high, pooled_sd).
+
+    Inverts the two-sample normal-mixture SPRT with mixing N(0, tau^2) on the
+    difference and the pooled variance plugged in; (-inf, inf) until both
+    sides have 2 values and some spread.
+    """
+    n1, n2 = len(x), len(y)
+    if n1 < 2 or n2 < 2:
+        return None, -math.inf, math.inf, None
+    m1, m2 = sum(x) / n1, sum(y) / n2
+    ss = sum((v - m1) ** 2 for v in x) + sum((v - m2) ** 2 for v in y)
+    var = ss / (n1 + n2 - 2)
+    diff = m1 - m2
+    if var <= 0:
+        return diff, -math.inf, math.inf, 0.0
+    half = half_width(var, n1, n2, alpha, tau_sd)
+    return diff, diff - half, diff + half, math.sqrt(var)
+
+
+def half_width(var: float, n1: int, n2: int, alpha: float = ALPHA, tau_sd: float = TAU_SD) -> float:
+    """Half-width of the mixture-SPRT confidence sequence at sample sizes n1, n2."""
+    v = var * (1 / n1 + 1 / n2)
+    tau2 = tau_sd ** 2 * var
+    return math.sqrt(2 * v * (v + tau2) / tau2 * (math.log(1 / alpha) + 0.5 * math.log((v + tau2) / v)))
+
+
+def decide(diff, low: float, high: float, pooled_sd, n: tuple, cap: tuple) -> str:
+    """effect / no effect / futile / open for one contrast; n and cap are (prime, reference) sizes."""
+    if low > 0 or high < 0:
+        return "effect"
+    if not pooled_sd:
+        return "open"
+    if -EQUIVALENCE_SD * pooled_sd < low and high < EQUIVALENCE_SD * pooled_sd:
+        return "no effect"
+    if FUTILITY_Z is not None and (cap[0] > n[0] or cap[1] > n[1]):
+        se = pooled_sd * math.sqrt(1 / n[0] + 1 / n[1])
+        if abs(diff) + FUTILITY_Z * se < half_width(pooled_sd ** 2, *cap):
+            return "futile"
+    return "open"
+
+
+class InterimLog:
+    """Appends interim rows to a CSV (header only when the file is new)."""
+
+    def __init__(self, path: str, fieldnames: list):
+        self.path = path
+        self.fieldnames = fieldnames
+
+    def write(self, rows: list):
+        if not self.path or not rows:
+            return
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            if new:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+def run_sequential(trials: list, run_block, finished_rows, log=print, interim_csv: str = None,
+                   graded_csv: str = None) -> int:
+    """Run trials in blocks, stopping cells whose contrasts are settled.
+
+    run_block(trials) runs a list of trials and returns how many the budget cap
+    left unscheduled; finished_rows() returns every successful row so far
+    (resumed ones included). Returns the number of trials left unscheduled by
+    the budget cap (trials skipped because a cell stopped aren't counted).
+    """
+    pending = {}
+    for t in sorted(trials, key=lambda t: t[3]):
+        pending.setdefault(cell_of(t), []).append(t)
+    decisions = {}  # (model, task, prime) -> "effect" / "no effect" / "futile"
+    interim = InterimLog(interim_csv, INTERIM_FIELDS)
+
+    def cell_open(cell):
+        model, prime, task = cell
+        if prime != REFERENCE_PRIME:
+            return (model, task, prime) not in decisions
+        contrasts = [c for c in pending if c[0] == model and c[2] == task and c[1] != REFERENCE_PRIME]
+        return not contrasts or any((model, task, c[1]) not in decisions for c in contrasts)
+
+    block = 0
+    while True:
+        open_cells = [c for c, ts in pending.items() if ts and cell_open(c)]
+        if not open_cells:
+            break
+        block += 1
+        batch = []
+        for cell in open_cells:
+            batch += pending[cell][:BLOCK_REPS]
+            pending[cell] = pending[cell][BLOCK_REPS:]
+        random.shuffle(batch)
+        log(f"── Block {block}: {len(batch)} trials over {len(open_cells)} open cells")
+        n_unscheduled = run_block(batch)
+        if n_unscheduled:
+            return n_unscheduled + sum(len(pending[c]) for c in open_cells)
+
+        values = block_values(batch, finished_rows, log, graded_csv)
+        cap = {c: len(values.get(c, [])) + len(pending.get(c, [])) for c in pending}
+        interim_rows = []
+        for model, prime, task in sorted(pending):
+            if prime == REFERENCE_PRIME or (model, task, prime) in decisions:
+                continue
+            x = values.get((model, prime, task), [])
+            y = values.get((model, REFERENCE_PRIME, task), [])
+            diff, low, high, sd = confidence_sequence(x, y)
+            reference = (model, REFERENCE_PRIME, task)
+            decision = decide(diff, low, high, sd, (len(x), len(y)),
+                              (cap[model, prime, task], cap.get(reference, len(y))))
+            if decision != "open":
+                decisions[(model, task, prime)] = decision
+                log(f"  ✓ {task}/{prime} vs {REFERENCE_PRIME}: {decision} on {METRIC} after {len(x)}/{len(y)} "
+                    f"(diff {diff:+.1f}, CS [{low:+.1f}, {high:+.1f}])")
+            interim_rows.append({
+                "block": block, "model": model, "task": task, "prime": prime, "n_prime": len(x),
+                "n_reference": len(y), "diff": "" if diff is None else round(diff, 3),
+                "cs_low": round(low, 3), "cs_high": round(high, 3),
+                "pooled_sd": "" if sd is None else round(sd, 3), "decision": decision,
+            })
+        interim.write(interim_rows)
+
+    saved = sum(len(ts) for ts in pending.values())
+    n_open = sum(1 for (model, prime, task) in pending
+                 if prime != REFERENCE_PRIME and (model, task, prime) not in decisions)
+    log(f"Sequential stop: {len(decisions)} contrasts settled, {n_open} still open at N_PER_CELL; "
+        f"{saved} of {len(trials)} planned trials not needed")
+    return 0
+
+
+def neyman_allocation(n: dict, sd: dict, n_new: int, cap: dict) -> dict:
+    """Split n_new more trials over cells, each to the cell whose sd^2/n drops the most."""
+    heap = [(-sd[c] ** 2 / (n[c] * (n[c] + 1)) if n[c] else -math.inf, c) for c in n if n[c] < cap[c]]
+    heapq.heapify(heap)
+    extra = {c: 0 for c in n}
+    for _ in range(n_new):
+        if not heap:
+            break
+        _, c = heapq.heappop(heap)
+        extra[c] += 1
+        k = n[c] + extra[c]
+        if k < cap[c]:
+            heapq.heappush(heap, (-sd[c] ** 2 / (k * (k + 1)), c))
+    return extra
+
+
+def run_neyman(trials: list, run_block, finished_rows, log=print, interim_csv: str = None,
+               graded_csv: str = None) -> int:
+    """Run a pilot block, then hand out the rest of the trial budget by observed cell SD.
+
+    Same run_block/finished_rows contract as run_sequential. The budget is the
+    number of trials still to run, len(trials); rows already finished (a resume)
+    aren't part of it, but they count towards each cell's n and its cap, which
+    is MAX_PER_CELL_FACTOR x (finished + still to run) for that cell. Trials
+    beyond a cell's plan get the next trial numbers. Returns the number of
+    trials left unscheduled by the budget cap.
+    """
+    pending = {}
+    for t in sorted(trials, key=lambda t: t[3]):
+        pending.setdefault(cell_of(t), []).append(t)
+    cells = sorted(pending)
+    done = finished_rows()
+    done_nums = {c: [] for c in cells}
+    for r in done:
+        if (r["model"], r["prime"], r["task"]) in done_nums:
+            done_nums[r["model"], r["prime"], r["task"]].append(int(r["trial_num"]))
+    next_num = {c: max([t[3] for t in pending[c]] + done_nums[c]) + 1 for c in cells}
+    cap = {c: MAX_PER_CELL_FACTOR * (len(pending[c]) + len(done_nums[c])) for c in cells}
+    budget = len(trials)
+    history = InterimLog(interim_csv, ALLOCATION_FIELDS)
+
+    def take(cell, k):
+        out = pending[cell][:k]
+        pending[cell] = pending[cell][k:]
+        for _ in range(k - len(out)):
+            out.append(cell + (next_num[cell],))
+            next_num[cell] += 1
+        return out
+
+    block = 0
+    values = metric_values(done, METRIC, graded_csv)
+    n = {c: len(values.get(c, [])) for c in cells}
+    while budget > 0:
+        block += 1
+        sds = {c: statistics.stdev(values[c]) for c in cells if len(values.get(c, [])) >= 2}
+        fallback = statistics.median(sds.values()) if sds else 1.0
+        sd = {c: sds.get(c) or fallback for c in cells}
+        if min(n.values()) < BLOCK_REPS:
+            # pilot: bring every cell up to BLOCK_REPS before trusting its SD
+            extra = {c: min(max(0, BLOCK_REPS - n[c]), cap[c] - n[c]) for c in cells}
+            kind = "pilot"
+        else:
+            extra = neyman_allocation(n, sd, min(budget, BLOCK_REPS * len(cells)), cap)
+            kind = "Neyman"
+        while sum(extra.values()) > budget:  # pilot bigger than what's left
+            extra[max(extra, key=extra.get)] -= 1
+        if not sum(extra.values()):
+            log(f"Every cell at its cap ({MAX_PER_CELL_FACTOR}x plan) - {budget} trials of the budget not used")
+            break
+
+        total_sd = sum(sd.values())
+        total_n = sum(n.values()) + budget
+        history.write([{
+            "block": block, "model": c[0], "prime": c[1], "task": c[2], "n": n[c],
+            "sd": round(sd[c], 3), "neyman_target": round(total_n * sd[c] / total_sd, 1) if total_sd else "",
+            "scheduled": extra[c],
+        } for c in cells])
+
+        batch = [t for c in cells for t in take(c, extra[c])]
+        random.shuffle(batch)
+        msg = f"── Block {block} ({kind}): {len(batch)} trials, {budget - len(batch)} left after it"
+        if kind == "Neyman":
+            busiest = sorted((c for c in cells if extra[c]), key=lambda c: -extra[c])[:3]
+            msg += "; most to " + ", ".join(f"{c[2]}/{c[1]} +{extra[c]} (sd {sd[c]:.1f})" for c in busiest)
+        log(msg)
+        n_unscheduled = run_block(batch)
+        budget -= len(batch) - n_unscheduled
+        if n_unscheduled:
+            return n_unscheduled + budget
+        values = block_values(batch, finished_rows, log, graded_csv)
+        n = {c: len(values.get(c, [])) for c in cells}
+
+    sds = {c: statistics.stdev(values[c]) for c in cells if len(values.get(c, [])) >= 2}
+    if sds and all(n[c] for c in sds):
+        adaptive = sum(sds[c] ** 2 / n[c] for c in sds)
+        equal = sum(sds[c] ** 2 / (sum(n[k] for k in sds) / len(sds)) for c in sds)
+        log(f"Neyman allocation: {min(n.values())}-{max(n.values())} reps per cell; summed variance of the cell "
+            f"means {100 * (1 - adaptive / equal):.0f}% below equal allocation with the same {sum(n.values())} trials")
+    return 0
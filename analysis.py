@@ -0,0 +1,407 @@
+"""
+Prime x task analysis of the graded data, in NumPy.
+
+Loads a graded CSV (default: the merged master) or a results_store directory and
+reports, for each score column:
+
+  * cell means (prime x task) with n and SD, and prime marginals
+  * two-way ANOVA (prime, task, prime x task; grader_batch / phase as blocking
+    factors when they vary) with Type III sums of squares, F p-values,
+    partial eta^2 and omega^2
+  * each prime against REFERENCE_PRIME: mean difference, Cohen's d, and a
+    permutation p-value
+  * an omnibus permutation test for the prime effect
+
+Permutations shuffle prime labels within strata (task, plus the covariates), so
+task and batch differences can't leak into the prime effect. All N_PERMUTATIONS
+are done as batched array operations, and one permutation batch serves every score
+column and every contrast.
+
+    python analysis.py                                   # merged master CSV
+    python analysis.py data/graded_20251211_135942.csv --report logs/analysis.txt
+    python analysis.py results_store --perms 20000 --no-covariates
+"""
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+# === CONFIGURATION ===
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT = os.path.join(HERE, "merged_graded_minimal_with_batch.csv")  # CSV or results_store dir
+
+SCORE_COLUMNS = ["content_score", "reasoning_score", "communication_score", "total_score"]
+FACTOR_A = "prime"
+FACTOR_B = "task"
+COVARIATES = ("grader_batch", "phase")  # used as blocking factors when present with more than one level
+REFERENCE_PRIME = ("null", "none")  # first of these found in the data (the runner writes "null")
+
+N_PERMUTATIONS = 100_000
+PERM_CHUNK = 10_000   # permutations per batch (memory: chunk x stratum size)
+SEED = 20251225
+
+
+# =========================
+# DISTRIBUTIONS
+# =========================
+
+def _beta_cf(a: float, b: float, x: float) -> float:
+    """Continued fraction for the incomplete beta function (modified Lentz)."""
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        for numerator in (m * (b - m) * x / ((a + m2 - 1) * (a + m2)),
+                          -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-14:
+            break
+    return h
+
+
+def betainc(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(log_front) * _beta_cf(a, b, x) / a
+    return 1.0 - math.exp(log_front) * _beta_cf(b, a, 1.0 - x) / b
+
+
+def f_sf(f: float, df1: float, df2: float) -> float:
+    """P(F >= f) for an F(df1, df2) variable."""
+    if not f > 0:
+        return 1.0
+    return betainc(df2 / 2.0, df1 / 2.0, df2 / (df2 + df1 * f))
+
+
+# =========================
+# DATA
+# =========================
+
+def load_table(path: str, columns: list) -> dict:
+    """Requested columns as arrays (scores float64, NaN = missing; labels str) from a CSV or store dir."""
+    if os.path.isdir(path):
+        import results_store
+        with np.load(os.path.join(path, results_store.COLUMNS_FILE), allow_pickle=False) as data:
+            present = [c for c in columns if c in data.files]
+        table = results_store.load_columns(path, present)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            present = [c for c in columns if c in (reader.fieldnames or [])]
+            values = {c: [] for c in present}
+            for row in reader:
+                for c in present:
+                    values[c].append(row[c])
+        table = {}
+        for c, vals in values.items():
+            if c in SCORE_COLUMNS:
+                table[c] = np.array([float(v) if v not in ("", "None") else np.nan for v in vals])
+            else:
+                table[c] = np.array(vals, dtype=str)
+    for c in present:
+        if c not in SCORE_COLUMNS:
+            table[c] = table[c].astype(str)
+    return table
+
+
+def load_answers(path: str, grader_model: str = None, model: str = None):
+    """One row per graded answer with all four scores.
+
+    Returns (table restricted to those rows, notes, rows dropped). Long-format
+    ensemble files have a row per grader, so unless grader_model/model are given
+    the most common value of each is used (and noted).
+    """
+    table = load_table(path, SCORE_COLUMNS + [FACTOR_A, FACTOR_B, "grader_model", "model"] + list(COVARIATES))
+    n_loaded = len(table[FACTOR_A])
+    notes = []
+    keep = np.ones(n_loaded, dtype=bool)
+    for column, wanted in (("grader_model", grader_model), ("model", model)):
+        if column not in table:
+            continue
+        levels, counts = np.unique(table[column], return_counts=True)
+        if wanted is None and len(levels) > 1:
+            wanted = str(levels[counts.argmax()])
+            notes.append(f"NOTE: {len(levels)} values of {column} - using {wanted} (choose with --{column.replace('_', '-')})")
+        if wanted is not None:
+            keep &= table[column] == wanted
+    keep &= ~np.isnan(np.column_stack([table[c] for c in SCORE_COLUMNS])).any(axis=1)
+    return {c: values[keep] for c, values in table.items()}, notes, n_loaded - int(keep.sum())
+
+
+def encode(labels: np.ndarray):
+    """(levels, integer codes) for a label column."""
+    levels, codes = np.unique(labels, return_inverse=True)
+    return [str(level) for level in levels], codes
+
+
+def reference_index(levels: list) -> int:
+    """Position of the reference prime among the prime levels; ValueError if it's not in the data."""
+    names = (REFERENCE_PRIME,) if isinstance(REFERENCE_PRIME, str) else REFERENCE_PRIME
+    for name in names:
+        if name in levels:
+            return levels.index(name)
+    raise ValueError(f"Reference prime {' / '.join(names)} not in the data ({FACTOR_A}: {', '.join(levels)})")
+
+
+def effect_columns(codes: np.ndarray, n_levels: int) -> np.ndarray:
+    """Sum-to-zero (effect) coding: n x (levels - 1), last level coded -1."""
+    x = np.zeros((len(codes), max(n_levels - 1, 0)))
+    for level in range(n_levels - 1):
+        x[:, level] = (codes == level).astype(float) - (codes == n_levels - 1)
+    return x
+
+
+# =========================
+# ANALYSES
+# =========================
+
+def cell_stats(y: np.ndarray, a: np.ndarray, b: np.ndarray, n_a: int, n_b: int):
+    """(n, mean, sd) arrays of shape (n_a, n_b)."""
+    flat = a * n_b + b
+    size = n_a * n_b
+    n = np.bincount(flat, minlength=size).astype(float)
+    s = np.bincount(flat, weights=y, minlength=size)
+    ss = np.bincount(flat, weights=y * y, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / n
+        var = (ss - n * mean ** 2) / (n - 1)
+    sd = np.sqrt(np.clip(var, 0, None))
+    return n.reshape(n_a, n_b), mean.reshape(n_a, n_b), sd.reshape(n_a, n_b)
+
+
+def anova(y: np.ndarray, blocks: dict) -> list:
+    """Type III ANOVA by model comparison. blocks = {source: design columns}, in table order.
+
+    Returns rows (source, SS, df, MS, F, p, partial eta^2, omega^2) plus a final
+    ("Residual", SS, df, MS, ...) row. Degrees of freedom come from matrix rank,
+    so a covariate that's aliased with another factor gets df 0 instead of a bogus F.
+    """
+    n = len(y)
+    full = np.column_stack([np.ones(n)] + list(blocks.values()))
+
+    def rss(x):
+        coef, _, rank, _ = np.linalg.lstsq(x, y, rcond=None)
+        resid = y - x @ coef
+        return float(resid @ resid), rank
+
+    rss_full, rank_full = rss(full)
+    df_error = n - rank_full
+    ms_error = rss_full / df_error if df_error > 0 else math.nan
+
+    rows = []
+    for source in blocks:
+        reduced = np.column_stack([np.ones(n)] + [x for s, x in blocks.items() if s != source])
+        rss_reduced, rank_reduced = rss(reduced)
+        df = rank_full - rank_reduced
+        ss = max(rss_reduced - rss_full, 0.0)
+        if df == 0 or df_error <= 0:
+            rows.append((source, ss, df, math.nan, math.nan, math.nan, math.nan, math.nan))
+            continue
+        ms = ss / df
+        f = ms / ms_error if ms_error > 0 else math.inf
+        eta = ss / (ss + rss_full) if ss + rss_full > 0 else math.nan
+        omega = (ss - df * ms_error) / (ss + (n - df) * ms_error) if ms_error > 0 else math.nan
+        rows.append((source, ss, df, ms, f, f_sf(f, df, df_error), eta, max(omega, 0.0)))
+    rows.append(("Residual", rss_full, df_error, ms_error, math.nan, math.nan, math.nan, math.nan))
+    return rows
+
+
+def permutation_test(ys: np.ndarray, groups: np.ndarray, n_groups: int, strata: np.ndarray,
+                     reference: int, n_perm: int, seed: int = SEED, chunk: int = PERM_CHUNK) -> dict:
+    """Stratified permutation test of the group factor, for several outcomes at once.
+
+    ys: n x m (one column per outcome). Group labels are shuffled within each
+    stratum. Statistics per outcome: the within-strata between-group sum of
+    squares (omnibus), and the difference of each group's mean from the
+    reference group's (two-sided). Returns p-values {"omnibus": (m,),
+    "contrast": (n_groups, m)}, with the reference row NaN.
+    """
+    rng = np.random.default_rng(seed)
+    n, m = ys.shape
+    members = [np.flatnonzero(strata == s) for s in np.unique(strata)]
+
+    def group_sums(labels_by_stratum):
+        """(B, n_strata, n_groups, m) sums of y per stratum and group.
+
+        One (B x stratum) indicator matrix per group times the stratum's (stratum x m)
+        scores - a plain matrix product, so all B permutations and all outcomes go
+        through BLAS in one call.
+        """
+        return np.stack([
+            np.stack([(labels == g).astype(ys.dtype) @ ys[idx] for g in range(n_groups)], axis=1)
+            for labels, idx in zip(labels_by_stratum, members)
+        ], axis=1)
+
+    counts = np.array([np.bincount(groups[idx], minlength=n_groups) for idx in members], dtype=float)
+    total_counts = counts.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_counts = np.where(counts > 0, 1.0 / counts, 0.0)
+        inv_total = np.where(total_counts > 0, 1.0 / total_counts, np.nan)
+
+    def statistics(sums):
+        omnibus = np.einsum("bsgo,sg->bo", sums ** 2, inv_counts)
+        means = sums.sum(axis=1) * inv_total[None, :, None]
+        return omnibus, means - means[:, reference:reference + 1, :]
+
+    observed_omnibus, observed_diff = statistics(group_sums([groups[idx][None, :] for idx in members]))
+    hits_omnibus = np.zeros(m)
+    hits_diff = np.zeros((n_groups, m))
+    done = 0
+    while done < n_perm:
+        b = min(chunk, n_perm - done)
+        labels = [groups[idx][rng.random((b, len(idx)), dtype=np.float32).argsort(axis=1)] for idx in members]
+        omnibus, diff = statistics(group_sums(labels))
+        hits_omnibus += (omnibus >= observed_omnibus - 1e-9).sum(axis=0)
+        hits_diff += (np.abs(diff) >= np.abs(observed_diff) - 1e-9).sum(axis=0)
+        done += b
+
+    contrast = (hits_diff + 1) / (n_perm + 1)
+    contrast[reference] = np.nan
+    return {"omnibus": (hits_omnibus + 1) / (n_perm + 1), "contrast": contrast,
+            "diff": observed_diff[0]}
+
+
+def cohens_d(y: np.ndarray, groups: np.ndarray, g: int, reference: int) -> float:
+    a, b = y[groups == g], y[groups == reference]
+    if len(a) < 2 or len(b) < 2:
+        return math.nan
+    pooled = math.sqrt(((len(a) - 1) * a.var(ddof=1) + (len(b) - 1) * b.var(ddof=1)) / (len(a) + len(b) - 2))
+    return (a.mean() - b.mean()) / pooled if pooled > 0 else math.nan
+
+
+# =========================
+# REPORT
+# =========================
+
+def fmt_p(p: float) -> str:
+    if math.isnan(p):
+        return "     -"
+    return f"{p:.4f}" if p >= 1e-4 else f"{p:.0e}"
+
+
+def run_analysis(path: str, n_perm: int = N_PERMUTATIONS, use_covariates: bool = True,
+                 grader_model: str = None, model: str = None) -> list:
+    """Full report as a list of lines."""
+    t0 = time.perf_counter()
+    out = []
+    table, notes, n_dropped = load_answers(path, grader_model, model)
+    a_levels, a = encode(table[FACTOR_A])
+    b_levels, b = encode(table[FACTOR_B])
+    ys = np.column_stack([table[c] for c in SCORE_COLUMNS])
+    n = len(ys)
+    candidates = {}
+    if use_covariates:
+        for c in COVARIATES:
+            if c in table and len(np.unique(table[c])) > 1:
+                candidates[c] = encode(table[c])
+    reference = reference_index(a_levels)
+
+    out.append(f"Input: {path}")
+    out.extend(notes)
+    out.append(f"{n} answers ({n_dropped} rows dropped: other grader/model or missing scores)")
+    out.append(f"{FACTOR_A}: {', '.join(a_levels)} (reference {a_levels[reference]})")
+    out.append(f"{FACTOR_B}: {', '.join(b_levels)}")
+
+    # Design blocks: A, B, A x B, then each covariate that explains something
+    # the model doesn't already (a batch nested in task, or a copy of another
+    # covariate, would only eat degrees of freedom)
+    xa = effect_columns(a, len(a_levels))
+    xb = effect_columns(b, len(b_levels))
+    blocks = {FACTOR_A: xa, FACTOR_B: xb,
+              f"{FACTOR_A} x {FACTOR_B}": np.einsum("ni,nj->nij", xa, xb).reshape(n, -1)}
+    covariates = {}
+    for c, (levels, codes) in candidates.items():
+        x = effect_columns(codes, len(levels))
+        base = np.column_stack([np.ones(n)] + list(blocks.values()))
+        if np.linalg.matrix_rank(np.column_stack([base, x])) > np.linalg.matrix_rank(base):
+            blocks[c] = x
+            covariates[c] = (levels, codes)
+        else:
+            out.append(f"NOTE: {c} is fully explained by {FACTOR_A}/{FACTOR_B}"
+                       + (f"/{'/'.join(covariates)}" if covariates else "") + " - left out of the model")
+    out.append("Covariates: " + (", ".join(f"{c} ({len(levels)} levels)" for c, (levels, _) in covariates.items())
+                                 if covariates else "none"))
+
+    # Permutation strata: task x covariate levels
+    strata = b.copy()
+    for levels, codes in covariates.values():
+        strata = strata * len(levels) + codes
+    perm = permutation_test(ys, a, len(a_levels), strata, reference, n_perm)
+
+    for j, column in enumerate(SCORE_COLUMNS):
+        y = ys[:, j]
+        out.append("")
+        out.append("=" * 78)
+        out.append(column.upper())
+        out.append("=" * 78)
+
+        cell_n, cell_mean, cell_sd = cell_stats(y, a, b, len(a_levels), len(b_levels))
+        out.append(f"{'':12s}" + "".join(f"{t[:11]:>12s}" for t in b_levels) + f"{'ALL':>12s}")
+        for i, prime in enumerate(a_levels):
+            y_prime = y[a == i]
+            out.append(f"{prime[:12]:12s}" + "".join(
+                f"{cell_mean[i, k]:7.1f}±{cell_sd[i, k]:4.1f}" if cell_n[i, k] else f"{'-':>12s}"
+                for k in range(len(b_levels))) + f"{y_prime.mean():7.1f}±{y_prime.std(ddof=1):4.1f}")
+        out.append(f"{'n':12s}" + "".join(f"{int(cell_n[:, k].sum()):>12d}" for k in range(len(b_levels)))
+                   + f"{n:>12d}")
+
+        out.append("")
+        out.append(f"{'source':22s} {'SS':>11s} {'df':>4s} {'MS':>10s} {'F':>8s} {'p':>7s} {'eta2p':>6s} {'omega2':>6s}")
+        for source, ss, df, ms, f, p, eta, omega in anova(y, blocks):
+            if source == "Residual":
+                out.append(f"{source:22s} {ss:11.1f} {df:4d} {ms:10.2f}")
+            elif df == 0:
+                out.append(f"{source:22s} {'-':>11s} {0:4d}   (aliased with other terms)")
+            else:
+                out.append(f"{source:22s} {ss:11.1f} {df:4d} {ms:10.2f} {f:8.2f} {fmt_p(p):>7s} {eta:6.3f} {omega:6.3f}")
+
+        out.append("")
+        out.append(f"Permutation ({n_perm} shuffles of {FACTOR_A} within strata): omnibus p = {fmt_p(perm['omnibus'][j])}")
+        for i, prime in enumerate(a_levels):
+            if i == reference:
+                continue
+            out.append(f"    {prime:12s} - {a_levels[reference]:8s} {perm['diff'][i, j]:+7.2f}  "
+                       f"d = {cohens_d(y, a, i, reference):+.2f}  p = {fmt_p(perm['contrast'][i, j])}")
+
+    out.append("")
+    out.append(f"Report built in {time.perf_counter() - t0:.2f}s")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prime x task analysis of graded results")
+    parser.add_argument("input", nargs="?", default=INPUT, help="graded CSV or results_store directory")
+    parser.add_argument("--perms", type=int, default=N_PERMUTATIONS)
+    parser.add_argument("--no-covariates", action="store_true", help="ignore grader_batch / phase")
+    parser.add_argument("--grader-model", help="only rows graded by this grader")
+    parser.add_argument("--model", help="only rows from this student model")
+    parser.add_argument("--report", help="also write the report to this file")
+    args = parser.parse_args()
+
+    lines = run_analysis(args.input, args.perms, not args.no_covariates, args.grader_model, args.model)
+    print("\n".join(lines))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Shared HTTP transport for the runner (holiday_test_v3) and the grader (grader_robusto_v3).
+
+One pooled, keep-alive httpx client per API host, so repeated calls reuse the
+same TCP+TLS connection instead of paying for a fresh handshake every time.
+HTTP/2 is used when the `h2` package is installed, plain HTTP/1.1 otherwise.
+Every call has a timeout - nothing can hang a whole run.
+"""
+
+import atexit
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from rate_limiter import get_limiter
+
+try:
+    import h2  # noqa: F401 - httpx only speaks HTTP/2 when h2 is importable
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# === CONFIGURATION ===
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Connection pool (per host)
+MAX_CONNECTIONS_PER_HOST = 32
+MAX_KEEPALIVE_PER_HOST = 32
+KEEPALIVE_EXPIRY = 90.0  # seconds an idle connection is kept open
+
+# Default timeouts (seconds). READ is the gap allowed between bytes from the
+# server, which for a non-streamed completion is basically the whole call.
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 120.0
+WRITE_TIMEOUT = 30.0
+POOL_TIMEOUT = 120.0  # waiting for a free connection from the pool
+
+# 429s are retried here (paced by rate_limiter) before the caller ever sees them
+RATE_LIMIT_RETRIES = 5
+
+
+class APIError(Exception):
+    """Non-2xx response from the API (status code and headers kept for callers)."""
+
+    def __init__(self, message: str, status_code: int = None, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url: str = None) -> httpx.Client:
+    """Return the shared pooled client for this base URL's host (created on first use)."""
+    base_url = base_url or OPENROUTER_BASE_URL
+    host = urlsplit(base_url).netloc
+
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = httpx.Client(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS_PER_HOST,
+                    max_keepalive_connections=MAX_KEEPALIVE_PER_HOST,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=make_timeout(),
+            )
+            _clients[host] = client
+    return client
+
+
+def make_timeout(read: float = None) -> httpx.Timeout:
+    """Timeout with the configured defaults, optionally overriding the read timeout."""
+    return httpx.Timeout(
+        connect=CONNECT_TIMEOUT,
+        read=read if read is not None else READ_TIMEOUT,
+        write=WRITE_TIMEOUT,
+        pool=POOL_TIMEOUT,
+    )
+
+
+def auth_headers(api_key: str) -> dict:
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json',
+    }
+
+
+def _error_message(response: httpx.Response) -> str:
+    """Best-effort error text from an error response body."""
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text[:300]
+    err = body.get('error', body) if isinstance(body, dict) else body
+    if isinstance(err, dict):
+        return str(err.get('message', err))
+    return str(err)
+
+
+def _is_throttled(response: httpx.Response) -> bool:
+    """429, or OpenRouter's 200-with-error-body flavour of it."""
+    if response.status_code == 429:
+        return True
+    if response.status_code == 200 and b'"error"' in response.content[:200]:
+        try:
+            err = response.json().get('error') or {}
+        except ValueError:
+            return False
+        return isinstance(err, dict) and err.get('code') == 429
+    return False
+
+
+def chat_completion(api_key: str, payload: dict, base_url: str = None,
+                    timeout: float = None) -> dict:
+    """POST one chat-completions request over the shared client and return the JSON body.
+
+    Every attempt waits on the (provider, model) rate limiter first; 429s feed
+    back into it and are retried up to RATE_LIMIT_RETRIES times.
+    `timeout` overrides the read timeout for slow calls (e.g. high-reasoning turns).
+    Raises APIError on a non-2xx response; httpx.TimeoutException etc. propagate.
+    """
+    base_url = base_url or OPENROUTER_BASE_URL
+    limiter = get_limiter(payload.get('model', ''))
+
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        limiter.acquire()
+        response = get_client(base_url).post(
+            f"{base_url.rstrip('/')}/chat/completions",
+            headers=auth_headers(api_key),
+            json=payload,
+            timeout=make_timeout(timeout),
+        )
+
+        if _is_throttled(response):
+            limiter.on_throttle(response.headers, attempt)
+            continue
+
+        if response.status_code >= 400:
+            raise APIError(
+                f"HTTP {response.status_code}: {_error_message(response)}",
+                status_code=response.status_code,
+                headers=response.headers,
+            )
+
+        limiter.on_success(response.headers)
+        return response.json()
+
+    raise APIError(
+        f"HTTP 429: still rate limited after {RATE_LIMIT_RETRIES + 1} attempts",
+        status_code=429,
+        headers=response.headers,
+    )
+
+
+def stream_chat_completion(api_key: str, payload: dict, base_url: str = None,
+                           timeout: float = None, max_seconds: float = None,
+                           max_chars: int = None) -> dict:
+    """Streamed (SSE) version of chat_completion that also times the generation.
+
+    Returns the same shape as a normal completion (choices[0].message with
+    content/reasoning, usage, ...) plus a "timing" dict:
+      t_first_reasoning / t_first_content - seconds from request to first delta of each kind
+      total_time        - seconds until the stream ended (or was cut off)
+      inter_token_sec   - mean gap between successive deltas
+      tokens_per_sec    - completion tokens / time from first delta to end
+      cut_off           - True if max_seconds / max_chars stopped a runaway generation
+    With a read timeout, `timeout` here is the longest allowed silence mid-stream.
+    """
+    base_url = base_url or OPENROUTER_BASE_URL
+    limiter = get_limiter(payload.get('model', ''))
+    payload = dict(payload, stream=True, usage={'include': True})
+
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        limiter.acquire()
+        start = time.monotonic()
+        with get_client(base_url).stream(
+            "POST",
+            f"{base_url.rstrip('/')}/chat/completions",
+            headers=auth_headers(api_key),
+            json=payload,
+            timeout=make_timeout(timeout),
+        ) as response:
+            if response.status_code != 200:
+                response.read()
+                if _is_throttled(response):
+                    limiter.on_throttle(response.headers, attempt)
+                    continue
+                raise APIError(
+                    f"HTTP {response.status_code}: {_error_message(response)}",
+                    status_code=response.status_code,
+                    headers=response.headers,
+                )
+            limiter.on_success(response.headers)
+            return _consume_sse(response, start, max_seconds, max_chars)
+
+    raise APIError(
+        f"HTTP 429: still rate limited after {RATE_LIMIT_RETRIES + 1} attempts",
+        status_code=429,
+        headers=response.headers,
+    )
+
+
+def _consume_sse(response: httpx.Response, start: float, max_seconds: float,
+                 max_chars: int) -> dict:
+    """Read `data:` events until [DONE], assembling the message and the timings."""
+    content, reasoning = [], []
+    n_chars = 0
+    usage = {}
+    finish_reason = None
+    model = None
+    t_first_reasoning = t_first_content = None
+    delta_times = []
+    cut_off = False
+
+    for line in response.iter_lines():
+        # Blank lines separate events; ": ..." lines are keep-alive comments
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+
+        chunk = json.loads(data)
+        if 'error' in chunk:
+            raise APIError(f"Stream error: {chunk['error']}")
+        model = chunk.get('model', model)
+        if chunk.get('usage'):
+            usage = chunk['usage']
+
+        for choice in chunk.get('choices', []):
+            delta = choice.get('delta') or {}
+            now = time.monotonic() - start
+            if delta.get('reasoning'):
+                if t_first_reasoning is None:
+                    t_first_reasoning = now
+                reasoning.append(delta['reasoning'])
+                delta_times.append(now)
+            if delta.get('content'):
+                if t_first_content is None:
+                    t_first_content = now
+                content.append(delta['content'])
+                n_chars += len(delta['content'])
+                delta_times.append(now)
+            finish_reason = choice.get('finish_reason') or finish_reason
+
+        if max_seconds is not None and time.monotonic() - start > max_seconds:
+            cut_off = True
+        if max_chars is not None and n_chars > max_chars:
+            cut_off = True
+        if cut_off:
+            finish_reason = 'cut_off'
+            break  # leaving the stream context drops the connection
+
+    total_time = time.monotonic() - start
+
+    gaps = [b - a for a, b in zip(delta_times, delta_times[1:])]
+    n_tokens = usage.get('completion_tokens') or len(delta_times)
+    gen_time = total_time - delta_times[0] if delta_times else 0.0
+
+    return {
+        'model': model,
+        'choices': [{
+            'message': {
+                'role': 'assistant',
+                'content': "".join(content),
+                'reasoning': "".join(reasoning),
+            },
+            'finish_reason': finish_reason,
+        }],
+        'usage': usage,
+        'timing': {
+            't_first_reasoning': t_first_reasoning,
+            't_first_content': t_first_content,
+            'total_time': total_time,
+            'inter_token_sec': sum(gaps) / len(gaps) if gaps else None,
+            'tokens_per_sec': n_tokens / gen_time if gen_time > 0 else None,
+            'cut_off': cut_off,
+        },
+    }
+
+
+def close_all():
+    """Close every pooled connection (registered to run at exit)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+atexit.register(close_all)
@@ -0,0 +1,442 @@
+"""
+Batch-API grading: the same grades as grader_robusto_v3, at batch prices and
+without a terminal open for hours.
+
+Every pending row (same input/resume/shuffle/blind-ID rules as the grader) is
+compiled into one JSONL request file - custom_id = blind_id, body = the exact
+chat request grade_one_answer would send. The file is submitted to a batch
+backend, polled until it finishes, and the results go through the grader's parser
+into the usual graded CSV (blind_id order). Rows that fail or never come back
+are written as ERROR rows, so grader_robusto_v3 with RESUME_FROM can finish them.
+
+Backends:
+  openai - OpenAI Batch API (/files + /batches, 24h window, ~50% off).
+           GRADER_MODEL "openai/gpt-5.1" is sent as "gpt-5.1".
+  local  - file-based stand-in: a directory per batch, worked through a chunk
+           per poll against any chat-completions endpoint (by default a
+           mock_openrouter server started in-process), so it runs offline.
+
+Configure INPUT_CSV / GRADER_MODEL / RESUME_FROM in grader_robusto_v3.py (with a
+list of graders, only the first one is batched), then:
+
+    python batch_grading.py run                       # submit, wait, write CSV
+    python batch_grading.py submit                    # submit and exit
+    python batch_grading.py collect <batch dir>       # later: check / write CSV
+    python batch_grading.py run --backend local       # offline dry run
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import grader_robusto_v3 as grader
+from api_transport import APIError, auth_headers, chat_completion, get_client
+from checkpoint import load_checkpoint, rewrite_rows
+from cost_governor import call_cost, usage_counts
+from grade_cache import cache_key
+
+# === CONFIGURATION ===
+BACKEND = "openai"  # "openai" or "local"
+BATCH_DIR = os.path.join(grader.DATA_DIR, "batches")  # one sub-directory per submitted batch
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")  # batch calls go to OpenAI directly, not OpenRouter
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+COMPLETION_WINDOW = "24h"
+
+BATCH_DISCOUNT = 0.5  # batch price as a fraction of the synchronous price
+POLL_INTERVAL = 60    # seconds between status checks while waiting
+
+# Local stand-in
+LOCAL_CHUNK = 25      # requests processed per poll
+LOCAL_WORKERS = 8
+
+STATE_FILE = "batch.json"
+REQUESTS_FILE = "requests.jsonl"
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+log = grader.log
+
+
+# =========================
+# BACKENDS
+# =========================
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API over the shared pooled transport."""
+
+    name = "openai"
+
+    def __init__(self, api_key: str = None, base_url: str = None):
+        self.api_key = api_key or OPENAI_API_KEY
+        self.base_url = (base_url or OPENAI_BASE_URL).rstrip("/")
+
+    def prepare(self, body: dict) -> dict:
+        """OpenRouter-style grading request -> OpenAI chat request."""
+        body = dict(body)
+        body["model"] = body["model"].split("/", 1)[-1]
+        if "max_tokens" in body:
+            body["max_completion_tokens"] = body.pop("max_tokens")
+        return body
+
+    def _request(self, method: str, path: str, **kwargs):
+        headers = auth_headers(self.api_key)
+        if "files" in kwargs:
+            headers.pop("Content-Type")  # httpx sets the multipart boundary
+        response = get_client(self.base_url).request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise APIError(f"HTTP {response.status_code}: {response.text[:300]}",
+                           status_code=response.status_code, headers=response.headers)
+        return response
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, "rb") as f:
+            upload = self._request("POST", "/files", data={"purpose": "batch"},
+                                   files={"file": (os.path.basename(requests_path), f, "application/jsonl")}).json()
+        batch = self._request("POST", "/batches", json={
+            "input_file_id": upload["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": COMPLETION_WINDOW,
+        }).json()
+        return batch["id"]
+
+    def status(self, batch_id: str) -> dict:
+        batch = self._request("GET", f"/batches/{batch_id}").json()
+        counts = batch.get("request_counts") or {}
+        return {
+            "status": batch["status"],
+            "total": counts.get("total", 0),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "output_file_id": batch.get("output_file_id"),
+            "error_file_id": batch.get("error_file_id"),
+        }
+
+    def results(self, batch_id: str):
+        """Yield result lines (dicts) from the output and error files."""
+        status = self.status(batch_id)
+        for file_id in (status["output_file_id"], status["error_file_id"]):
+            if not file_id:
+                continue
+            with get_client(self.base_url).stream(
+                "GET", f"{self.base_url}/files/{file_id}/content", headers=auth_headers(self.api_key),
+            ) as response:
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+class LocalBatchBackend:
+    """File-based stand-in for a batch API.
+
+    <root>/<batch_id>/ holds a copy of the request file, output.jsonl (one
+    result line per request, same shape as OpenAI's). Each
+    status() call works through the next LOCAL_CHUNK requests against
+    base_url, so it can be stopped and picked up again from another process.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str = None, api_key: str = "local"):
+        self.root = root
+        self.base_url = base_url
+        self.api_key = api_key
+
+    def prepare(self, body: dict) -> dict:
+        return body
+
+    def _dir(self, batch_id: str) -> str:
+        return os.path.join(self.root, batch_id)
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"local_{int(time.time() * 1000):x}"
+        os.makedirs(self._dir(batch_id))
+        shutil.copy(requests_path, os.path.join(self._dir(batch_id), "input.jsonl"))
+        return batch_id
+
+    def _call(self, request: dict) -> dict:
+        try:
+            body = chat_completion(self.api_key, request["body"], base_url=self.base_url,
+                                   timeout=grader.GRADER_TIMEOUT)
+            return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None,
+                    "error": {"code": "request_failed", "message": str(e)}}
+
+    def status(self, batch_id: str) -> dict:
+        with open(os.path.join(self._dir(batch_id), "input.jsonl"), encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        output_path = os.path.join(self._dir(batch_id), "output.jsonl")
+        finished = list(self._read(output_path))
+        done_ids = {r["custom_id"] for r in finished}
+        pending = [r for r in requests if r["custom_id"] not in done_ids][:LOCAL_CHUNK]
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=LOCAL_WORKERS) as pool:
+                new = list(pool.map(self._call, pending))
+            with open(output_path, "a", encoding="utf-8") as f:
+                for line in new:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            finished += new
+
+        n_failed = sum(1 for r in finished if r.get("error"))
+        return {
+            "status": "completed" if len(finished) >= len(requests) else "in_progress",
+            "total": len(requests),
+            "completed": len(finished) - n_failed,
+            "failed": n_failed,
+        }
+
+    @staticmethod
+    def _read(path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        pass  # half-written last line from an interrupted poll
+
+    def results(self, batch_id: str):
+        yield from self._read(os.path.join(self._dir(batch_id), "output.jsonl"))
+
+
+def make_backend(name: str, local_base_url: str = None):
+    if name == "openai":
+        return OpenAIBatchBackend()
+    if name == "local":
+        return LocalBatchBackend(os.path.join(BATCH_DIR, "_local"), base_url=local_base_url)
+    raise ValueError(f"Unknown batch backend: {name!r}")
+
+
+# =========================
+# COMPILE / SUBMIT
+# =========================
+
+def compile_requests(jobs: list, backend, requests_path: str) -> dict:
+    """Write one JSONL request per job. Returns {blind_id: result} for grade-cache hits (not sent)."""
+    cache = grader.get_grade_cache()
+    cached = {}
+    with open(requests_path, "w", encoding="utf-8") as f:
+        for blind_id, row in jobs:
+            system_prompt = grader.get_grader_system_prompt(row["task"])
+            user_prompt = grader.make_user_prompt(subject=row["task"], blind_id=blind_id, answer_text=row["output"])
+            if cache is not None:
+                hit = cache.get(cache_key(system_prompt, user_prompt, blind_id,
+                                          grader.grader_models()[0], grader.GRADER_TEMPERATURE))
+                if hit is not None:
+                    cached[blind_id] = dict(hit, grader_cost_usd=0.0)
+                    continue
+            body = grader.grader_payload([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ])
+            request = {"custom_id": blind_id, "method": "POST", "url": "/v1/chat/completions",
+                       "body": backend.prepare(body)}
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return cached
+
+
+def submit(backend) -> str:
+    """Compile the pending rows, submit them, save the batch state. Returns the batch directory."""
+    loaded = grader.load_jobs()
+    if loaded is None:
+        return None
+    fieldnames, done_rows, jobs = loaded
+    # Resuming an ensemble file: skip answers only the other graders still need
+    primary_done = {grader.answer_key(r) for r in done_rows if r.get("grader_model") == grader.grader_models()[0]}
+    jobs = [(blind_id, row) for blind_id, row in jobs if grader.answer_key(row) not in primary_done]
+    if not jobs:
+        log("Nothing left to grade.")
+        return None
+
+    batch_dir = os.path.join(BATCH_DIR, grader.RUN_ID)
+    os.makedirs(batch_dir, exist_ok=True)
+    requests_path = os.path.join(batch_dir, REQUESTS_FILE)
+    cached = compile_requests(jobs, backend, requests_path)
+    n_requests = len(jobs) - len(cached)
+    log(f"Compiled {n_requests} requests ({len(cached)} answered from the grade cache) -> {requests_path}")
+
+    batch_id = backend.submit(requests_path) if n_requests else None
+    state = {
+        "batch_id": batch_id,
+        "backend": backend.name,
+        "grader_model": grader.grader_models()[0],
+        "output_csv": grader.OUTPUT_CSV,
+        "resume": bool(grader.RESUME_FROM),
+        "fieldnames": fieldnames,
+        "submitted": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "jobs": jobs,
+        "cached": cached,
+    }
+    with open(os.path.join(batch_dir, STATE_FILE), "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    if batch_id is None:
+        log(f"✓ Every row came from the grade cache - nothing submitted (state in {batch_dir})")
+    else:
+        log(f"✓ Submitted batch {batch_id} ({backend.name}) - state in {batch_dir}")
+    return batch_dir
+
+
+# =========================
+# POLL / COLLECT
+# =========================
+
+def result_to_grade(result: dict, model: str) -> dict:
+    """One batch result line -> a grade_one_answer-style result dict."""
+    response = result.get("response") or {}
+    body = response.get("body") or {}
+    if result.get("error") or response.get("status_code", 200) >= 400 or "error" in body:
+        error = result.get("error") or body.get("error")
+        return {"grader_raw": f"ERROR: batch request failed: {error}", "content_score": None,
+                "reasoning_score": None, "communication_score": None, "total_score": None,
+                "grader_cost_usd": 0.0}
+
+    text = body["choices"][0]["message"]["content"] or ""
+    counts = usage_counts(body.get("usage"))
+    content, reasoning, communication, total = grader.scores_from_text(text)
+    if content is None and reasoning is None and total is None:
+        text = f"ERROR: unparseable batch response: {text}"
+    return {
+        "grader_raw": text,
+        "content_score": content,
+        "reasoning_score": reasoning,
+        "communication_score": communication,
+        "total_score": total,
+        "grader_cost_usd": round(call_cost(model, body.get("usage")) * BATCH_DISCOUNT, 6),
+        "grader_input_tokens": counts["input"],
+        "grader_cached_tokens": counts["cached"],
+    }
+
+
+def wait_for(backend, batch_id: str, poll_interval: float) -> dict:
+    """Poll until the batch reaches a terminal state."""
+    while True:
+        status = backend.status(batch_id)
+        log(f"Batch {batch_id}: {status['status']} - {status['completed']}/{status['total']} done, "
+            f"{status['failed']} failed")
+        if status["status"] in TERMINAL_STATES:
+            return status
+        time.sleep(poll_interval)
+
+
+def collect(batch_dir: str, backend, wait: bool = True, poll_interval: float = POLL_INTERVAL) -> bool:
+    """Write the graded CSV for a submitted batch. False if it isn't finished (and wait=False)."""
+    with open(os.path.join(batch_dir, STATE_FILE), encoding="utf-8") as f:
+        state = json.load(f)
+    batch_id = state["batch_id"]
+    model = state["grader_model"]
+
+    if batch_id is not None:
+        if wait:
+            status = wait_for(backend, batch_id, poll_interval)
+        else:
+            status = backend.status(batch_id)
+            log(f"Batch {batch_id}: {status['status']} - {status['completed']}/{status['total']} done")
+            if status["status"] not in TERMINAL_STATES:
+                return False
+        if status["status"] != "completed":
+            log(f"⚠ Batch ended as {status['status']} - missing rows are written as errors")
+
+    grades = dict(state["cached"])
+    rows_by_id = dict(state["jobs"])
+    cache = grader.get_grade_cache()
+    if batch_id is not None:
+        for result in backend.results(batch_id):
+            grade = result_to_grade(result, model)
+            grades[result["custom_id"]] = grade
+            if cache is not None and grade["total_score"] is not None:
+                row = rows_by_id[result["custom_id"]]
+                user_prompt = grader.make_user_prompt(row["task"], result["custom_id"], row["output"])
+                key = cache_key(grader.get_grader_system_prompt(row["task"]), user_prompt,
+                                result["custom_id"], model, grader.GRADER_TEMPERATURE)
+                cache.put(key, model, grade)
+
+    output_csv = state["output_csv"]
+    fieldnames = state["fieldnames"]
+    if state["resume"]:
+        done_rows, _ = load_checkpoint(output_csv, key=lambda r: (grader.answer_key(r), r.get("grader_model")),
+                                       is_done=grader.grade_succeeded)
+        rewrite_rows(output_csv, fieldnames, done_rows)
+
+    n_ok = n_failed = 0
+    total_cost = 0.0
+    with open(output_csv, "a" if state["resume"] else "w", newline="", encoding="utf-8") as out_f:
+        writer = csv.DictWriter(out_f, fieldnames=fieldnames)
+        if not state["resume"]:
+            writer.writeheader()
+        for blind_id, row in state["jobs"]:
+            grade = grades.get(blind_id) or {
+                "grader_raw": "ERROR: no result in batch output", "content_score": None,
+                "reasoning_score": None, "communication_score": None, "total_score": None,
+                "grader_cost_usd": 0.0,
+            }
+            out_row = grader.make_out_row(row, blind_id, grade)
+            out_row["grader_model"] = model
+            writer.writerow(out_row)
+            total_cost += grade["grader_cost_usd"] or 0.0
+            if grade["total_score"] is not None:
+                n_ok += 1
+            else:
+                n_failed += 1
+
+    log("=" * 60)
+    log(f"✓ {n_ok} graded, ✗ {n_failed} failed - ${total_cost:.2f} at batch prices")
+    if n_failed:
+        log(f"  Finish the failures with grader_robusto_v3 RESUME_FROM = {output_csv!r}")
+    log(f"COMPLETE! Wrote {n_ok + n_failed} graded results to {output_csv}")
+    log("=" * 60)
+    return True
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-API grading for grader_robusto_v3")
+    parser.add_argument("cmd", choices=["run", "submit", "collect"])
+    parser.add_argument("batch_dir", nargs="?", help="batch directory (collect)")
+    parser.add_argument("--backend", choices=["openai", "local"], default=BACKEND)
+    parser.add_argument("--local-base-url", help="chat-completions endpoint for the local backend "
+                                                 "(default: start a mock_openrouter server)")
+    parser.add_argument("--no-wait", action="store_true", help="collect: report status and exit if unfinished")
+    parser.add_argument("--poll", type=float, default=None, help="seconds between status checks")
+    args = parser.parse_args()
+
+    local_base_url = args.local_base_url
+    if args.backend == "local" and local_base_url is None:
+        import mock_openrouter
+        _, local_base_url = mock_openrouter.start_server("healthy")
+    backend = make_backend(args.backend, local_base_url)
+    poll_interval = args.poll if args.poll is not None else (1 if args.backend == "local" else POLL_INTERVAL)
+
+    log("=" * 60)
+    log(f"HOLIDAY GRADER v3.0 - BATCH MODE ({backend.name})")
+    log(f"Grader model: {grader.grader_models()[0]}")
+    log("=" * 60)
+
+    if args.cmd in ("run", "submit"):
+        batch_dir = submit(backend)
+        if batch_dir is None:
+            return 0
+        if args.cmd == "submit":
+            print(f"Collect later with: python batch_grading.py collect {batch_dir} --backend {backend.name}")
+            return 0
+    else:
+        if not args.batch_dir:
+            parser.error("collect needs the batch directory")
+        batch_dir = args.batch_dir
+
+    finished = collect(batch_dir, backend, wait=not args.no_wait, poll_interval=poll_interval)
+    return 0 if finished else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
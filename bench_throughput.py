@@ -0,0 +1,215 @@
+"""
+Offline end-to-end throughput benchmark for the runner and the grader.
+
+Spins up mock_openrouter in-process, points api_transport at it, then runs
+holiday_test_v3.run_experiment and grader_robusto_v3.main for real (temp
+output files, console output swallowed). Reports trials/min, graded rows/min,
+p50/p95 call latency, and error recovery (failures left after one resume pass).
+
+    python bench_throughput.py --profile flaky --reps 3
+    python bench_throughput.py --save-baseline bench_baseline.json
+    python bench_throughput.py --baseline bench_baseline.json   # exits 1 on a regression
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import mock_openrouter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Metrics checked against a baseline, and how much worse they may get
+REGRESSION_TOLERANCE = 0.20
+HIGHER_IS_BETTER = ["trials_per_min", "graded_per_min"]
+LOWER_IS_BETTER = ["runner_p95_sec", "grader_p95_sec", "runner_failed_after_resume", "grader_failed_after_resume"]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile (q in 0-100); None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def timed(fn, sink: list):
+    """Wrap fn so each call's wall time is appended to sink."""
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sink.append(time.perf_counter() - t0)
+    return wrapper
+
+
+def count_rows(path: str, ok) -> tuple:
+    """(total rows, rows failing `ok`) in a CSV."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return len(rows), sum(1 for r in rows if not ok(r))
+
+
+def bench_runner(h, workdir: str, reps: int, concurrency: int) -> dict:
+    h.N_PER_CELL = reps
+    h.MAX_CONCURRENCY = concurrency
+    h.ASYNC_MODE = concurrency > 1
+    h.RESUME_FROM = None
+    h.OUTPUT_FILE = os.path.join(workdir, "run_bench.csv")
+    h.LOG_FILE = os.path.join(workdir, "run_bench.log")
+
+    original = h.run_two_turn_trial
+    durations = []
+    h.run_two_turn_trial = timed(original, durations)
+    try:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            h.run_experiment()
+        wall = time.perf_counter() - t0
+        n_rows, n_failed = count_rows(h.OUTPUT_FILE, h.trial_succeeded)
+
+        # Error recovery: one resume pass over the same file
+        h.RESUME_FROM = h.OUTPUT_FILE
+        t1 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            h.run_experiment()
+        recovery_wall = time.perf_counter() - t1
+        _, n_failed_after = count_rows(h.OUTPUT_FILE, h.trial_succeeded)
+    finally:
+        h.run_two_turn_trial = original
+        h.RESUME_FROM = None
+
+    return {
+        "trials": n_rows,
+        "runner_wall_sec": round(wall, 2),
+        "trials_per_min": round(n_rows / wall * 60, 1),
+        "runner_p50_sec": round(percentile(durations, 50), 3),
+        "runner_p95_sec": round(percentile(durations, 95), 3),
+        "runner_failed_first_pass": n_failed,
+        "runner_failed_after_resume": n_failed_after,
+        "runner_recovery_sec": round(recovery_wall, 2),
+    }
+
+
+def bench_grader(g, workdir: str, input_csv: str, max_rows: int) -> dict:
+    g.INPUT_CSV = input_csv
+    g.MAX_TO_GRADE = max_rows
+    g.RESUME_FROM = None
+    g.OUTPUT_CSV = os.path.join(workdir, "graded_bench.csv")
+    g.LOG_FILE = os.path.join(workdir, "grader_bench.log")
+
+    original = g.grade_one_answer
+    durations = []
+    g.grade_one_answer = timed(original, durations)
+    try:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            g.main()
+        wall = time.perf_counter() - t0
+        n_rows, n_failed = count_rows(g.OUTPUT_CSV, g.grade_succeeded)
+
+        g.RESUME_FROM = g.OUTPUT_CSV
+        g.MAX_TO_GRADE = None
+        t1 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            g.main()
+        recovery_wall = time.perf_counter() - t1
+        _, n_failed_after = count_rows(g.OUTPUT_CSV, g.grade_succeeded)
+    finally:
+        g.grade_one_answer = original
+        g.RESUME_FROM = None
+
+    return {
+        "graded": n_rows,
+        "grader_wall_sec": round(wall, 2),
+        "graded_per_min": round(n_rows / wall * 60, 1),
+        "grader_p50_sec": round(percentile(durations, 50), 3),
+        "grader_p95_sec": round(percentile(durations, 95), 3),
+        "grader_failed_first_pass": n_failed,
+        "grader_failed_after_resume": n_failed_after,
+        "grader_recovery_sec": round(recovery_wall, 2),
+    }
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """Human-readable regressions versus a saved baseline (empty list = fine)."""
+    problems = []
+    for key in HIGHER_IS_BETTER:
+        if key in baseline and results.get(key) is not None:
+            if results[key] < baseline[key] * (1 - REGRESSION_TOLERANCE):
+                problems.append(f"{key}: {results[key]} vs baseline {baseline[key]}")
+    for key in LOWER_IS_BETTER:
+        if key in baseline and results.get(key) is not None:
+            limit = max(baseline[key] * (1 + REGRESSION_TOLERANCE), baseline[key] + 1)
+            if results[key] > limit:
+                problems.append(f"{key}: {results[key]} vs baseline {baseline[key]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline runner/grader throughput benchmark")
+    parser.add_argument("--profile", choices=sorted(mock_openrouter.PROFILES), default="flaky")
+    parser.add_argument("--reps", type=int, default=3, help="N_PER_CELL for the runner")
+    parser.add_argument("--concurrency", type=int, default=20, help="runner MAX_CONCURRENCY (1 = serial)")
+    parser.add_argument("--grade-rows", type=int, default=None, help="cap on rows graded (default all)")
+    parser.add_argument("--baseline", help="JSON from --save-baseline; exit 1 on a regression")
+    parser.add_argument("--save-baseline", help="write this run's metrics to a JSON file")
+    args = parser.parse_args()
+    for name in ("baseline", "save_baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    server, base_url = mock_openrouter.start_server(args.profile)
+    workdir = tempfile.mkdtemp(prefix="lazyholidays_bench_")
+
+    # The scripts create their data/log dirs at import time - keep that inside workdir
+    sys.path.insert(0, HERE)
+    os.chdir(workdir)
+    import api_transport
+    api_transport.OPENROUTER_BASE_URL = base_url
+    with contextlib.redirect_stdout(io.StringIO()):
+        import holiday_test_v3
+        import grader_robusto_v3
+    holiday_test_v3.OPENROUTER_API_KEY = grader_robusto_v3.OPENROUTER_API_KEY = "mock-key"
+
+    print(f"Mock server: {base_url} (profile={args.profile})")
+    print(f"Work dir:    {workdir}")
+
+    results = {"profile": args.profile, "reps": args.reps, "concurrency": args.concurrency}
+    results.update(bench_runner(holiday_test_v3, workdir, args.reps, args.concurrency))
+    results.update(bench_grader(grader_robusto_v3, workdir, holiday_test_v3.OUTPUT_FILE, args.grade_rows))
+    results["mock_stats"] = dict(server.stats)
+    server.shutdown()
+
+    print("=" * 60)
+    for key, value in results.items():
+        print(f"{key:28s} {value}")
+    print("=" * 60)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline)
+        if problems:
+            print("REGRESSIONS:")
+            for p in problems:
+                print(f"  ✗ {p}")
+            sys.exit(1)
+        print("✓ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
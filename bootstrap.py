@@ -0,0 +1,197 @@
+"""
+Bootstrap confidence intervals for prime contrasts, per task and overall.
+
+Each prime x task cell (about 20 answers) is resampled on its own: one
+(N_RESAMPLES x cell size) index matrix per cell gives N_RESAMPLES resampled
+means for all four score columns at once. Cells go to a process pool; each
+cell's generator comes from SeedSequence(SEED).spawn(), so results are the same
+for any number of workers. Every prime is then compared with REFERENCE_PRIME
+within each task and averaged over tasks ("ALL"), with all contrasts taken from
+the same draws in one array operation. Percentile and BCa intervals.
+
+    python bootstrap.py                                  # merged master CSV
+    python bootstrap.py data/graded_20251211_135942.csv --resamples 20000 --output logs/bootstrap.csv
+    python bootstrap.py --method bca --ci 0.9 --workers 4
+"""
+
+import argparse
+import csv
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from analysis import FACTOR_A, FACTOR_B, INPUT, SCORE_COLUMNS, encode, load_answers, reference_index
+
+# === CONFIGURATION ===
+N_RESAMPLES = 100_000
+CI_LEVEL = 0.95
+SEED = 20251225
+WORKERS = None  # process pool size (None = one per CPU)
+
+OVERALL = "ALL"
+
+_normal = NormalDist()
+
+
+def bootstrap_cell(ys: np.ndarray, seed: np.random.SeedSequence, n_resamples: int) -> np.ndarray:
+    """(n_resamples x m) means of one cell's scores (n x m), resampled with replacement."""
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(ys), size=(n_resamples, len(ys)))
+    return ys[index].mean(axis=1)
+
+
+def acceleration(central2: np.ndarray, central3: np.ndarray, counts: np.ndarray, sign: np.ndarray) -> np.ndarray:
+    """BCa acceleration for a difference of cell means, from the jackknife in closed form.
+
+    For a mean, a cell's jackknife influence values are just y - mean, so a
+    contrast's acceleration needs only each cell's 2nd/3rd central sums:
+    a = sum(sign * c3 / n^3) / (6 * sum(c2 / n^2)^1.5), summed over the last axis (cells).
+    """
+    numerator = (sign * central3 / counts ** 3).sum(axis=-1)
+    denominator = 6 * ((central2 / counts ** 2).sum(axis=-1)) ** 1.5
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, 0.0)
+
+
+def intervals(draws: np.ndarray, estimate: np.ndarray, accel: np.ndarray, level: float) -> dict:
+    """Percentile and BCa bounds for many statistics at once. draws: (B, ...) -> bounds shaped like estimate."""
+    alpha = (1 - level) / 2
+    ordered = np.sort(draws, axis=0)
+    n = len(ordered)
+
+    def at(quantile):
+        position = np.clip(np.rint(quantile * (n - 1)).astype(int), 0, n - 1)
+        return np.take_along_axis(ordered, position[None, ...], axis=0)[0]
+
+    out = {"pct_lo": at(np.full(estimate.shape, alpha)), "pct_hi": at(np.full(estimate.shape, 1 - alpha))}
+
+    # BCa: bias correction from the share of draws below the estimate, plus acceleration
+    below = (draws < estimate).mean(axis=0) + 0.5 * (draws == estimate).mean(axis=0)
+    z0 = np.vectorize(lambda p: _normal.inv_cdf(min(max(p, 1 / (n + 1)), n / (n + 1))))(below)
+    for key, tail in (("bca_lo", alpha), ("bca_hi", 1 - alpha)):
+        z = _normal.inv_cdf(tail)
+        adjusted = np.vectorize(_normal.cdf)(z0 + (z0 + z) / (1 - accel * (z0 + z)))
+        out[key] = at(adjusted)
+    return out
+
+
+def run_bootstrap(path: str, n_resamples: int = N_RESAMPLES, level: float = CI_LEVEL, workers: int = WORKERS,
+                  grader_model: str = None, model: str = None):
+    """Contrast table rows (one per score x prime x task/ALL) and notes."""
+    table, notes, _ = load_answers(path, grader_model, model)
+    a_levels, a = encode(table[FACTOR_A])
+    b_levels, b = encode(table[FACTOR_B])
+    ys = np.column_stack([table[c] for c in SCORE_COLUMNS])
+    reference = reference_index(a_levels)
+    k_a, k_b, m = len(a_levels), len(b_levels), len(SCORE_COLUMNS)
+
+    cells = [(i, j) for i in range(k_a) for j in range(k_b)]
+    cell_ys = {(i, j): ys[(a == i) & (b == j)] for i, j in cells}
+    empty = [f"{a_levels[i]}/{b_levels[j]}" for (i, j), y in cell_ys.items() if len(y) == 0]
+    if empty:
+        raise ValueError(f"Empty cells, can't bootstrap: {', '.join(empty)}")
+
+    # Resampled cell means: (k_a, k_b, B, m)
+    seeds = np.random.SeedSequence(SEED).spawn(len(cells))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(bootstrap_cell, cell_ys[cell], seed, n_resamples) for cell, seed in zip(cells, seeds)]
+        means = np.stack([f.result() for f in futures]).reshape(k_a, k_b, n_resamples, m)
+
+    # Every prime vs the reference, per task and averaged over tasks - one array op
+    others = [i for i in range(k_a) if i != reference]
+    observed = np.array([[cell_ys[i, j].mean(axis=0) for j in range(k_b)] for i in range(k_a)])  # (k_a, k_b, m)
+    diff_draws = means[others] - means[reference][None]                       # (k_a-1, k_b, B, m)
+    diff_draws = np.concatenate([diff_draws, diff_draws.mean(axis=1, keepdims=True)], axis=1)
+    diff_draws = np.moveaxis(diff_draws, 2, 0)                                 # (B, k_a-1, k_b+1, m)
+    estimate = observed[others] - observed[reference][None]
+    estimate = np.concatenate([estimate, estimate.mean(axis=1, keepdims=True)], axis=1)
+
+    # Acceleration: contrast cells are (prime, task) with sign +1 and (reference, task) with sign -1
+    counts = np.array([[len(cell_ys[i, j]) for j in range(k_b)] for i in range(k_a)], dtype=float)[..., None]
+    central2 = np.array([[((cell_ys[i, j] - observed[i, j]) ** 2).sum(axis=0) for j in range(k_b)] for i in range(k_a)])
+    central3 = np.array([[((cell_ys[i, j] - observed[i, j]) ** 3).sum(axis=0) for j in range(k_b)] for i in range(k_a)])
+    counts = np.broadcast_to(counts, central2.shape)
+
+    def stack_pair(x):
+        """(k_a-1, k_b, m, 2 cells): the prime's cell and the reference cell of each task."""
+        return np.stack([x[others], np.broadcast_to(x[reference], x[others].shape)], axis=-1)
+
+    sign = np.array([1.0, -1.0])
+    per_task = acceleration(stack_pair(central2), stack_pair(central3), stack_pair(counts), sign)
+    overall = acceleration(np.moveaxis(stack_pair(central2), 1, -2).reshape(len(others), m, -1),
+                           np.moveaxis(stack_pair(central3), 1, -2).reshape(len(others), m, -1),
+                           np.moveaxis(stack_pair(counts), 1, -2).reshape(len(others), m, -1),
+                           np.tile(sign, k_b))
+    accel = np.concatenate([per_task, overall[:, None, :]], axis=1)
+
+    bounds = intervals(diff_draws, estimate, accel, level)
+
+    rows = []
+    for c, column in enumerate(SCORE_COLUMNS):
+        for p, prime in enumerate(others):
+            for t, task in enumerate(b_levels + [OVERALL]):
+                n1 = int(counts[prime, :, c].sum() if task == OVERALL else counts[prime, t, c])
+                n2 = int(counts[reference, :, c].sum() if task == OVERALL else counts[reference, t, c])
+                row = {"score": column, "contrast": f"{a_levels[prime]} - {a_levels[reference]}", "task": task,
+                       "n1": n1, "n2": n2, "estimate": round(float(estimate[p, t, c]), 4)}
+                row.update({k: round(float(v[p, t, c]), 4) for k, v in bounds.items()})
+                rows.append(row)
+    return rows, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap CIs for prime contrasts per task")
+    parser.add_argument("input", nargs="?", default=INPUT, help="graded CSV or results_store directory")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES)
+    parser.add_argument("--ci", type=float, default=CI_LEVEL)
+    parser.add_argument("--method", choices=("percentile", "bca", "both"), default="both")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--grader-model")
+    parser.add_argument("--model")
+    parser.add_argument("--output", help="also write the contrast table as CSV")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    rows, notes = run_bootstrap(args.input, args.resamples, args.ci, args.workers, args.grader_model, args.model)
+    elapsed = time.perf_counter() - t0
+
+    print(f"Input: {args.input}")
+    for note in notes:
+        print(note)
+    pct = int(round(args.ci * 100))
+    header = f"{'contrast':22s} {'task':12s} {'n':>7s} {'diff':>7s}"
+    if args.method in ("percentile", "both"):
+        header += f" {f'{pct}% percentile':>18s}"
+    if args.method in ("bca", "both"):
+        header += f" {f'{pct}% BCa':>18s}"
+    for column in SCORE_COLUMNS:
+        print("")
+        print(column.upper())
+        print(header)
+        for r in rows:
+            if r["score"] != column:
+                continue
+            line = f"{r['contrast']:22s} {r['task']:12s} {r['n1']:3d}/{r['n2']:<3d} {r['estimate']:+7.2f}"
+            if args.method in ("percentile", "both"):
+                line += f"   [{r['pct_lo']:+6.2f}, {r['pct_hi']:+6.2f}]"
+            if args.method in ("bca", "both"):
+                line += f"   [{r['bca_lo']:+6.2f}, {r['bca_hi']:+6.2f}]"
+            excludes_zero = (r["bca_lo"] > 0 or r["bca_hi"] < 0) if args.method != "percentile" else \
+                (r["pct_lo"] > 0 or r["pct_hi"] < 0)
+            print(line + ("  *" if excludes_zero else ""))
+    print("")
+    print(f"* interval excludes 0. {args.resamples} resamples per cell, {len(rows)} contrasts in {elapsed:.1f}s")
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
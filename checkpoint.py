@@ -0,0 +1,53 @@
+"""
+Resume support shared by the runner and the grader.
+
+Reads an existing output CSV, works out which rows already finished, and lets
+the caller rewrite the file with only those rows before appending the rest -
+so a crashed run is finished in the same file instead of starting over.
+"""
+
+import csv
+import os
+
+
+def load_checkpoint(path: str, key, is_done):
+    """Index an existing output CSV.
+
+    key(row) gives the row's identity (e.g. case_id), is_done(row) says whether
+    it finished OK. Returns (done_rows, index): the finished rows to keep, and a
+    key -> row dict for every row seen (finished or not, last one wins).
+    A row cut short by a crash mid-write is never counted as done.
+    """
+    done_rows = {}
+    index = {}
+
+    if not os.path.exists(path):
+        return [], index
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # DictReader pads a truncated last line with None
+            complete = None not in row.values() and None not in row
+            k = key(row)
+            index[k] = row
+            if complete and is_done(row):
+                done_rows[k] = row
+            else:
+                done_rows.pop(k, None)
+
+    return list(done_rows.values()), index
+
+
+def rewrite_rows(path: str, fieldnames: list, rows: list):
+    """Atomically replace `path` with just these rows (header included).
+
+    Used before resuming so failed/partial rows are dropped and their re-runs
+    don't end up as duplicates next to them.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
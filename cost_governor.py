@@ -0,0 +1,145 @@
+"""
+Live cost accounting and a hard budget cap for runner and grader runs.
+
+Costs come from each response's `usage` block (OpenRouter's own `cost` field
+when it's there, otherwise tokens x the PRICING table). The governor reserves
+an estimated cost before each unit of work (a trial, a grading) and settles it
+with the real cost afterwards, so even with many calls in flight it stops
+scheduling BEFORE the cap is crossed. Estimates start from a prior and switch
+to the observed mean cost per model as data comes in.
+"""
+
+import threading
+
+# === PRICING ===
+# USD per 1M tokens. Reasoning tokens are billed as output tokens.
+# Check these against the provider pages before a big run - prices move.
+PRICING = {
+    "anthropic/claude-sonnet-4.5": {"input": 3.00, "cached_input": 0.30, "output": 15.00},
+    "anthropic/claude-opus-4.1":   {"input": 15.00, "cached_input": 1.50, "output": 75.00},
+    "anthropic/claude-haiku-4.5":  {"input": 1.00, "cached_input": 0.10, "output": 5.00},
+    "openai/gpt-5":                {"input": 1.25, "cached_input": 0.125, "output": 10.00},
+    "openai/gpt-5.1":              {"input": 1.25, "cached_input": 0.125, "output": 10.00},
+    "x-ai/grok-4":                 {"input": 3.00, "cached_input": 0.75, "output": 15.00},
+    "google/gemini-2.5-pro":       {"input": 1.25, "cached_input": 0.31, "output": 10.00},
+}
+
+# Unknown models are priced pessimistically so the cap still means something
+DEFAULT_PRICING = {"input": 15.00, "cached_input": 1.50, "output": 75.00}
+
+# Reservations are padded by this factor: with many calls in flight, all
+# reserved on an estimate, a low estimate would otherwise let the cap be overrun.
+RESERVE_MARGIN = 1.5
+
+
+def price_for(model: str) -> dict:
+    return PRICING.get(model, DEFAULT_PRICING)
+
+
+def usage_counts(usage: dict) -> dict:
+    """Normalise a usage block: input / cached / output / reasoning token counts.
+
+    Handles both completion_tokens_details (OpenAI/OpenRouter chat) and
+    output_tokens_details (responses-style) for the reasoning count.
+    """
+    usage = usage or {}
+    prompt_details = usage.get("prompt_tokens_details") or {}
+    output_details = usage.get("completion_tokens_details") or usage.get("output_tokens_details") or {}
+    return {
+        "input": usage.get("prompt_tokens", 0) or 0,
+        "cached": prompt_details.get("cached_tokens", 0) or 0,
+        "output": usage.get("completion_tokens", 0) or 0,
+        "reasoning": output_details.get("reasoning_tokens", 0) or 0,
+    }
+
+
+def call_cost(model: str, usage: dict) -> float:
+    """USD cost of one call. Uses the provider-reported `cost` when present."""
+    usage = usage or {}
+    if isinstance(usage.get("cost"), (int, float)):
+        return float(usage["cost"])
+    counts = usage_counts(usage)
+    price = price_for(model)
+    uncached = max(counts["input"] - counts["cached"], 0)
+    return (
+        uncached * price["input"]
+        + counts["cached"] * price["cached_input"]
+        + counts["output"] * price["output"]
+    ) / 1_000_000
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Prior cost guess for a unit of work before we've seen any real usage."""
+    price = price_for(model)
+    return (input_tokens * price["input"] + output_tokens * price["output"]) / 1_000_000
+
+
+class BudgetGovernor:
+    """Tracks spend per model and refuses new work that could cross the cap.
+
+    budget_usd=None means "track and project, but never refuse".
+    priors maps model -> estimated cost of one unit before real data arrives.
+    """
+
+    def __init__(self, budget_usd: float = None, priors: dict = None):
+        self.budget_usd = budget_usd
+        self.priors = dict(priors or {})
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.n_units = 0
+        self._by_model = {}  # model -> [total cost, units]
+        self._lock = threading.Lock()
+
+    def unit_cost(self, model: str) -> float:
+        """Best current estimate for one unit of work on this model."""
+        total, n = self._by_model.get(model, (0.0, 0))
+        if n:
+            return total / n
+        if model in self.priors:
+            return self.priors[model]
+        if self.n_units:
+            return self.spent / self.n_units
+        return max(self.priors.values(), default=0.0)
+
+    def try_reserve(self, model: str) -> float:
+        """Reserve the estimated cost of one unit. Returns the amount, or None if it would bust the cap."""
+        with self._lock:
+            estimate = self.unit_cost(model) * RESERVE_MARGIN
+            if self.budget_usd is not None and self.spent + self.reserved + estimate > self.budget_usd:
+                return None
+            self.reserved += estimate
+            return estimate
+
+    def settle(self, model: str, reserved: float, actual: float):
+        """Swap a reservation for the real cost of the finished unit."""
+        with self._lock:
+            self.reserved = max(self.reserved - (reserved or 0.0), 0.0)
+            self.spent += actual
+            self.n_units += 1
+            total, n = self._by_model.get(model, (0.0, 0))
+            self._by_model[model] = (total + actual, n + 1)
+
+    def release(self, reserved: float, actual: float = 0.0):
+        """Drop the reservation of a unit that failed part-way.
+
+        What it did cost (calls billed before the failure) is spent, but it
+        isn't counted as a unit: a failed unit's partial or unknown cost would
+        pull the per-model estimate down and let later reservations undershoot.
+        """
+        with self._lock:
+            self.reserved = max(self.reserved - (reserved or 0.0), 0.0)
+            self.spent += actual
+
+    def projected_total(self, remaining_by_model: dict) -> float:
+        """Spent so far plus the estimated cost of everything still to do."""
+        with self._lock:
+            return self.spent + sum(self.unit_cost(m) * n for m, n in remaining_by_model.items())
+
+    def summary(self, remaining_by_model: dict = None) -> str:
+        """One-line progress string for the log."""
+        line = f"$ spent ${self.spent:.2f} over {self.n_units} units"
+        if remaining_by_model is not None:
+            line += f", projected total ${self.projected_total(remaining_by_model):.2f}"
+        if self.budget_usd is not None:
+            line += f" (cap ${self.budget_usd:.2f})"
+        return line
@@ -0,0 +1,223 @@
+"""
+Random access into big run/graded CSVs without parsing them.
+
+The file is memory-mapped and scanned once for record boundaries (quote parity
+per line, so answers with embedded newlines stay one record). The byte offset
+of every record plus its key columns (case_id, blind_id) go into a sidecar
+<csv>.idx.npz, checked against the CSV's size and mtime: an unchanged file
+reuses it, a file that only grew (a run still appending) gets just the new
+records scanned, anything else is re-indexed. A partial last record - crash or
+writer mid-row - is left out until it is finished.
+
+get(key) parses one record; iterating parses one row at a time, so memory stays
+flat however long the file gets.
+
+    python csv_index.py build logs/run_FAILURES_SANITIZED.csv
+    python csv_index.py get merged_graded_minimal_with_batch.csv 017-M-E --field total_score
+"""
+
+import argparse
+import csv
+import io
+import mmap
+import os
+import sys
+import time
+
+import numpy as np
+
+KEY_COLUMNS = ("case_id", "blind_id")
+INDEX_SUFFIX = ".idx.npz"
+SCAN_CHUNK = 1 << 24  # bytes per vectorised boundary scan
+
+
+def _parse(text: str) -> list:
+    return next(csv.reader(io.StringIO(text, newline="")), [])
+
+
+def _scan(mm, start: int, end: int):
+    """Start offsets of the complete records in mm[start:end], and the offset just past the last one.
+
+    A newline ends a record when the number of quotes before it is even; done
+    chunk by chunk with NumPy so the whole file is never copied.
+    """
+    data = np.frombuffer(mm, dtype=np.uint8) if len(mm) else np.empty(0, dtype=np.uint8)
+    ends = []
+    n_quotes = 0
+    chunk = None
+    for lo in range(start, end, SCAN_CHUNK):
+        chunk = data[lo:min(lo + SCAN_CHUNK, end)]
+        quotes = np.flatnonzero(chunk == ord('"'))
+        newlines = np.flatnonzero(chunk == ord("\n"))
+        closed = (n_quotes + np.searchsorted(quotes, newlines)) % 2 == 0
+        ends.append(newlines[closed] + (lo + 1))
+        n_quotes += len(quotes)
+    del data, chunk  # release the buffer so the mmap can be closed
+    ends = np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+    if not len(ends):
+        return [], start
+    starts = np.concatenate([[start], ends[:-1]])
+    blank = [i for i in np.flatnonzero(ends - starts <= 2) if not mm[starts[i]:ends[i]].strip()]
+    return np.delete(starts, blank).tolist(), int(ends[-1])
+
+
+class CsvIndex:
+    """Byte-offset index over a CSV: len(), iteration, `key in index`, index[key], index.get(key).
+
+    Keys are looked up in key_columns in order; if a key occurs more than once
+    the last row wins (same as checkpoint.load_checkpoint).
+    """
+
+    def __init__(self, path: str, key_columns=KEY_COLUMNS, save: bool = True):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        header_end = self._mm.find(b"\n") + 1 if size else 0
+        self.fieldnames = _parse(self._mm[:header_end].decode("utf-8-sig")) if header_end else []
+        self.key_columns = tuple(k for k in key_columns if k in self.fieldnames)
+
+        stat = os.stat(path)
+        self.size, self.mtime_ns = size, stat.st_mtime_ns
+        offsets, keys, end = self._load_sidecar()
+        if offsets is None:
+            offsets, keys, end = [], {k: [] for k in self.key_columns}, header_end
+        new_offsets, end = _scan(self._mm, end, size)
+        if new_offsets or not os.path.exists(self.index_path):
+            for offset, stop in zip(new_offsets, new_offsets[1:] + [end]):
+                values = self._key_values(offset, stop)
+                for k in self.key_columns:
+                    keys[k].append(values.get(k) or "")
+            offsets = list(offsets) + new_offsets
+            if save:
+                self._save_sidecar(offsets, keys, end)
+
+        self._offsets = np.asarray(list(offsets) + [end], dtype=np.int64)  # n records + end sentinel
+        self._lookup = {}
+        for k in reversed(self.key_columns):  # earlier key columns win a clash
+            self._lookup.update((value, i) for i, value in enumerate(keys[k]) if value)
+
+    # --- sidecar ---
+
+    def _load_sidecar(self):
+        """(offsets, keys, end) from a sidecar that still matches the CSV, or (None, None, None)."""
+        if not os.path.exists(self.index_path):
+            return None, None, None
+        try:
+            with np.load(self.index_path) as saved:
+                size, mtime_ns, end = (int(x) for x in saved["meta"])
+                columns = tuple(str(c) for c in saved["key_columns"])
+                if columns != self.key_columns:
+                    return None, None, None
+                if size == self.size and mtime_ns == self.mtime_ns:
+                    pass
+                elif not (self.size > size and end <= size and self._mm[end - 1:end] == b"\n"):
+                    return None, None, None  # rewritten, not just appended to
+                offsets = saved["offsets"].tolist()
+                keys = {k: saved[f"key_{k}"].tolist() for k in columns}
+                return offsets, keys, end
+        except (OSError, ValueError, KeyError):
+            return None, None, None
+
+    def _save_sidecar(self, offsets, keys, end):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, meta=np.array([self.size, self.mtime_ns, end], dtype=np.int64),
+                         offsets=np.asarray(offsets, dtype=np.int64),
+                         key_columns=np.array(self.key_columns, dtype=str),
+                         **{f"key_{k}": np.array(keys[k], dtype=str) for k in self.key_columns})
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass  # read-only location - the index just isn't kept
+
+    # --- access ---
+
+    def _key_values(self, start: int, stop: int) -> dict:
+        """Key columns of a record, from its first line when they're all on it (they come before the answers)."""
+        newline = self._mm.find(b"\n", start, stop)
+        first_line = self._mm[start:newline + 1 if newline >= 0 else stop]
+        fields = _parse(first_line.decode("utf-8"))
+        # a field cut by an embedded newline is only the last one on the line
+        complete = len(fields) if first_line.count(b'"') % 2 == 0 else len(fields) - 1
+        wanted = [self.fieldnames.index(k) for k in self.key_columns]
+        if wanted and max(wanted) >= complete:
+            return self._row_at(start, stop)
+        return {k: fields[i] for k, i in zip(self.key_columns, wanted)}
+
+    def _row_at(self, start: int, stop: int) -> dict:
+        return dict(zip(self.fieldnames, _parse(self._mm[start:stop].decode("utf-8"))))
+
+    def row(self, i: int) -> dict:
+        """The i-th record as a dict."""
+        return self._row_at(int(self._offsets[i]), int(self._offsets[i + 1]))
+
+    def get(self, key: str, default=None):
+        i = self._lookup.get(key)
+        return default if i is None else self.row(i)
+
+    def keys(self):
+        return self._lookup.keys()
+
+    def __getitem__(self, key: str) -> dict:
+        i = self._lookup.get(key)
+        if i is None:
+            raise KeyError(key)
+        return self.row(i)
+
+    def __contains__(self, key) -> bool:
+        return key in self._lookup
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Byte-offset index for run/graded CSVs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="build or refresh the sidecar index")
+    p_build.add_argument("csv", nargs="+")
+    p_get = sub.add_parser("get", help="print one row by case_id or blind_id")
+    p_get.add_argument("csv")
+    p_get.add_argument("key")
+    p_get.add_argument("--field", action="append", help="only these fields (repeatable)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for path in args.csv:
+            t0 = time.perf_counter()
+            with CsvIndex(path) as index:
+                print(f"{path}: {len(index)} records, {len(index.keys())} keys "
+                      f"({', '.join(index.key_columns) or 'no key columns'}) in {time.perf_counter() - t0:.2f}s "
+                      f"-> {index.index_path}")
+        return 0
+
+    with CsvIndex(args.csv) as index:
+        row = index.get(args.key)
+        if row is None:
+            print(f"{args.key} not found in {args.csv}")
+            return 1
+        for field in args.field or index.fieldnames:
+            print(f"{field}: {row.get(field)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Persistent grading cache, so re-grading an answer we've already graded is free.
+
+Key = sha256 of (grader system prompt, user prompt with the blind ID taken out,
+grader model, temperature). Same rubric + same answer + same grader = same key,
+whatever blind ID or run the row ends up in; touch the rubric text and every
+key for that subject changes, so stale grades can't leak in.
+
+Stored in one SQLite file. Only successful grades (parsed total score) are
+cached. Eviction is least-recently-used beyond max_entries and/or anything not
+used for max_age_days.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS grades (
+    key TEXT PRIMARY KEY,
+    grader_model TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    result TEXT NOT NULL
+)
+"""
+
+# Fields of a grade_one_answer result that are worth keeping
+RESULT_FIELDS = ("grader_raw", "content_score", "reasoning_score", "communication_score", "total_score")
+
+
+def cache_key(system_prompt: str, user_prompt: str, blind_id: str, model: str, temperature: float) -> str:
+    """Content address of one grading request. The blind ID is blanked out of the prompt."""
+    if blind_id:
+        user_prompt = user_prompt.replace(blind_id, "", 1)
+    payload = json.dumps([system_prompt, user_prompt, model, float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GradeCache:
+    """Thread-safe SQLite-backed store of parsed grades."""
+
+    def __init__(self, path: str, max_entries: int = None, max_age_days: float = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+
+    def get(self, key: str) -> dict:
+        """Stored result for key, or None."""
+        with self._lock:
+            found = self._db.execute("SELECT result FROM grades WHERE key = ?", (key,)).fetchone()
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE grades SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(found[0])
+
+    def put(self, key: str, model: str, result: dict):
+        """Store a successful grade (results without a total score are ignored)."""
+        if result.get("total_score") is None:
+            return
+        payload = json.dumps({k: result.get(k) for k in RESULT_FIELDS}, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO grades (key, grader_model, created, last_used, hits, result) "
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (key, model, now, now, payload),
+            )
+            self._db.commit()
+
+    def evict(self) -> int:
+        """Apply the age and size limits. Returns the number of entries removed."""
+        removed = 0
+        with self._lock:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._db.execute("DELETE FROM grades WHERE last_used < ?", (cutoff,)).rowcount
+            if self.max_entries is not None:
+                removed += self._db.execute(
+                    "DELETE FROM grades WHERE key NOT IN "
+                    "(SELECT key FROM grades ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._db.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM grades").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -6,12 +6,20 @@
 
 import os
 import csv
+import json
 import time
 import random
 import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
+from itertools import combinations
 
-from openai import OpenAI
+from api_transport import chat_completion
+from checkpoint import load_checkpoint, rewrite_rows
+from cost_governor import BudgetGovernor, call_cost, estimate_cost, usage_counts
+from grade_cache import GradeCache, cache_key
+from grading_stats import PairedAgreement
+from rate_limiter import backoff_delay, provider_of
 
 # =========================
 # CONFIGURATION
@@ -31,28 +39,86 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # Input/output files - UPDATE THIS FOR EACH RUN
 INPUT_CSV = os.path.join(DATA_DIR, "run_20251211_084623.csv")
 
-RUN_ID = datetime.now().strftime('%Y%m%d_%H%M%S')
-OUTPUT_CSV = os.path.join(DATA_DIR, f"graded_{RUN_ID}.csv")
+# Resume - point this at an existing graded_*.csv to finish it instead of starting
+# over. Rows with scores are kept, missing/failed answers are graded into the same
+# file, and every answer (model + case_id) keeps the blind_id it was given the first time.
+RESUME_FROM = None  # e.g. os.path.join(DATA_DIR, "graded_20251211_135942.csv")
+
+if RESUME_FROM:
+    RUN_ID = os.path.splitext(os.path.basename(RESUME_FROM))[0].replace("graded_", "", 1)
+    OUTPUT_CSV = RESUME_FROM
+else:
+    RUN_ID = datetime.now().strftime('%Y%m%d_%H%M%S')
+    OUTPUT_CSV = os.path.join(DATA_DIR, f"graded_{RUN_ID}.csv")
 LOG_FILE = os.path.join(LOG_DIR, f"grader_{RUN_ID}.log")
 
 # --- API Key / Client ---
 OPENROUTER_API_KEY = "" #Caw! Your key here
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY,
-)
+# Calls go through the shared pooled transport (api_transport.py)
+GRADER_TIMEOUT = 180  # seconds; a hung call fails and is retried instead of stalling the run
 
 # --- Grader model ---
-GRADER_MODEL = "openai/gpt-5.1"
+# A list grades every answer with each model (ensemble): all graders get the answer
+# at the same time, the output has one row per answer per grader (grader_model
+# column), and agreement between graders is logged as the run goes.
+GRADER_MODEL = "openai/gpt-5.1"  # or e.g. ["openai/gpt-5.1", "openai/gpt-5.2"]
+GRADER_TEMPERATURE = 0.0
+GRADER_MAX_TOKENS = 1000
+
+# Grading cache (grade_cache.py) - an answer already graded with the same rubric,
+# grader model and temperature is answered from disk instead of the API.
+# Blind IDs are not part of the key. Set USE_GRADE_CACHE = False to force fresh grades.
+USE_GRADE_CACHE = True
+GRADE_CACHE_PATH = os.path.join(DATA_DIR, "grade_cache.sqlite")
+GRADE_CACHE_MAX_ENTRIES = 50000   # least-recently-used beyond this are dropped (None = no limit)
+GRADE_CACHE_MAX_AGE_DAYS = 180    # entries unused this long are dropped (None = keep forever)
 
 # Shuffle order before grading (helps with blinding)
 SHUFFLE_ROWS = True
 
-# Rate limiting
-SLEEP_BETWEEN_CALLS = 1.5
+# Prompt-prefix caching. The system prompt (header + rubric + footer) is identical
+# for every answer in a subject, so grading one subject at a time lets the
+# provider serve it from its prefix cache. Blind IDs are still assigned over the
+# shuffled rows; within a subject rows go in (random) blind_id order. The output
+# CSV is grouped by subject, blind_id order within each.
+GROUP_BY_SUBJECT = True
+# Providers that only cache a prefix marked with cache_control (OpenAI caches
+# automatically). The whole system prompt is marked as the cacheable block.
+CACHE_CONTROL_PROVIDERS = ("anthropic", "google")
+
+# Rate limiting is adaptive (rate_limiter.py, per provider+model, driven by 429s
+# and Retry-After). Retries after empty/unparseable/failed calls back off
+# exponentially with jitter.
 MAX_RETRIES = 2
 
+# Structured output - ask for the grade as JSON (response_format json_schema,
+# GRADER_FOOTER_JSON) instead of free-text score lines. Fields that come back
+# missing or out of range are re-asked on their own in a short follow-up turn
+# instead of paying for a whole new grading call.
+STRUCTURED_OUTPUT = False
+FOLLOWUP_MAX_TOKENS = 200
+
+# Packed grading - put up to PACK_SIZE answers to the same subject into one grader
+# call, so the rubric is sent once per pack instead of once per answer. Answers
+# are shuffled inside each pack (position bias) and the reply is split back into
+# one row per blind_id; anything the pack reply doesn't cover is graded alone.
+# 1 = one answer per call. Check a new pack size with pack_calibration.py first.
+PACK_SIZE = 1
+
+# Parallel grading - up to GRADER_WORKERS grade_one_answer calls in flight at once
+# per grader model (1 = one at a time). Rows are still written to the CSV in
+# blind_id order.
+GRADER_WORKERS = 8
+
+# Budget - hard cap in USD for this grading run (None = track spend but never stop).
+# Grading stops before the cap would be crossed; finish later with RESUME_FROM.
+GRADER_BUDGET_USD = None
+PROGRESS_EVERY = 10  # log spend + projected total every N graded rows
+# Prior token guess per grading call, only used until real usage numbers arrive
+PRIOR_INPUT_TOKENS_PER_GRADE = 2500
+PRIOR_OUTPUT_TOKENS_PER_GRADE = 600
+
 
 # =========================
 # LOGGING
@@ -66,6 +132,27 @@ def log(msg: str):
         f.write(timestamped + "\n")
 
 
+_grade_cache = None
+
+
+def get_grade_cache():
+    """The shared GradeCache, opened (and evicted) on first use. None when disabled."""
+    global _grade_cache
+    if not USE_GRADE_CACHE:
+        return None
+    if _grade_cache is None:
+        _grade_cache = GradeCache(GRADE_CACHE_PATH, GRADE_CACHE_MAX_ENTRIES, GRADE_CACHE_MAX_AGE_DAYS)
+        removed = _grade_cache.evict()
+        log(f"Grade cache: {len(_grade_cache)} entries in {GRADE_CACHE_PATH}"
+            + (f" ({removed} evicted)" if removed else ""))
+    return _grade_cache
+
+
+def grader_models() -> list:
+    """GRADER_MODEL as a list - the first one is the primary grader."""
+    return [GRADER_MODEL] if isinstance(GRADER_MODEL, str) else list(GRADER_MODEL)
+
+
 # =========================
 # MODULAR GRADER PROMPTS
 # =========================
@@ -110,6 +197,54 @@ Then briefly justify each score (1-3 sentences each):
 - Communication: [justification]
 """
 
+# Appended to the system prompt for packed grading (PACK_SIZE > 1)
+GRADER_PACK_NOTE = """
+---
+
+## SEVERAL ANSWERS
+
+This message contains several different students' answers to the same
+assignment, each under its own ID. Grade each answer on its own merits, as if
+it were the only one - do not compare them or rank them against each other.
+For every answer, start with a line "### ID: <id>" and then give its scores and
+justifications in the output format above.
+"""
+
+GRADER_PACK_NOTE_JSON = """
+---
+
+## SEVERAL ANSWERS
+
+This message contains several different students' answers to the same
+assignment, each under its own ID. Grade each answer on its own merits, as if
+it were the only one - do not compare them or rank them against each other.
+Reply with one JSON object whose keys are the answer IDs and whose values are
+the grade objects described above.
+"""
+
+# Footer used instead when STRUCTURED_OUTPUT is on
+GRADER_FOOTER_JSON = """
+---
+
+## OUTPUT FORMAT
+
+Reply with a single JSON object and nothing else. Scores are integers:
+content_score 0-50, reasoning_score 0-30, communication_score 0-20, and
+total_score 0-100 (the sum of the three). Justify each score in 1-3 sentences.
+
+{
+  "content_score": X,
+  "reasoning_score": Y,
+  "communication_score": Z,
+  "total_score": T,
+  "justifications": {
+    "content": "...",
+    "reasoning": "...",
+    "communication": "..."
+  }
+}
+"""
+
 
 # =========================
 # INDIVIDUAL SUBJECT RUBRICS
@@ -551,7 +686,7 @@ def get_grader_system_prompt(subject: str) -> str:
         raise ValueError(f"Unknown subject: {subject!r}. Valid: {list(set(RUBRIC_MAP.keys()))}")
     
     rubric = RUBRIC_MAP[subject_lower]
-    return GRADER_HEADER + rubric + GRADER_FOOTER
+    return GRADER_HEADER + rubric + (GRADER_FOOTER_JSON if STRUCTURED_OUTPUT else GRADER_FOOTER)
 
 
 def make_user_prompt(subject: str, blind_id: str, answer_text: str) -> str:
@@ -575,6 +710,29 @@ Please grade this answer according to your rubric.
 """
 
 
+def make_pack_user_prompt(subject: str, pack: list) -> str:
+    """User prompt carrying several answers to one subject. pack = [(blind_id, answer_text)] in the order shown."""
+    subject_lower = subject.lower()
+
+    if subject_lower not in SUBJECT_DISPLAY:
+        raise ValueError(f"Unknown subject: {subject!r}")
+
+    subject_label, assignment_label = SUBJECT_DISPLAY[subject_lower]
+    answers = "\n\n".join(f"=== ID: {blind_id} ===\n\n{answer_text}" for blind_id, answer_text in pack)
+
+    return f"""Subject: {subject_label}
+Assignment: {assignment_label}
+
+Here are {len(pack)} students' answers:
+
+{answers}
+
+=== END OF ANSWERS ===
+
+Please grade each answer according to your rubric.
+"""
+
+
 # =========================
 # PARSING UTILITIES
 # =========================
@@ -608,12 +766,169 @@ def parse_scores(text: str):
     return content, reasoning, communication, total
 
 
+# Score fields of the JSON grade and their maxima
+SCORE_MAXIMA = {"content_score": 50, "reasoning_score": 30, "communication_score": 20, "total_score": 100}
+
+_json_object_re = re.compile(r"\{.*\}", re.DOTALL)
+_json_field_re = {f: re.compile(r'"%s"\s*:\s*"?(\d+)' % f) for f in SCORE_MAXIMA}
+
+
+def grade_schema(fields=None) -> dict:
+    """response_format for a JSON grade - all four scores plus justifications, or just `fields`."""
+    fields = list(fields or SCORE_MAXIMA)
+    properties = {f: {"type": "integer", "minimum": 0, "maximum": SCORE_MAXIMA[f]} for f in fields}
+    required = list(fields)
+    if len(fields) == len(SCORE_MAXIMA):
+        properties["justifications"] = {
+            "type": "object",
+            "properties": {k: {"type": "string"} for k in ("content", "reasoning", "communication")},
+            "required": ["content", "reasoning", "communication"],
+            "additionalProperties": False,
+        }
+        required.append("justifications")
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "grade",
+            "strict": True,
+            "schema": {"type": "object", "properties": properties, "required": required,
+                       "additionalProperties": False},
+        },
+    }
+
+
+def parse_json_scores(text: str) -> dict:
+    """Valid score fields from a JSON grade. Missing or out-of-range fields are left out.
+
+    Falls back to picking fields out one by one when the JSON itself is broken
+    (e.g. cut off by max_tokens), so whatever did arrive is kept.
+    """
+    data = None
+    m = _json_object_re.search(text or "")
+    if m:
+        try:
+            data = json.loads(m.group(0))
+        except ValueError:
+            data = None
+    if not isinstance(data, dict):
+        data = {}
+        for field, pattern in _json_field_re.items():
+            found = pattern.search(text or "")
+            if found:
+                data[field] = found.group(1)
+
+    valid = {}
+    for field, maximum in SCORE_MAXIMA.items():
+        value = data.get(field)
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= maximum:
+            valid[field] = value
+    return valid
+
+
+def pack_schema(blind_ids: list) -> dict:
+    """response_format for a packed JSON grade: one full grade object per blind ID."""
+    single = grade_schema()["json_schema"]["schema"]
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "grades",
+            "strict": True,
+            "schema": {"type": "object", "properties": {b: single for b in blind_ids},
+                       "required": list(blind_ids), "additionalProperties": False},
+        },
+    }
+
+
+def split_pack_reply(text: str, blind_ids: list) -> dict:
+    """Cut a packed reply into {blind_id: the part grading that answer}. Missing IDs are left out."""
+    text = text or ""
+    if STRUCTURED_OUTPUT:
+        m = _json_object_re.search(text)
+        try:
+            data = json.loads(m.group(0)) if m else {}
+        except ValueError:
+            data = {}
+        if isinstance(data, dict):
+            return {b: json.dumps(data[b]) for b in blind_ids if isinstance(data.get(b), dict)}
+        return {}
+
+    starts = []
+    for blind_id in blind_ids:
+        m = re.search(r"^[#*=\s]*(?:ID:?\s*)?%s\b" % re.escape(blind_id), text, re.MULTILINE)
+        if m:
+            starts.append((m.start(), blind_id))
+    starts.sort()
+    return {
+        blind_id: text[start:starts[i + 1][0] if i + 1 < len(starts) else len(text)]
+        for i, (start, blind_id) in enumerate(starts)
+    }
+
+
+def scores_from_text(text: str):
+    """(content, reasoning, communication, total) from a grader reply in either format."""
+    if STRUCTURED_OUTPUT:
+        fields = parse_json_scores(text)
+        if fields:
+            return tuple(fields.get(f) for f in SCORE_MAXIMA)
+    return parse_scores(text or "")
+
+
 # =========================
 # GRADING FUNCTION
 # =========================
 
-def grade_one_answer(blind_id: str, subject: str, answer_text: str) -> dict:
+def grader_payload(messages: list, model: str = None) -> dict:
+    """Chat-completions request body for one grading call (model defaults to the primary grader)."""
+    model = model or grader_models()[0]
+    if provider_of(model) in CACHE_CONTROL_PROVIDERS:
+        messages = [
+            dict(m, content=[{"type": "text", "text": m["content"], "cache_control": {"type": "ephemeral"}}])
+            if m["role"] == "system" and isinstance(m["content"], str) else m
+            for m in messages
+        ]
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": GRADER_TEMPERATURE,
+        "max_tokens": GRADER_MAX_TOKENS,
+    }
+    if STRUCTURED_OUTPUT:
+        payload["response_format"] = grade_schema()
+    return payload
+
+
+def ask_for_missing_fields(messages: list, reply: str, missing: list, model: str = None) -> dict:
+    """Cheap follow-up turn asking only for the score fields the reply didn't give."""
+    payload = grader_payload(messages + [
+        {"role": "assistant", "content": reply},
+        {"role": "user", "content": f"Your reply did not include valid values for: {', '.join(missing)}. "
+                                    f"Reply with a JSON object containing only those fields."},
+    ], model)
+    payload["max_tokens"] = FOLLOWUP_MAX_TOKENS
+    payload["response_format"] = grade_schema(missing)
+    return chat_completion(OPENROUTER_API_KEY, payload, timeout=GRADER_TIMEOUT)
+
+
+def grade_cache_lookup(system_prompt: str, user_prompt: str, blind_id: str, model: str = None):
+    """(cache key, cached result or None) for one single-answer grading; (None, None) with the cache off."""
+    cache = get_grade_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(system_prompt, user_prompt, blind_id, model or grader_models()[0], GRADER_TEMPERATURE)
+    cached = cache.get(key)
+    if cached is None:
+        return key, None
+    log(f"    ↺ {blind_id} cache hit")
+    return key, dict(cached, grader_cost_usd=0.0, grader_input_tokens=0, grader_cached_tokens=0)
+
+
+def grade_one_answer(blind_id: str, subject: str, answer_text: str, model: str = None) -> dict:
     """Send one answer to the grader model and return raw response + parsed scores."""
+    model = model or grader_models()[0]
     
     # Get subject-specific system prompt (MODULAR!)
     system_prompt = get_grader_system_prompt(subject)
@@ -624,44 +939,79 @@ def grade_one_answer(blind_id: str, subject: str, answer_text: str) -> dict:
         {"role": "user", "content": user_prompt},
     ]
 
+    cache = get_grade_cache()
+    key, cached = grade_cache_lookup(system_prompt, user_prompt, blind_id, model)
+    if cached is not None:
+        return cached
+
+    cost = 0.0  # summed over every attempt - retries are paid for too
+    input_tokens = cached_tokens = 0
+
+    def add_usage(response):
+        nonlocal cost, input_tokens, cached_tokens
+        cost += call_cost(model, response.get("usage"))
+        counts = usage_counts(response.get("usage"))
+        input_tokens += counts["input"]
+        cached_tokens += counts["cached"]
+
     for attempt in range(MAX_RETRIES + 1):
         try:
-            response = client.chat.completions.create(
-                model=GRADER_MODEL,
-                messages=messages,
-                temperature=0.0,
-                max_tokens=1000,
+            response = chat_completion(
+                OPENROUTER_API_KEY,
+                grader_payload(messages, model),
+                timeout=GRADER_TIMEOUT,
             )
+            if "error" in response:
+                raise Exception(f"API error: {response['error']}")
+            add_usage(response)
 
-            text = response.choices[0].message.content
+            text = response["choices"][0]["message"]["content"]
             
             # Check for empty response
             if not text or len(text.strip()) < 20:
-                log(f"    ⚠ Empty/short response on attempt {attempt+1}, retrying...")
-                time.sleep(1.0)
+                log(f"    ⚠ {blind_id} Empty/short response on attempt {attempt+1}, retrying...")
+                time.sleep(backoff_delay(attempt))
                 continue
             
-            content, reasoning, communication, total = parse_scores(text)
+            fields = parse_json_scores(text) if STRUCTURED_OUTPUT else {}
+            if fields:
+                missing = [f for f in SCORE_MAXIMA if f not in fields]
+                if missing:
+                    log(f"    ⚠ {blind_id} Missing/invalid {', '.join(missing)} - asking for just those")
+                    followup = ask_for_missing_fields(messages, text, missing, model)
+                    add_usage(followup)
+                    followup_text = followup["choices"][0]["message"]["content"] or ""
+                    fields.update({k: v for k, v in parse_json_scores(followup_text).items() if k in missing})
+                    text = f"{text}\n\n[follow-up] {followup_text}"
+                content, reasoning, communication, total = (fields.get(f) for f in SCORE_MAXIMA)
+            else:
+                content, reasoning, communication, total = scores_from_text(text)
             
             # Check if we got valid scores
             if content is None and reasoning is None and total is None:
-                log(f"    ⚠ Could not parse scores on attempt {attempt+1}, retrying...")
-                log(f"    Response preview: {text[:200]}...")
-                time.sleep(1.0)
+                log(f"    ⚠ {blind_id} Could not parse scores on attempt {attempt+1}, retrying...")
+                log(f"    {blind_id} Response preview: {text[:200]}...")
+                time.sleep(backoff_delay(attempt))
                 continue
 
-            return {
+            result = {
                 "grader_raw": text,
                 "content_score": content,
                 "reasoning_score": reasoning,
                 "communication_score": communication,
                 "total_score": total,
+                "grader_cost_usd": round(cost, 6),
+                "grader_input_tokens": input_tokens,
+                "grader_cached_tokens": cached_tokens,
             }
+            if cache is not None:
+                cache.put(key, model, result)
+            return result
             
         except Exception as e:
-            log(f"    ⚠ API error on attempt {attempt+1}: {e}")
+            log(f"    ⚠ {blind_id} API error on attempt {attempt+1}: {e}")
             if attempt < MAX_RETRIES:
-                time.sleep(2.0)
+                time.sleep(backoff_delay(attempt + 1))
                 continue
             else:
                 return {
@@ -670,6 +1020,9 @@ def grade_one_answer(blind_id: str, subject: str, answer_text: str) -> dict:
                     "reasoning_score": None,
                     "communication_score": None,
                     "total_score": None,
+                    "grader_cost_usd": round(cost, 6),
+                    "grader_input_tokens": input_tokens,
+                    "grader_cached_tokens": cached_tokens,
                 }
     
     # If we exhausted retries without success
@@ -679,33 +1032,302 @@ def grade_one_answer(blind_id: str, subject: str, answer_text: str) -> dict:
         "reasoning_score": None,
         "communication_score": None,
         "total_score": None,
+        "grader_cost_usd": round(cost, 6),
+        "grader_input_tokens": input_tokens,
+        "grader_cached_tokens": cached_tokens,
     }
 
 
+def grade_pack(subject: str, pack: list, model: str = None) -> dict:
+    """Grade several answers to one subject in a single call. pack = [(blind_id, answer_text)].
+
+    Returns {blind_id: result} like grade_one_answer's, each with "grader_pack"
+    = "<position>/<size> <blind IDs in the order shown>". Cost and tokens of the
+    call are split evenly over the answers it graded. Cache hits skip the pack;
+    answers the reply doesn't score are graded one at a time. Packed grades are
+    not written to the grade cache (different prompt context).
+    """
+    model = model or grader_models()[0]
+    results = {}
+    todo = []
+    system_prompt = get_grader_system_prompt(subject)
+    for blind_id, answer_text in pack:
+        _, cached = grade_cache_lookup(system_prompt, make_user_prompt(subject, blind_id, answer_text), blind_id, model)
+        if cached is not None:
+            results[blind_id] = dict(cached, grader_pack="")
+        else:
+            todo.append((blind_id, answer_text))
+
+    if len(todo) <= 1:
+        for blind_id, answer_text in todo:
+            results[blind_id] = dict(grade_one_answer(blind_id, subject, answer_text, model), grader_pack="")
+        return results
+
+    order = list(todo)
+    random.shuffle(order)
+    ids = [blind_id for blind_id, _ in order]
+    messages = [
+        {"role": "system", "content": system_prompt + (GRADER_PACK_NOTE_JSON if STRUCTURED_OUTPUT else GRADER_PACK_NOTE)},
+        {"role": "user", "content": make_pack_user_prompt(subject, order)},
+    ]
+    payload = grader_payload(messages, model)
+    payload["max_tokens"] = GRADER_MAX_TOKENS * len(order)
+    if STRUCTURED_OUTPUT:
+        payload["response_format"] = pack_schema(ids)
+
+    sections = {}
+    spent = {"grader_cost_usd": 0.0, "grader_input_tokens": 0, "grader_cached_tokens": 0}
+    called = False
+
+    def add_usage(response):
+        counts = usage_counts(response.get("usage"))
+        spent["grader_cost_usd"] += call_cost(model, response.get("usage"))
+        spent["grader_input_tokens"] += counts["input"]
+        spent["grader_cached_tokens"] += counts["cached"]
+
+    try:
+        response = chat_completion(OPENROUTER_API_KEY, payload, timeout=GRADER_TIMEOUT * 2)
+        if "error" in response:
+            raise Exception(f"API error: {response['error']}")
+        called = True
+        add_usage(response)
+        reply = response["choices"][0]["message"]["content"] or ""
+        sections = split_pack_reply(reply, ids)
+
+        # JSON grades with some fields missing: one follow-up for all of them
+        missing = {}
+        for blind_id, section in sections.items():
+            fields = parse_json_scores(section) if STRUCTURED_OUTPUT else {}
+            if fields and len(fields) < len(SCORE_MAXIMA):
+                missing[blind_id] = [f for f in SCORE_MAXIMA if f not in fields]
+        if missing:
+            log(f"    ⚠ Pack reply missing fields for {' '.join(missing)} - asking for just those")
+            followup_payload = grader_payload(messages + [
+                {"role": "assistant", "content": reply},
+                {"role": "user", "content": "These answers are missing valid values: "
+                    + "; ".join(f"{b}: {', '.join(fs)}" for b, fs in missing.items())
+                    + ". Reply with a JSON object keyed by answer ID containing only those fields."},
+            ], model)
+            followup_payload["max_tokens"] = FOLLOWUP_MAX_TOKENS
+            followup_payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "missing",
+                    "strict": True,
+                    "schema": {"type": "object",
+                               "properties": {b: grade_schema(fs)["json_schema"]["schema"] for b, fs in missing.items()},
+                               "required": list(missing), "additionalProperties": False},
+                },
+            }
+            followup = chat_completion(OPENROUTER_API_KEY, followup_payload, timeout=GRADER_TIMEOUT)
+            add_usage(followup)
+            for blind_id, part in split_pack_reply(followup["choices"][0]["message"]["content"], list(missing)).items():
+                merged = parse_json_scores(sections[blind_id])
+                merged.update({k: v for k, v in parse_json_scores(part).items() if k in missing[blind_id]})
+                sections[blind_id] = json.dumps(merged) + f"\n\n[follow-up] {part}"
+    except Exception as e:
+        log(f"    ⚠ Pack {' '.join(ids)} failed: {e} - grading the unscored answers one at a time")
+
+    share = {k: v / len(order) if isinstance(v, float) else v // len(order) for k, v in spent.items()}
+    for position, (blind_id, answer_text) in enumerate(order, start=1):
+        section = sections.get(blind_id, "")
+        content, reasoning, communication, total = scores_from_text(section) if section else (None,) * 4
+        if content is None and reasoning is None and total is None:
+            if called:
+                log(f"    ⚠ {blind_id} not scored in pack reply - grading it alone")
+            result = grade_one_answer(blind_id, subject, answer_text, model)
+            for k, v in share.items():
+                result[k] = round(result[k] + v, 6) if isinstance(v, float) else result[k] + v
+            results[blind_id] = dict(result, grader_pack="")
+            continue
+        results[blind_id] = {
+            "grader_raw": section.strip(),
+            "content_score": content,
+            "reasoning_score": reasoning,
+            "communication_score": communication,
+            "total_score": total,
+            "grader_cost_usd": round(share["grader_cost_usd"], 6),
+            "grader_input_tokens": share["grader_input_tokens"],
+            "grader_cached_tokens": share["grader_cached_tokens"],
+            "grader_pack": f"{position}/{len(order)} {' '.join(ids)}",
+        }
+    return results
+
+
 # =========================
 # MAIN PIPELINE
 # =========================
 
-def main():
-    log("=" * 60)
-    log("HOLIDAY GRADER v3.0 - MODULAR PER-SUBJECT PROMPTS")
-    log("=" * 60)
-    log(f"Grader model: {GRADER_MODEL}")
-    log(f"Input: {INPUT_CSV}")
-    log(f"Output: {OUTPUT_CSV}")
-    log(f"Log: {LOG_FILE}")
-    log("=" * 60)
-    
+def answer_key(row: dict) -> tuple:
+    """(model, case_id) - one answer. A MODELS sweep repeats every case_id once per model."""
+    return (row.get("model") or "", row.get("case_id"))
+
+
+def failed_grade(message: str) -> dict:
+    """Grade result for an answer that couldn't be graded (no scores, no known cost)."""
+    return {
+        "grader_raw": message,
+        "content_score": None,
+        "reasoning_score": None,
+        "communication_score": None,
+        "total_score": None,
+        "grader_cost_usd": 0.0,
+    }
+
+
+def grade_succeeded(row: dict) -> bool:
+    """A graded row counts as done once it has a total score."""
+    return (row.get("total_score") or "").strip() not in ("", "None")
+
+
+# Columns the grader appends to each input row
+GRADED_FIELDS = [
+    "blind_id",
+    "grader_model",
+    "content_score",
+    "reasoning_score",
+    "communication_score",
+    "total_score",
+    "grader_cost_usd",
+    "grader_input_tokens",
+    "grader_cached_tokens",
+    "grader_pack",
+    "grader_raw",
+]
+
+
+def make_out_row(row: dict, blind_id: str, grade_result: dict, model: str = None) -> dict:
+    """Input row + blind ID + grade -> one row of the graded CSV (one per answer per grader)."""
+    out_row = dict(row)
+    out_row.update({
+        "blind_id": blind_id,
+        "grader_model": model or grader_models()[0],
+        "content_score": grade_result["content_score"],
+        "reasoning_score": grade_result["reasoning_score"],
+        "communication_score": grade_result["communication_score"],
+        "total_score": grade_result["total_score"],
+        "grader_cost_usd": grade_result["grader_cost_usd"],
+        "grader_input_tokens": grade_result.get("grader_input_tokens", ""),
+        "grader_cached_tokens": grade_result.get("grader_cached_tokens", ""),
+        "grader_pack": grade_result.get("grader_pack", ""),
+        "grader_raw": grade_result["grader_raw"],
+    })
+    return out_row
+
+
+def log_grade(blind_id: str, grade_result: dict, model: str = None):
+    if len(grader_models()) > 1:
+        blind_id = f"{blind_id} [{model or grader_models()[0]}]"
+    if grade_result["total_score"] is not None:
+        log(f"    ✓ {blind_id} Scores: {grade_result['content_score']}/{grade_result['reasoning_score']}/{grade_result['communication_score']} = {grade_result['total_score']}")
+    else:
+        log(f"    ✗ {blind_id} FAILED: {grade_result['grader_raw'][:100]}...")
+
+
+def grade_job(i: int, n_jobs: int, blind_id: str, row: dict, model: str = None) -> dict:
+    """Grade one blinded row (runs on a worker thread) and return its output row."""
+    task = row["task"]
+    answer_text = row["output"]
+    model = model or grader_models()[0]
+
+    log(f"[{i:3d}/{n_jobs}] {blind_id} | task={task} | case_id={row.get('case_id', '?')}"
+        + (f" | grader={model}" if len(grader_models()) > 1 else ""))
+
+    grade_result = grade_one_answer(
+        blind_id=blind_id,
+        subject=task,
+        answer_text=answer_text,
+        model=model,
+    )
+
+    # Log result
+    log_grade(blind_id, grade_result, model)
+
+    return make_out_row(row, blind_id, grade_result, model)
+
+
+def grade_pack_job(i: int, n_jobs: int, jobs: list, model: str = None) -> list:
+    """Grade a pack of blinded rows (same subject) in one call; output rows in the given order."""
+    task = jobs[0][1]["task"]
+    model = model or grader_models()[0]
+    log(f"[{i:3d}-{i + len(jobs) - 1:3d}/{n_jobs}] pack {' '.join(b for b, _ in jobs)} | task={task}"
+        + (f" | grader={model}" if len(grader_models()) > 1 else ""))
+
+    results = grade_pack(task, [(blind_id, row["output"]) for blind_id, row in jobs], model)
+
+    out_rows = []
+    for blind_id, row in jobs:
+        log_grade(blind_id, results[blind_id], model)
+        out_rows.append(make_out_row(row, blind_id, results[blind_id], model))
+    return out_rows
+
+
+def new_agreement() -> dict:
+    """{(grader a, grader b): {score field: PairedAgreement}} for every pair of graders."""
+    return {pair: {field: PairedAgreement() for field in SCORE_MAXIMA}
+            for pair in combinations(grader_models(), 2)}
+
+
+def add_agreement(agreement: dict, out_rows: list):
+    """Feed one answer's rows (one per grader) into the running agreement."""
+    by_model = {r["grader_model"]: r for r in out_rows}
+    for (a, b), fields in agreement.items():
+        if a not in by_model or b not in by_model:
+            continue
+        for field, stats in fields.items():
+            x, y = by_model[a][field], by_model[b][field]
+            if x not in (None, "", "None") and y not in (None, "", "None"):
+                stats.add(x, y)
+
+
+def log_agreement(agreement: dict, fields: list = tuple(SCORE_MAXIMA)):
+    """Quadratic-weighted kappa, ICC(1) and mean offset (b - a) per grader pair and dimension."""
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-".rjust(len(format(0.0, spec)))
+
+    for (a, b), by_field in agreement.items():
+        log(f"Agreement {a} vs {b} (offset = {b.split('/')[-1]} - {a.split('/')[-1]}):")
+        for field in fields:
+            stats = by_field[field]
+            log(f"    {field:20s} n={stats.n:4d}  kappa_w {fmt(stats.weighted_kappa(), '6.3f')}  "
+                f"ICC {fmt(stats.icc(), '6.3f')}  offset {fmt(stats.mean_offset, '+6.2f')}")
+
+
+def make_units(jobs: list) -> list:
+    """Split job positions into dispatch units: single jobs, or packs of one subject."""
+    if PACK_SIZE <= 1:
+        return [[i] for i in range(len(jobs))]
+    units = []
+    open_packs = {}  # task -> positions in the pack being filled
+    for i, (_, row) in enumerate(jobs):
+        pack = open_packs.setdefault(row["task"].lower(), [])
+        if not pack:
+            units.append(pack)
+        pack.append(i)
+        if len(pack) == PACK_SIZE:
+            del open_packs[row["task"].lower()]
+    return units
+
+
+def load_jobs():
+    """Read INPUT_CSV, apply resume/shuffle/limit and assign blind IDs.
+
+    Returns (fieldnames, done_rows, jobs) where jobs is a list of (blind_id, row)
+    in dispatch order (blind_id order, grouped by subject if GROUP_BY_SUBJECT),
+    or None if there is nothing gradeable. With several graders a job is listed
+    if any of them still has to grade it - done_rows says which ones have.
+    """
     # --- Load input CSV ---
     rows = []
     with open(INPUT_CSV, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
             rows.append(row)
+        input_fieldnames = list(reader.fieldnames or [])
 
     if not rows:
         log("ERROR: No rows found in input CSV.")
-        return
+        return None
 
     log(f"Loaded {len(rows)} rows from input CSV")
 
@@ -715,10 +1337,22 @@ def main():
 
     if not rows:
         log("ERROR: No rows with recognizable tasks.")
-        return
+        return None
 
     log(f"Found {len(rows)} gradeable rows")
 
+    # Resume: index what the previous attempt already finished (per answer per grader)
+    done_rows = []
+    prev_blind_ids = {}  # (model, case_id) -> blind_id, finished or not
+    if RESUME_FROM:
+        done_rows, seen = load_checkpoint(OUTPUT_CSV, key=lambda r: (answer_key(r), r.get("grader_model")),
+                                          is_done=grade_succeeded)
+        done_pairs = {(answer_key(r), r.get("grader_model")) for r in done_rows}
+        prev_blind_ids = {key: r["blind_id"] for (key, _), r in seen.items() if r.get("blind_id")}
+        rows = [r for r in rows if any((answer_key(r), m) not in done_pairs for m in grader_models())]
+        log(f"RESUMING {RESUME_FROM}: {len(done_rows)} already graded, "
+            f"{len(seen) - len(done_rows)} failed/partial, {len(rows)} answers left to grade")
+
     # Assign blind IDs and shuffle order if desired
     indices = list(range(len(rows)))
     if SHUFFLE_ROWS:
@@ -729,61 +1363,175 @@ def main():
         indices = indices[:MAX_TO_GRADE]
         log(f"Limiting to first {MAX_TO_GRADE} rows")
 
-    log("=" * 60)
+    # Re-graded rows keep their old blind ID; new ones continue the numbering
+    next_blind = 1 + max([int(b[1:]) for b in prev_blind_ids.values() if b[1:].isdigit()] or [0])
+    jobs = []
+    for idx in indices:
+        row = rows[idx]
+        blind_id = prev_blind_ids.get(answer_key(row))
+        if blind_id is None:
+            blind_id = f"B{next_blind:03d}"
+            next_blind += 1
+        jobs.append((blind_id, row))
+    # Output goes in blind_id order (resumed rows keep their old, scattered IDs)
+    jobs.sort(key=lambda job: int(job[0][1:]) if job[0][1:].isdigit() else 0)
+    if GROUP_BY_SUBJECT:
+        # Stable sort: subjects in order of first appearance, blind_id order within
+        first_seen = {}
+        for _, row in jobs:
+            first_seen.setdefault(get_grader_system_prompt(row["task"]), len(first_seen))
+        jobs.sort(key=lambda job: first_seen[get_grader_system_prompt(job[1]["task"])])
+        log(f"Grouped dispatch by subject ({len(first_seen)} subjects) for prompt-prefix caching")
+
+    return input_fieldnames + GRADED_FIELDS, done_rows, jobs
 
-    # Prepare output CSV
-    fieldnames = list(rows[0].keys()) + [
-        "blind_id",
-        "grader_model",
-        "content_score",
-        "reasoning_score",
-        "communication_score",
-        "total_score",
-        "grader_raw",
-    ]
 
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as out_f:
-        writer = csv.DictWriter(out_f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for i, idx in enumerate(indices, start=1):
-            row = rows[idx]
-            task = row["task"]
-            answer_text = row["output"]
-
-            blind_id = f"B{i:03d}"
+def main():
+    log("=" * 60)
+    log("HOLIDAY GRADER v3.0 - MODULAR PER-SUBJECT PROMPTS")
+    log("=" * 60)
+    models = grader_models()
+    log(f"Grader model{'s' if len(models) > 1 else ''}: {', '.join(models)}")
+    log(f"Input: {INPUT_CSV}")
+    log(f"Output: {OUTPUT_CSV}")
+    log(f"Log: {LOG_FILE}")
+    get_grade_cache()  # open before the workers start
+    log("=" * 60)
+    
+    loaded = load_jobs()
+    if loaded is None:
+        return
+    fieldnames, done_rows, jobs = loaded
+
+    # Dispatch units: (job positions, grader) - one job each, or packs of PACK_SIZE
+    # jobs from one subject - for every grader that hasn't graded those jobs yet.
+    # Sorted by first position, so all graders get an answer at about the same time.
+    done_pairs = {(answer_key(r), r.get("grader_model")) for r in done_rows}
+    units = []
+    for model in models:
+        positions = [i for i, (_, row) in enumerate(jobs) if (answer_key(row), model) not in done_pairs]
+        units += [([positions[j] for j in unit], model) for unit in make_units([jobs[i] for i in positions])]
+    units.sort(key=lambda u: u[0][0])
+    n_expected = {}  # job position -> number of graders that will grade it
+    for unit, _ in units:
+        for i in unit:
+            n_expected[i] = n_expected.get(i, 0) + 1
+    remaining = {m: sum(1 for _, um in units if um == m) for m in models}
+
+    per_unit = sum(len(u) for u, _ in units) / len(units) if units else 1
+    governor = BudgetGovernor(GRADER_BUDGET_USD, {
+        m: per_unit * estimate_cost(m, PRIOR_INPUT_TOKENS_PER_GRADE, PRIOR_OUTPUT_TOKENS_PER_GRADE) for m in models
+    })
+    if PACK_SIZE > 1:
+        log(f"Packed grading: {sum(len(u) for u, _ in units)} gradings in {len(units)} calls (up to {PACK_SIZE} per call)")
+    log(f"Estimated cost: ~${governor.projected_total(remaining):.2f}"
+        + (f" (budget cap ${GRADER_BUDGET_USD:.2f})" if GRADER_BUDGET_USD is not None else ""))
+    log("=" * 60)
 
-            log(f"[{i:3d}/{len(indices)}] {blind_id} | task={task} | case_id={row.get('case_id', '?')}")
+    if RESUME_FROM:
+        if not jobs:
+            log("Nothing left to grade.")
+            return
+        # Drop failed/partial rows now so their re-grades don't sit next to them
+        rewrite_rows(OUTPUT_CSV, fieldnames, done_rows)
 
-            grade_result = grade_one_answer(
-                blind_id=blind_id,
-                subject=task,
-                answer_text=answer_text,
-            )
-            
-            # Log result
-            if grade_result["total_score"] is not None:
-                log(f"    ✓ Scores: {grade_result['content_score']}/{grade_result['reasoning_score']}/{grade_result['communication_score']} = {grade_result['total_score']}")
-            else:
-                log(f"    ✗ FAILED: {grade_result['grader_raw'][:100]}...")
-
-            out_row = dict(row)
-            out_row.update({
-                "blind_id": blind_id,
-                "grader_model": GRADER_MODEL,
-                "content_score": grade_result["content_score"],
-                "reasoning_score": grade_result["reasoning_score"],
-                "communication_score": grade_result["communication_score"],
-                "total_score": grade_result["total_score"],
-                "grader_raw": grade_result["grader_raw"],
-            })
-            writer.writerow(out_row)
-            out_f.flush()
-
-            time.sleep(SLEEP_BETWEEN_CALLS)
+    with open(OUTPUT_CSV, "a" if RESUME_FROM else "w", newline="", encoding="utf-8") as out_f:
+        writer = csv.DictWriter(out_f, fieldnames=fieldnames)
+        if not RESUME_FROM:
+            writer.writeheader()
+
+        # Keep at most GRADER_WORKERS units per grader in flight, each with its
+        # budget reserved at dispatch. Finished rows wait in `ready` until every
+        # grader is done with that job and every job before it has been written.
+        ready = {}  # job position -> {grader: out_row}
+        next_to_write = 0
+        next_unit = 0
+        in_flight = {}  # future -> (unit, grader, reserved)
+        budget_hit = False
+        workers = max(1, GRADER_WORKERS) * len(models)
+        input_tokens = cached_tokens = 0
+        n_written = 0
+        next_progress = PROGRESS_EVERY
+        agreement = new_agreement()
+        earlier = {}  # (model, case_id) -> rows kept from the resumed file, so agreement covers them too
+        for r in done_rows:
+            earlier.setdefault(answer_key(r), []).append(r)
+
+        def write_position(position):
+            nonlocal input_tokens, cached_tokens, n_written, next_progress
+            by_model = ready.pop(position, {})
+            out_rows = [by_model[m] for m in models if m in by_model]
+            for out_row in out_rows:
+                input_tokens += out_row["grader_input_tokens"] or 0
+                cached_tokens += out_row["grader_cached_tokens"] or 0
+                writer.writerow(out_row)
+            add_agreement(agreement, out_rows + earlier.pop(answer_key(jobs[position][1]), []))
+            n_written += len(out_rows)
+            if n_written >= next_progress:
+                next_progress += PROGRESS_EVERY
+                log(governor.summary(remaining))
+                log_agreement(agreement, ["total_score"])
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while in_flight or (next_unit < len(units) and not budget_hit):
+                while len(in_flight) < workers and next_unit < len(units) and not budget_hit:
+                    unit, model = units[next_unit]
+                    reserved = governor.try_reserve(model)
+                    if reserved is None:
+                        n_left = sum(len(u) for u, _ in units[next_unit:])
+                        log(f"⏸ Budget cap reached - {n_left} gradings not done")
+                        budget_hit = True
+                        break
+                    if len(unit) == 1:
+                        blind_id, row = jobs[unit[0]]
+                        future = pool.submit(grade_job, unit[0] + 1, len(jobs), blind_id, row, model)
+                    else:
+                        future = pool.submit(grade_pack_job, unit[0] + 1, len(jobs), [jobs[i] for i in unit], model)
+                    in_flight[future] = (unit, model, reserved)
+                    next_unit += 1
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unit, model, reserved = in_flight.pop(future)
+                    try:
+                        out_rows = future.result()
+                    except Exception as e:
+                        # A bug past grade_one_answer's own retries - fail these rows, keep the run going
+                        log(f"    ✗ {' '.join(jobs[i][0] for i in unit)} [{model}] grading crashed: {e!r}")
+                        out_rows = [make_out_row(jobs[i][1], jobs[i][0], failed_grade(f"ERROR: grading crashed: {e!r}"),
+                                                 model) for i in unit]
+                        governor.release(reserved)  # whatever it cost is unknown
+                    else:
+                        if len(unit) == 1:
+                            out_rows = [out_rows]
+                        governor.settle(model, reserved, sum(r["grader_cost_usd"] for r in out_rows))
+                    remaining[model] -= 1
+                    for position, out_row in zip(unit, out_rows):
+                        ready.setdefault(position, {})[model] = out_row
+
+                while next_to_write < len(jobs) and len(ready.get(next_to_write, ())) == n_expected.get(next_to_write, 0):
+                    write_position(next_to_write)
+                    next_to_write += 1
+                out_f.flush()
+
+        # After a budget stop, packs and graders can leave gaps - write what did finish
+        for position in sorted(ready):
+            write_position(position)
+        for rows in earlier.values():
+            add_agreement(agreement, rows)
 
     log("=" * 60)
-    log(f"COMPLETE! Wrote {len(indices)} graded results to {OUTPUT_CSV}")
+    log(governor.summary())
+    if agreement:
+        log_agreement(agreement)
+    if input_tokens:
+        log(f"Prompt cache: {cached_tokens}/{input_tokens} input tokens served from the provider cache "
+            f"({100 * cached_tokens / input_tokens:.0f}%)")
+    if _grade_cache is not None:
+        log(f"Grade cache: {_grade_cache.hits} hits, {_grade_cache.misses} misses")
+    log(f"COMPLETE! Wrote {n_written} graded results to {OUTPUT_CSV}")
     log("=" * 60)
 
 
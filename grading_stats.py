@@ -0,0 +1,159 @@
+"""
+Small statistics helpers for grader reliability work (stdlib only).
+
+RunningStats keeps a Welford running mean/variance, so a case's spread can be
+checked after every new grading without keeping or re-scanning the history.
+icc_oneway / within_case_sd summarise how much of the score variance is the
+answers versus the grader's own noise. PairedAgreement does the same kind of
+running bookkeeping for two different graders scoring the same answers.
+"""
+
+import math
+
+# Two-sided 95% t critical values by degrees of freedom (df > 30 -> normal)
+_T95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+def t_critical_95(df: int) -> float:
+    """Two-sided 95% Student t critical value."""
+    if df < 1:
+        return math.inf
+    return _T95[df - 1] if df <= len(_T95) else 1.960
+
+
+class RunningStats:
+    """Welford's online mean and variance."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (n - 1); 0 with fewer than two values."""
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def sd(self) -> float:
+        return math.sqrt(self.variance)
+
+    def ci_width(self) -> float:
+        """Full width of the 95% t confidence interval for the mean (inf below two values)."""
+        if self.n < 2:
+            return math.inf
+        return 2 * t_critical_95(self.n - 1) * self.sd / math.sqrt(self.n)
+
+
+def one_way_anova(groups: list):
+    """(MS between, MS within, n0) for a list of per-case score lists.
+
+    n0 is the effective group size for unbalanced groups. Groups with fewer
+    than one value are ignored. Returns None if there aren't at least two
+    groups and one degree of freedom within.
+    """
+    groups = [[float(x) for x in g] for g in groups if len(g) >= 1]
+    k = len(groups)
+    n_total = sum(len(g) for g in groups)
+    if k < 2 or n_total - k < 1:
+        return None
+    grand_mean = sum(sum(g) for g in groups) / n_total
+    ss_between = sum(len(g) * (sum(g) / len(g) - grand_mean) ** 2 for g in groups)
+    ss_within = sum(sum((x - sum(g) / len(g)) ** 2 for x in g) for g in groups)
+    ms_between = ss_between / (k - 1)
+    ms_within = ss_within / (n_total - k)
+    n0 = (n_total - sum(len(g) ** 2 for g in groups) / n_total) / (k - 1)
+    return ms_between, ms_within, n0
+
+
+def icc_oneway(groups: list) -> float:
+    """ICC(1): share of score variance due to the case rather than the grading.
+
+    1.0 = repeat gradings of a case always agree; 0 = the grader is pure noise.
+    None if it can't be computed (fewer than two cases, or no within-case reps).
+    """
+    anova = one_way_anova(groups)
+    if anova is None:
+        return None
+    ms_between, ms_within, n0 = anova
+    denominator = ms_between + (n0 - 1) * ms_within
+    if denominator <= 0:
+        return None
+    return (ms_between - ms_within) / denominator
+
+
+def within_case_sd(groups: list) -> float:
+    """Pooled within-case SD - the grader's noise on one grading, in score points."""
+    pooled_ss = 0.0
+    df = 0
+    for g in groups:
+        if len(g) > 1:
+            stats = RunningStats()
+            for x in g:
+                stats.add(float(x))
+            pooled_ss += stats.variance * (stats.n - 1)
+            df += stats.n - 1
+    return math.sqrt(pooled_ss / df) if df else None
+
+
+class PairedAgreement:
+    """Running agreement between two graders scoring the same answers.
+
+    Keeps only sums, so it can be updated after every graded pair. Offsets and
+    kappa are b relative to a.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self._sa = self._sb = self._saa = self._sbb = self._sab = 0.0
+
+    def add(self, a: float, b: float):
+        a, b = float(a), float(b)
+        self.n += 1
+        self._sa += a
+        self._sb += b
+        self._saa += a * a
+        self._sbb += b * b
+        self._sab += a * b
+
+    @property
+    def mean_offset(self) -> float:
+        """Mean of b - a (positive = grader b scores higher)."""
+        return (self._sb - self._sa) / self.n if self.n else None
+
+    def weighted_kappa(self) -> float:
+        """Cohen's kappa with quadratic weights, for integer scores.
+
+        With quadratic weights kappa is 2 cov(a, b) / (var a + var b + (mean a - mean b)^2)
+        over the observed pairs, so no contingency table is needed.
+        None with fewer than two pairs or no variance at all.
+        """
+        if self.n < 2:
+            return None
+        mean_a, mean_b = self._sa / self.n, self._sb / self.n
+        var_a = self._saa / self.n - mean_a ** 2
+        var_b = self._sbb / self.n - mean_b ** 2
+        cov = self._sab / self.n - mean_a * mean_b
+        denominator = var_a + var_b + (mean_a - mean_b) ** 2
+        return 2 * cov / denominator if denominator > 0 else None
+
+    def icc(self) -> float:
+        """ICC(1) of the pairs, the same measure icc_oneway gives for repeat gradings."""
+        if self.n < 2:
+            return None
+        sum_m = (self._sa + self._sb) / 2
+        sum_mm = (self._saa + 2 * self._sab + self._sbb) / 4
+        ms_between = 2 * (sum_mm - sum_m ** 2 / self.n) / (self.n - 1)
+        ms_within = (self._saa - 2 * self._sab + self._sbb) / 2 / self.n
+        denominator = ms_between + ms_within
+        return (ms_between - ms_within) / denominator if denominator > 0 else None
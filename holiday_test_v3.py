@@ -7,20 +7,81 @@ Subjects: CS, Econ, Physics, Biochem, Math, Philosophy, Tech & Society
 Primes: Christmas, Monday, Null
 """
 
-import requests
+import asyncio
 import csv
 import time
 import random
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import adaptive_design
+from api_transport import chat_completion, stream_chat_completion
+from checkpoint import load_checkpoint, rewrite_rows
+from cost_governor import BudgetGovernor, call_cost, estimate_cost, usage_counts
+from rate_limiter import backoff_delay, provider_of, seed_limiter
+
 # === CONFIGURATION ===
 OPENROUTER_API_KEY = "" #Caw! Your key here
 MODEL = "anthropic/claude-sonnet-4.5"
 
+# Multi-model sweep - every model here gets the full prime x task x rep design,
+# all in one combined shuffled trial plan. Leave as [MODEL] for a single-model run.
+MODELS = [MODEL]
+# MODELS = [
+#     "anthropic/claude-sonnet-4.5",
+#     "anthropic/claude-opus-4.1",
+#     "openai/gpt-5.1",
+#     "x-ai/grok-4",
+#     "google/gemini-2.5-pro",
+# ]
+
+# Per-call read timeouts (seconds) - turn 2 with HIGH reasoning can run for minutes
+TURN1_TIMEOUT = 60
+TURN2_TIMEOUT = 300
+
+# Streaming - capture turn 2 over SSE and record time-to-first-reasoning/content
+# token, inter-token latency and tokens/sec (extra CSV columns).
+# The STREAM_MAX_* limits cut off runaway generations early (None = no limit).
+STREAM_TURN2 = False
+STREAM_MAX_SECONDS = None
+STREAM_MAX_CHARS = None
+
+# Budget - hard cap in USD for this run (None = track spend but never stop).
+# Scheduling stops BEFORE the cap would be crossed; trials left unscheduled can be
+# picked up later with RESUME_FROM. Prices live in cost_governor.PRICING.
+BUDGET_USD = None
+PROGRESS_EVERY = 10  # log spend + projected total every N finished trials
+
+# Prior token guess per trial, only used until real usage numbers arrive
+PRIOR_INPUT_TOKENS_PER_TRIAL = 800
+PRIOR_OUTPUT_TOKENS_PER_TRIAL = 2000
+
 # Reps per cell - set lower for test runs, 20 for full experiment
 N_PER_CELL = 20
 
+# Concurrency - ASYNC_MODE keeps up to MAX_CONCURRENCY trials in flight at once
+# PER PROVIDER (the part of the model slug before "/"), so a sweep runs Anthropic,
+# OpenAI and xAI side by side without one starving the others. Rate budgets are
+# per provider+model too (rate_limiter.py).
+# Set ASYNC_MODE = False to fall back to the old one-trial-at-a-time loop.
+ASYNC_MODE = True
+MAX_CONCURRENCY = 20
+PROVIDER_CONCURRENCY = {  # overrides MAX_CONCURRENCY for specific providers
+    # "x-ai": 8,
+}
+
+# Adaptive design - None runs the full N_PER_CELL design in one go. "sequential"
+# runs it in blocks and stops cells whose prime-vs-null contrast is settled
+# (always-valid test); N_PER_CELL is then the cap. "neyman" keeps the total of
+# cells x N_PER_CELL trials but, after a pilot block, gives more of them to the
+# noisier cells. Settings in adaptive_design.py.
+ADAPTIVE_MODE = None
+
+# Pipeline hook - pipeline.py sets this to a callable that gets every row (error
+# rows too) right after it's written, so grading starts while the run is going.
+ON_TRIAL_DONE = None
+
 # Which subjects to run (comment out to skip)
 ENABLED_SUBJECTS = [
     "cs",              
@@ -41,9 +102,18 @@ LOGS_DIR = os.path.join(PROJECT_DIR, "logs")
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(LOGS_DIR, exist_ok=True)
 
+# Resume - point this at an existing run_*.csv to finish that run instead of
+# starting a new one. Finished case_ids are skipped; missing and ERROR rows are
+# re-run and written into the same file (and the same log).
+RESUME_FROM = None  # e.g. os.path.join(DATA_DIR, "run_20251211_084623.csv")
+
 # Timestamped run ID
-RUN_ID = datetime.now().strftime('%Y%m%d_%H%M%S')
-OUTPUT_FILE = os.path.join(DATA_DIR, f"run_{RUN_ID}.csv")
+if RESUME_FROM:
+    RUN_ID = os.path.splitext(os.path.basename(RESUME_FROM))[0].replace("run_", "", 1)
+    OUTPUT_FILE = RESUME_FROM
+else:
+    RUN_ID = datetime.now().strftime('%Y%m%d_%H%M%S')
+    OUTPUT_FILE = os.path.join(DATA_DIR, f"run_{RUN_ID}.csv")
 LOG_FILE = os.path.join(LOGS_DIR, f"run_{RUN_ID}.log")
 
 # === PRIMES ===
@@ -123,6 +193,9 @@ Large language models (LLMs) like ChatGPT and Claude are increasingly used by st
 (c) Reflect on a deeper question: Is there a meaningful moral or educational difference between getting help from an LLM versus getting help from a tutor, a calculator, or a textbook? What is education fundamentally *for*, and how should that shape our policies around AI assistance?""",
 }
 
+# Prime code mapping for case IDs (single letter codes)
+PRIME_CODES = {"christmas": "C", "monday": "M", "null": "N"}
+
 # Task code mapping for case IDs (single letter codes)
 TASK_CODES = {
     "cs": "C",
@@ -134,12 +207,6 @@ TASK_CODES = {
     "techsoc": "T",
 }
 
-HEADERS = {
-    'Authorization': f'Bearer {OPENROUTER_API_KEY}',
-    'Content-Type': 'application/json',
-}
-
-
 def log(msg: str):
     """Print and log message."""
     print(msg)
@@ -147,76 +214,101 @@ def log(msg: str):
         f.write(f"{datetime.now().isoformat()} | {msg}\n")
 
 
-def run_two_turn_trial(prime_key: str, task_key: str, trial_num: int) -> dict:
+def make_case_id(prime_key: str, task_key: str, trial_num: int) -> str:
+    """Case ID like 017-M-E (trial number, prime code, task code)."""
+    return f"{trial_num:03d}-{PRIME_CODES[prime_key]}-{TASK_CODES[task_key]}"
+
+
+def _round_or_blank(value, ndigits: int):
+    """Round a timing for the CSV; blank when it wasn't measured (non-streamed)."""
+    return "" if value is None else round(value, ndigits)
+
+
+class TrialError(Exception):
+    """A trial that failed after some of its calls were already billed (cost_usd of those)."""
+
+    def __init__(self, message: str, cost_usd: float = 0.0):
+        super().__init__(message)
+        self.cost_usd = cost_usd
+
+
+def run_two_turn_trial(prime_key: str, task_key: str, trial_num: int, model: str = MODEL) -> dict:
     """Run a two-turn trial with HIGH reasoning enabled."""
     
-    prime_code = {"christmas": "C", "monday": "M", "null": "N"}[prime_key]
-    task_code = TASK_CODES[task_key]
-    case_id = f"{trial_num:03d}-{prime_code}-{task_code}"
+    case_id = make_case_id(prime_key, task_key, trial_num)
     
     # === TURN 1: Send prime, get acknowledgment ===
-    turn1_response = requests.post(
-        'https://openrouter.ai/api/v1/chat/completions',
-        headers=HEADERS,
-        json={
-            'model': MODEL,
+    turn1_data = chat_completion(
+        OPENROUTER_API_KEY,
+        {
+            'model': model,
             'messages': [
                 {"role": "user", "content": TIME_PRIMES[prime_key]}
             ],
             'temperature': 1.0,
             'max_tokens': 500,
-        }
+        },
+        timeout=TURN1_TIMEOUT,
     )
-    turn1_data = turn1_response.json()
     
     # Check for errors
     if 'error' in turn1_data:
         raise Exception(f"Turn 1 API error: {turn1_data['error']}")
     
     assistant_ack = turn1_data['choices'][0]['message']['content']
-    
-    time.sleep(0.3)
+    turn1_cost = call_cost(model, turn1_data.get('usage'))
     
     # === TURN 2: Task with full history + HIGH REASONING ===
-    start_time = time.time()
-    turn2_response = requests.post(
-        'https://openrouter.ai/api/v1/chat/completions',
-        headers=HEADERS,
-        json={
-            'model': MODEL,
-            'messages': [
-                {"role": "user", "content": TIME_PRIMES[prime_key]},
-                {"role": "assistant", "content": assistant_ack},
-                {"role": "user", "content": TASKS[task_key]}
-            ],
-            'temperature': 1.0,
-            'max_tokens': 8000,
-            'reasoning': {
-                'effort': 'high'
-            }
+    turn2_payload = {
+        'model': model,
+        'messages': [
+            {"role": "user", "content": TIME_PRIMES[prime_key]},
+            {"role": "assistant", "content": assistant_ack},
+            {"role": "user", "content": TASKS[task_key]}
+        ],
+        'temperature': 1.0,
+        'max_tokens': 8000,
+        'reasoning': {
+            'effort': 'high'
         }
-    )
+    }
+    start_time = time.time()
+    # Turn 1 is paid for from here on - a turn 2 failure carries its cost
+    try:
+        if STREAM_TURN2:
+            turn2_data = stream_chat_completion(
+                OPENROUTER_API_KEY,
+                turn2_payload,
+                timeout=TURN2_TIMEOUT,
+                max_seconds=STREAM_MAX_SECONDS,
+                max_chars=STREAM_MAX_CHARS,
+            )
+        else:
+            turn2_data = chat_completion(OPENROUTER_API_KEY, turn2_payload, timeout=TURN2_TIMEOUT)
+    except Exception as e:
+        raise TrialError(str(e), turn1_cost) from e
     elapsed = time.time() - start_time
     
-    turn2_data = turn2_response.json()
-    
     # Check for errors
     if 'error' in turn2_data:
-        raise Exception(f"Turn 2 API error: {turn2_data['error']}")
+        raise TrialError(f"Turn 2 API error: {turn2_data['error']}",
+                         turn1_cost + call_cost(model, turn2_data.get('usage')))
     
     message = turn2_data['choices'][0]['message']
     output_text = message.get('content', '')
     reasoning_text = message.get('reasoning', '')
     
-    usage = turn2_data.get('usage', {})
-    completion_tokens = usage.get('completion_tokens', 0)
-    output_details = usage.get('output_tokens_details', {})
-    reasoning_tokens = output_details.get('reasoning_tokens', 0)
+    usage = usage_counts(turn2_data.get('usage'))
+    completion_tokens = usage['output']
+    reasoning_tokens = usage['reasoning']
+    cost = turn1_cost + call_cost(model, turn2_data.get('usage'))
+    
+    timing = turn2_data.get('timing', {})
     
     return {
         "case_id": case_id,
         "timestamp": datetime.now().isoformat(),
-        "model": MODEL,
+        "model": model,
         "prime": prime_key,
         "task": task_key,
         "trial_num": trial_num,
@@ -224,108 +316,287 @@ def run_two_turn_trial(prime_key: str, task_key: str, trial_num: int) -> dict:
         "reasoning_tokens": reasoning_tokens,
         "output_tokens": completion_tokens - reasoning_tokens,
         "total_tokens": completion_tokens,
+        "input_tokens": usage['input'],
+        "cached_tokens": usage['cached'],
+        "cost_usd": round(cost, 6),
         "char_count": len(output_text),
         "response_time_sec": round(elapsed, 2),
+        "ttft_reasoning_sec": _round_or_blank(timing.get('t_first_reasoning'), 2),
+        "ttft_content_sec": _round_or_blank(timing.get('t_first_content'), 2),
+        "inter_token_sec": _round_or_blank(timing.get('inter_token_sec'), 4),
+        "tokens_per_sec": _round_or_blank(timing.get('tokens_per_sec'), 1),
+        "stream_cut_off": timing.get('cut_off', ""),
         "reasoning": reasoning_text[:500] if reasoning_text else "",
         "output": output_text
     }
 
 
+FIELDNAMES = [
+    "case_id", "timestamp", "model", "prime", "task", "trial_num",
+    "assistant_ack", "reasoning_tokens", "output_tokens", "total_tokens",
+    "input_tokens", "cached_tokens", "cost_usd",
+    "char_count", "response_time_sec",
+    "ttft_reasoning_sec", "ttft_content_sec", "inter_token_sec", "tokens_per_sec", "stream_cut_off",
+    "reasoning", "output"
+]
+
+
+def make_error_row(model: str, prime: str, task: str, trial_num: int, e: Exception) -> dict:
+    """Placeholder row for a failed trial, so we don't lose track of it."""
+    return {
+        "case_id": make_case_id(prime, task, trial_num),
+        "timestamp": datetime.now().isoformat(),
+        "model": model,
+        "prime": prime,
+        "task": task,
+        "trial_num": trial_num,
+        "assistant_ack": "",
+        "reasoning_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "cost_usd": round(getattr(e, "cost_usd", 0.0), 6),
+        "char_count": 0,
+        "response_time_sec": 0,
+        "reasoning": "",
+        "output": f"ERROR: {e}"
+    }
+
+
+def trial_succeeded(row: dict) -> bool:
+    """A finished trial has real output (error rows start with 'ERROR:')."""
+    output = row.get("output") or ""
+    return bool(output.strip()) and not output.startswith("ERROR:")
+
+
+def trial_key(row: dict) -> tuple:
+    """Resume key - case_ids repeat across models in a sweep."""
+    return (row.get("model") or MODEL, row["case_id"])
+
+
+def trial_label(model: str, prime: str, task: str, trial_num: int) -> str:
+    """Short log label, e.g. M-T-07 (or sonnet-4.5:M-T-07 in a multi-model sweep)."""
+    label = f"{PRIME_CODES[prime]}-{TASK_CODES[task]}-{trial_num:02d}"
+    if len(MODELS) > 1:
+        label = f"{model.split('/')[-1]}:{label}"
+    return label
+
+
+def build_trials(active_tasks: dict) -> list:
+    """Full model x prime x task x rep design, shuffled into one random run order."""
+    trials = []
+    trial_counter = {}
+    
+    for model in MODELS:
+        for prime in TIME_PRIMES.keys():
+            for task in active_tasks.keys():
+                key = (model, prime, task)
+                trial_counter[key] = 0
+                for _ in range(N_PER_CELL):
+                    trial_counter[key] += 1
+                    trials.append((model, prime, task, trial_counter[key]))
+    
+    random.shuffle(trials)
+    return trials
+
+
+def provider_budget(provider: str) -> int:
+    return PROVIDER_CONCURRENCY.get(provider, MAX_CONCURRENCY)
+
+
+def remaining_by_model(trials: list) -> dict:
+    counts = {}
+    for t in trials:
+        counts[t[0]] = counts.get(t[0], 0) + 1
+    return counts
+
+
+def run_trials_serial(trials: list, writer, f, governor: BudgetGovernor) -> int:
+    """Old behaviour: one trial at a time (pacing is left to the rate limiter).
+    
+    Returns the number of trials left unscheduled because of the budget cap.
+    """
+    remaining = remaining_by_model(trials)
+    n_errors_in_a_row = 0
+    for i, (model, prime, task, trial_num) in enumerate(trials):
+        reserved = governor.try_reserve(model)
+        if reserved is None:
+            log(f"⏸ Budget cap reached - {len(trials) - i} trials not scheduled")
+            return len(trials) - i
+        
+        log(f"[{i+1:3d}/{len(trials)}] {trial_label(model, prime, task, trial_num)} ({task})...")
+        
+        try:
+            result = run_two_turn_trial(prime, task, trial_num, model)
+            writer.writerow(result)
+            f.flush()
+            if ON_TRIAL_DONE:
+                ON_TRIAL_DONE(result)
+            
+            log(f"    ✓ reason={result['reasoning_tokens']} out={result['output_tokens']} chars={result['char_count']} time={result['response_time_sec']}s cost=${result['cost_usd']:.4f}")
+            governor.settle(model, reserved, result['cost_usd'])
+            n_errors_in_a_row = 0
+            
+        except Exception as e:
+            log(f"    ✗ ERROR: {e}")
+            error_row = make_error_row(model, prime, task, trial_num, e)
+            writer.writerow(error_row)
+            f.flush()
+            if ON_TRIAL_DONE:
+                ON_TRIAL_DONE(error_row)
+            governor.release(reserved, error_row['cost_usd'])
+            time.sleep(backoff_delay(n_errors_in_a_row))  # Back off harder on repeated errors
+            n_errors_in_a_row += 1
+        
+        remaining[model] -= 1
+        if (i + 1) % PROGRESS_EVERY == 0:
+            log(governor.summary(remaining))
+    
+    return 0
+
+
+async def run_trials_async(trials: list, writer, f, governor: BudgetGovernor) -> int:
+    """Run trials concurrently, up to each provider's budget at once.
+    
+    Trials are started in the shuffled order (each provider's semaphore hands
+    out slots first-come first-served) and each row is written as soon as it
+    finishes, so the CSV is in completion order rather than start order.
+    Returns the number of trials left unscheduled because of the budget cap.
+    """
+    providers = sorted({provider_of(t[0]) for t in trials})
+    slots = {p: asyncio.Semaphore(provider_budget(p)) for p in providers}
+    for model in sorted({t[0] for t in trials}):
+        seed_limiter(model, provider_budget(provider_of(model)))
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(1, sum(provider_budget(p) for p in providers))))
+    remaining = remaining_by_model(trials)
+    n_done = 0
+    n_skipped = 0
+    
+    async def one_trial(i: int, model: str, prime: str, task: str, trial_num: int):
+        nonlocal n_done, n_skipped
+        label = trial_label(model, prime, task, trial_num)
+        
+        async with slots[provider_of(model)]:
+            reserved = governor.try_reserve(model)
+            if reserved is None:
+                if n_skipped == 0:
+                    log("⏸ Budget cap reached - not scheduling any more trials")
+                n_skipped += 1
+                return
+            
+            log(f"[{i+1:3d}/{len(trials)}] start {label} ({task})...")
+            try:
+                result = await asyncio.to_thread(run_two_turn_trial, prime, task, trial_num, model)
+                msg = f"✓ reason={result['reasoning_tokens']} out={result['output_tokens']} chars={result['char_count']} time={result['response_time_sec']}s cost=${result['cost_usd']:.4f}"
+                governor.settle(model, reserved, result['cost_usd'])
+            except Exception as e:
+                result = make_error_row(model, prime, task, trial_num, e)
+                msg = f"✗ ERROR: {e}"
+                governor.release(reserved, result['cost_usd'])
+        
+        # Only the event loop thread touches the writer, so no lock needed
+        writer.writerow(result)
+        f.flush()
+        if ON_TRIAL_DONE:
+            ON_TRIAL_DONE(result)
+        n_done += 1
+        remaining[model] -= 1
+        log(f"    [{n_done:3d}/{len(trials)} done] {label} {msg}")
+        if n_done % PROGRESS_EVERY == 0:
+            log(governor.summary(remaining))
+    
+    await asyncio.gather(*(one_trial(i, *t) for i, t in enumerate(trials)))
+    return n_skipped
+
+
 def run_experiment():
     """Run full experiment."""
     
     # Filter to only enabled subjects
     active_tasks = {k: v for k, v in TASKS.items() if k in ENABLED_SUBJECTS}
     
-    trials = []
-    trial_counter = {}
-    
-    for prime in TIME_PRIMES.keys():
-        for task in active_tasks.keys():
-            key = (prime, task)
-            trial_counter[key] = 0
-            for _ in range(N_PER_CELL):
-                trial_counter[key] += 1
-                trials.append((prime, task, trial_counter[key]))
-    
-    random.shuffle(trials)
+    trials = build_trials(active_tasks)
     
     # Calculate totals
+    n_models = len(MODELS)
     n_subjects = len(active_tasks)
     n_primes = len(TIME_PRIMES)
-    total_trials = n_subjects * n_primes * N_PER_CELL
+    total_trials = n_models * n_subjects * n_primes * N_PER_CELL
+    
+    # Resume: keep finished rows, schedule only what's missing or failed
+    done_rows = []
+    if RESUME_FROM:
+        done_rows, seen = load_checkpoint(OUTPUT_FILE, key=trial_key, is_done=trial_succeeded)
+        done_keys = {trial_key(r) for r in done_rows}
+        trials = [t for t in trials if (t[0], make_case_id(*t[1:])) not in done_keys]
     
     log("=" * 60)
     log("HOLIDAY EFFECT EXPERIMENT v3.0 - EXPANDED DOMAIN STUDY")
+    if RESUME_FROM:
+        log(f"RESUMING {RESUME_FROM}: {len(done_rows)} done, {len(seen) - len(done_rows)} failed/partial, {len(trials)} to run")
     log("=" * 60)
-    log(f"Model: {MODEL}")
+    log(f"Models: {MODELS}" if n_models > 1 else f"Model: {MODELS[0]}")
     log(f"Subjects: {list(active_tasks.keys())}")
     log(f"Primes: {list(TIME_PRIMES.keys())}")
-    log(f"Reps per cell: {N_PER_CELL}")
+    log(f"Reps per cell: {N_PER_CELL}" + (f" ({'max' if ADAPTIVE_MODE == 'sequential' else 'average'}; "
+                                          f"{ADAPTIVE_MODE} blocks of {adaptive_design.BLOCK_REPS}, "
+                                          f"metric {adaptive_design.METRIC})" if ADAPTIVE_MODE else ""))
     log(f"Total trials: {total_trials}")
     log(f"Reasoning: HIGH")
+    log(f"Turn 2 streaming: {'ON' if STREAM_TURN2 else 'off'}")
+    if ASYNC_MODE:
+        budgets = {p: provider_budget(p) for p in sorted({provider_of(m) for m in MODELS})}
+        log(f"Mode: ASYNC, in-flight per provider: {budgets}")
+    else:
+        log("Mode: SERIAL")
     log(f"Output: {OUTPUT_FILE}")
     log(f"Log: {LOG_FILE}")
     log("=" * 60)
     
-    # Estimate cost
-    est_input_tokens = total_trials * 800  # ~800 input tokens per trial
-    est_output_tokens = total_trials * 2000  # ~2000 output tokens per trial
-    est_cost = (est_input_tokens * 0.003 + est_output_tokens * 0.015) / 1000
-    log(f"Estimated cost: ~${est_cost:.2f}")
+    # Estimate cost (per-model prior, refined live from real usage as trials finish)
+    priors = {m: estimate_cost(m, PRIOR_INPUT_TOKENS_PER_TRIAL, PRIOR_OUTPUT_TOKENS_PER_TRIAL) for m in MODELS}
+    governor = BudgetGovernor(BUDGET_USD, priors)
+    est_cost = sum(priors[t[0]] for t in trials)
+    log(f"Estimated cost: ~${est_cost:.2f}" + (f" (budget cap ${BUDGET_USD:.2f})" if BUDGET_USD is not None else ""))
     log("=" * 60)
     
-    fieldnames = [
-        "case_id", "timestamp", "model", "prime", "task", "trial_num",
-        "assistant_ack", "reasoning_tokens", "output_tokens", "total_tokens",
-        "char_count", "response_time_sec", "reasoning", "output"
-    ]
+    start = time.time()
+    
+    if RESUME_FROM:
+        # Drop failed/partial rows now so their re-runs don't sit next to them
+        rewrite_rows(OUTPUT_FILE, FIELDNAMES, done_rows)
     
-    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+    with open(OUTPUT_FILE, 'a' if RESUME_FROM else 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        if not RESUME_FROM:
+            writer.writeheader()
         
-        for i, (prime, task, trial_num) in enumerate(trials):
-            prime_code = {"christmas": "C", "monday": "M", "null": "N"}[prime]
-            task_code = TASK_CODES[task]
-            
-            log(f"[{i+1:3d}/{len(trials)}] {prime_code}-{task_code}-{trial_num:02d} ({task})...")
-            
-            try:
-                result = run_two_turn_trial(prime, task, trial_num)
-                writer.writerow(result)
-                f.flush()
-                
-                log(f"    ✓ reason={result['reasoning_tokens']} out={result['output_tokens']} chars={result['char_count']} time={result['response_time_sec']}s")
-                
-                time.sleep(0.5)
-                
-            except Exception as e:
-                log(f"    ✗ ERROR: {e}")
-                # Write error row so we don't lose track
-                error_row = {
-                    "case_id": f"{trial_num:03d}-{prime_code}-{task_code}",
-                    "timestamp": datetime.now().isoformat(),
-                    "model": MODEL,
-                    "prime": prime,
-                    "task": task,
-                    "trial_num": trial_num,
-                    "assistant_ack": "",
-                    "reasoning_tokens": 0,
-                    "output_tokens": 0,
-                    "total_tokens": 0,
-                    "char_count": 0,
-                    "response_time_sec": 0,
-                    "reasoning": "",
-                    "output": f"ERROR: {e}"
-                }
-                writer.writerow(error_row)
-                f.flush()
-                time.sleep(1.0)  # Back off on errors
-                continue
+        def run_block(block: list) -> int:
+            if ASYNC_MODE:
+                return asyncio.run(run_trials_async(block, writer, f, governor))
+            return run_trials_serial(block, writer, f, governor)
+        
+        if ADAPTIVE_MODE in ("sequential", "neyman"):
+            if ADAPTIVE_MODE == "sequential":
+                scheduler, history_name = adaptive_design.run_sequential, "interim"
+            else:
+                scheduler, history_name = adaptive_design.run_neyman, "allocation"
+            n_unscheduled = scheduler(
+                trials, run_block,
+                finished_rows=lambda: load_checkpoint(OUTPUT_FILE, key=trial_key, is_done=trial_succeeded)[0],
+                log=log,
+                interim_csv=os.path.join(LOGS_DIR, f"{history_name}_{RUN_ID}.csv"),
+                graded_csv=adaptive_design.GRADED_CSV or os.path.join(DATA_DIR, f"graded_{RUN_ID}.csv"),
+            )
+        else:
+            n_unscheduled = run_block(trials)
     
     log("=" * 60)
+    log(governor.summary())
+    if n_unscheduled:
+        log(f"⏸ {n_unscheduled} trials left unscheduled by the budget cap - raise BUDGET_USD and rerun with RESUME_FROM = {OUTPUT_FILE!r}")
     log(f"COMPLETE! Results saved to {OUTPUT_FILE}")
+    log(f"Wall time: {(time.time() - start) / 60:.1f} min")
     log("=" * 60)
 
 
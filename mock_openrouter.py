@@ -0,0 +1,333 @@
+"""
+Local stand-in for OpenRouter's /api/v1/chat/completions, for load tests that
+shouldn't cost real API money.
+
+Speaks just enough of the API for holiday_test_v3 and grader_robusto_v3:
+JSON or SSE (stream=True) responses with usage blocks, latency drawn from a
+lognormal distribution, and injected failures - dropped connections
+("Response ended prematurely"), 429s with Retry-After, and empty content.
+Grader requests (system prompt mentions GRADERMAN) get a parseable score block.
+
+    python mock_openrouter.py --port 8765 --profile flaky
+    # then point api_transport.OPENROUTER_BASE_URL at http://127.0.0.1:8765/api/v1
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# === PROFILES ===
+# Latencies are seconds; rates are per-request probabilities.
+PROFILES = {
+    # Everything works, fast enough for a benchmark to finish in seconds
+    "healthy": {
+        "latency_median": 0.4,    # median total time of a turn-2 / grading call
+        "latency_sigma": 0.5,     # lognormal shape - bigger = longer tail
+        "short_call_factor": 0.1, # turn 1 (max_tokens <= 500) is this much quicker
+        "first_token_frac": 0.3,  # share of the latency spent before the first delta
+        "output_tokens": 1500,
+        "reasoning_tokens": 600,
+        "p_premature": 0.0,
+        "p_429": 0.0,
+        "p_empty": 0.0,
+        "p_partial_json": 0.0,    # JSON grades with a score field left out
+        "retry_after": 1,
+    },
+    # Roughly what the December logs looked like
+    "flaky": {
+        "latency_median": 0.4,
+        "latency_sigma": 0.7,
+        "short_call_factor": 0.1,
+        "first_token_frac": 0.3,
+        "output_tokens": 1500,
+        "reasoning_tokens": 600,
+        "p_premature": 0.03,
+        "p_429": 0.05,
+        "p_empty": 0.05,
+        "p_partial_json": 0.1,
+        "retry_after": 1,
+    },
+    # Provider pushing back hard
+    "throttled": {
+        "latency_median": 0.4,
+        "latency_sigma": 0.5,
+        "short_call_factor": 0.1,
+        "first_token_frac": 0.3,
+        "output_tokens": 1500,
+        "reasoning_tokens": 600,
+        "p_premature": 0.0,
+        "p_429": 0.3,
+        "p_empty": 0.0,
+        "p_partial_json": 0.0,
+        "retry_after": 2,
+    },
+}
+
+_WORDS = ("the of and to in is that for it as with was on be by this are or "
+          "eigenvalue surplus equilibrium algorithm kant lagrangian pyruvate policy").split()
+
+GRADE_TEMPLATE = """- Content / Conceptual Mastery: {c}/50
+- Reasoning & Rigor: {r}/30
+- Communication: {m}/20
+- Total Score: {t}/100
+
+- Conceptual Mastery: Mock justification.
+- Reasoning & Rigor: Mock justification.
+- Communication: Mock justification.
+"""
+
+
+def _is_grader_request(body: dict) -> bool:
+    messages = body.get("messages") or []
+    first = messages[0].get("content", "") if messages else ""
+    if isinstance(first, list):  # content-parts form
+        first = " ".join(p.get("text", "") for p in first if isinstance(p, dict))
+    return "GRADERMAN" in first
+
+
+def _prompt_tokens(body: dict) -> int:
+    return max(1, len(json.dumps(body.get("messages", []))) // 4)
+
+
+def _fake_answer(n_tokens: int) -> str:
+    words = [random.choice(_WORDS) for _ in range(n_tokens)]
+    lines = ["## Answer", ""]
+    for i in range(0, len(words), 15):
+        lines.append(" ".join(words[i:i + 15]))
+    return "\n".join(lines)
+
+
+def _fake_grade() -> str:
+    c, r, m = random.randint(30, 50), random.randint(15, 30), random.randint(10, 20)
+    return GRADE_TEMPLATE.format(c=c, r=r, m=m, t=c + r + m)
+
+
+def _json_grade_object(schema: dict, p_partial: float) -> dict:
+    c, r, m = random.randint(30, 50), random.randint(15, 30), random.randint(10, 20)
+    values = {"content_score": c, "reasoning_score": r, "communication_score": m, "total_score": c + r + m,
+              "justifications": {"content": "Mock.", "reasoning": "Mock.", "communication": "Mock."}}
+    grade = {k: values[k] for k in schema.get("properties", values) if k in values}
+    if len(grade) > 1 and random.random() < p_partial:
+        grade.pop(random.choice([k for k in grade if k != "justifications"]))
+    return grade
+
+
+def _fake_json_grade(response_format: dict, p_partial: float) -> str:
+    """JSON grade with exactly the fields the requested schema asks for (maybe one dropped).
+
+    A schema keyed by answer IDs (packed grading) gets one grade object per ID.
+    """
+    schema = (response_format.get("json_schema") or {}).get("schema") or {}
+    properties = schema.get("properties") or {}
+    if properties and all(p.get("type") == "object" for p in properties.values()):
+        return json.dumps({k: _json_grade_object(p, p_partial) for k, p in properties.items()}, indent=2)
+    return json.dumps(_json_grade_object(schema, p_partial), indent=2)
+
+
+def _packed_ids(body: dict) -> list:
+    """Answer IDs in a packed grading request ("=== ID: B001 ===" headers)."""
+    messages = body.get("messages") or []
+    last = messages[-1].get("content", "") if messages else ""
+    return re.findall(r"^=== ID: (\S+) ===$", last if isinstance(last, str) else "", re.MULTILINE)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection pooling is exercised
+
+    def log_message(self, *args):
+        pass
+
+    # --- helpers ---
+    def _send_json(self, status: int, payload: dict, extra_headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (extra_headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _drop_connection(self, partial: bytes = b""):
+        """Promise more bytes than we send, then hang up."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(partial) + 1000))
+        self.end_headers()
+        self.wfile.write(partial)
+        self.wfile.flush()
+        self.close_connection = True
+
+    # --- main entry ---
+    def do_POST(self):
+        server = self.server
+        profile = server.profile
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"no route {self.path}", "code": 404}})
+            return
+
+        server.count("requests")
+        roll = random.random()
+
+        if roll < profile["p_429"]:
+            server.count("429")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit exceeded", "code": 429}},
+                {"Retry-After": str(profile["retry_after"])},
+            )
+            return
+        roll -= profile["p_429"]
+
+        latency = profile["latency_median"] * math.exp(random.gauss(0, profile["latency_sigma"]))
+        if (body.get("max_tokens") or 0) <= 500:
+            latency *= profile["short_call_factor"]
+
+        grader = _is_grader_request(body)
+        if roll < profile["p_empty"]:
+            server.count("empty")
+            text = ""
+        else:
+            if grader and body.get("response_format"):
+                text = _fake_json_grade(body["response_format"], profile["p_partial_json"])
+            elif grader and len(_packed_ids(body)) > 1:
+                text = "\n\n".join(f"### ID: {b}\n\n{_fake_grade()}" for b in _packed_ids(body))
+            elif grader:
+                text = _fake_grade()
+            else:
+                text = _fake_answer(profile["output_tokens"] // 2)
+        premature = random.random() < profile["p_premature"]
+        if premature:
+            server.count("premature")
+
+        reasoning_tokens = 0 if grader else profile["reasoning_tokens"]
+        completion_tokens = max(1, len(text) // 4) + reasoning_tokens
+        usage = {
+            "prompt_tokens": _prompt_tokens(body),
+            "completion_tokens": completion_tokens,
+            "total_tokens": _prompt_tokens(body) + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": server.cached_prefix_tokens(body)},
+            "completion_tokens_details": {"reasoning_tokens": reasoning_tokens},
+        }
+        model = body.get("model", "mock/model")
+
+        if body.get("stream"):
+            self._stream(body, model, text, reasoning_tokens, usage, latency, premature)
+            return
+
+        time.sleep(latency)
+        payload = {
+            "id": f"mock-{random.getrandbits(40):x}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": text,
+                    "reasoning": "thinking " * min(reasoning_tokens, 50) if reasoning_tokens else None,
+                },
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+        if premature:
+            self._drop_connection(json.dumps(payload).encode("utf-8")[:200])
+            return
+        server.count("ok")
+        self._send_json(200, payload)
+
+    def _stream(self, body, model, text, reasoning_tokens, usage, latency, premature):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta=None, finish=None, with_usage=False):
+            chunk = {"model": model, "choices": [{"index": 0, "delta": delta or {}, "finish_reason": finish}]}
+            if with_usage:
+                chunk["usage"] = usage
+            self._chunk("data: " + json.dumps(chunk) + "\n\n")
+
+        self._chunk(": OPENROUTER PROCESSING\n\n")
+        time.sleep(latency * self.server.profile["first_token_frac"])
+
+        pieces = [{"reasoning": "think "} for _ in range(min(reasoning_tokens, 20))]
+        pieces += [{"content": text[i:i + 40]} for i in range(0, len(text), 40)]
+        gap = latency * (1 - self.server.profile["first_token_frac"]) / max(len(pieces), 1)
+        for i, delta in enumerate(pieces):
+            if premature and i >= len(pieces) // 2:
+                self.close_connection = True
+                return  # no terminating chunk -> client sees an incomplete body
+            time.sleep(gap)
+            event(delta)
+
+        event(finish="stop", with_usage=True)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        self.server.count("ok")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profile: dict):
+        super().__init__(address, MockHandler)
+        self.profile = profile
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._seen_prefixes = set()
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def cached_prefix_tokens(self, body: dict) -> int:
+        """Crude prefix cache: a first message we've seen before counts as cached."""
+        messages = body.get("messages") or []
+        if not messages:
+            return 0
+        prefix = json.dumps(messages[0], sort_keys=True)
+        with self._stats_lock:
+            hit = prefix in self._seen_prefixes
+            self._seen_prefixes.add(prefix)
+        return len(prefix) // 4 if hit else 0
+
+
+def start_server(profile="healthy", port: int = 0):
+    """Start a mock server on a background thread. Returns (server, base_url)."""
+    if isinstance(profile, str):
+        profile = PROFILES[profile]
+    server = MockServer(("127.0.0.1", port), dict(profile))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat-completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="healthy")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.profile, args.port)
+    print(f"Mock OpenRouter ({args.profile}) listening on {base_url}  - Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(f"Stats: {server.stats}")
+        server.shutdown()
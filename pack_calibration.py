@@ -0,0 +1,169 @@
+"""
+Calibration check for packed grading (grader_robusto_v3.PACK_SIZE > 1).
+
+Takes the cases in a grader validation file (logs/grader_validation_*.csv -
+the same answer graded single-answer N times), looks their answers up in the
+merged results CSV, and grades each one again inside packs of K answers
+(the rest of each pack filled with other answers to the same subject, order
+shuffled). Then compares packed vs single-answer scores per case and dimension,
+input tokens per answer, and mean score by position in the pack.
+
+    python pack_calibration.py --pack-size 5 --reps 5
+    python pack_calibration.py --validation logs/grader_validation_20251210_195004.csv --single-reps 2
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+import statistics
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import grader_robusto_v3 as grader
+from csv_index import CsvIndex
+
+# === CONFIGURATION ===
+HERE = os.path.dirname(os.path.abspath(__file__))
+VALIDATION_CSV = os.path.join(HERE, "logs", "grader_validation_20251210_195004.csv")
+ANSWERS_CSV = os.path.join(HERE, "merged_graded_minimal_with_batch.csv")
+OUTPUT_CSV = os.path.join(grader.LOG_DIR, f"pack_calibration_{grader.RUN_ID}.csv")
+
+SCORE_COLUMNS = ["content_score", "reasoning_score", "communication_score", "total_score"]
+
+log = grader.log
+
+
+def load_csv(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def mean_sd(values: list):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None, None, 0
+    sd = statistics.stdev(values) if len(values) > 1 else 0.0
+    return statistics.fmean(values), sd, len(values)
+
+
+def grade_packed(case_id: str, rep: int, row: dict, fillers: list, pack_size: int) -> dict:
+    """Grade one calibration answer inside a pack of random same-subject answers."""
+    blind_numbers = random.sample(range(100, 1000), pack_size)
+    target_id = f"B{blind_numbers[0]}"
+    pack = [(target_id, row["output"])]
+    for number, filler in zip(blind_numbers[1:], random.sample(fillers, min(pack_size - 1, len(fillers)))):
+        pack.append((f"B{number}", filler["output"]))
+
+    result = grader.grade_pack(row["task"], pack)[target_id]
+    position = int(result["grader_pack"].split("/")[0]) if result.get("grader_pack") else None
+    # A target the pack reply didn't score was graded alone - keep it out of the packed stats
+    mode = "packed" if position else "packed-fallback"
+    return dict(result, case_id=case_id, rep=rep, mode=mode, pack_size=len(pack), position=position)
+
+
+def grade_single(case_id: str, rep: int, row: dict) -> dict:
+    result = grader.grade_one_answer(f"B{random.randint(100, 999)}", row["task"], row["output"])
+    return dict(result, case_id=case_id, rep=rep, mode="single", pack_size=1, position=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed vs single-answer grading calibration")
+    parser.add_argument("--validation", default=VALIDATION_CSV, help="grader_validation_*.csv with single-answer reps")
+    parser.add_argument("--answers", default=ANSWERS_CSV, help="CSV with case_id/task/output for every answer")
+    parser.add_argument("--pack-size", type=int, default=max(grader.PACK_SIZE, 5))
+    parser.add_argument("--reps", type=int, default=5, help="packed gradings per validation case")
+    parser.add_argument("--single-reps", type=int, default=2,
+                        help="fresh single-answer gradings per case (token baseline, same session)")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    args = parser.parse_args()
+
+    grader.USE_GRADE_CACHE = False  # every grading here must be a real call
+
+    validation = load_csv(args.validation)
+    case_ids = sorted({r["case_id"] for r in validation})
+    with CsvIndex(args.answers, key_columns=("case_id",)) as answers:
+        missing = [c for c in case_ids if c not in answers]
+        case_ids = [c for c in case_ids if c in answers]
+        rows = {c: answers[c] for c in case_ids}
+        # same-subject fillers for the packs (one pass; last row per case_id, like the old dict)
+        tasks = {row["task"] for row in rows.values()}
+        by_task = {}
+        for r in answers:
+            if r["task"] in tasks:
+                by_task.setdefault(r["task"], {})[r["case_id"]] = r
+    if missing:
+        log(f"⚠ No answer text for {missing} in {args.answers} - skipped")
+    if not case_ids:
+        log("ERROR: none of the validation cases have answers to grade.")
+        return 1
+
+    log("=" * 60)
+    log(f"PACK CALIBRATION - {grader.grader_models()[0]}, pack size {args.pack_size}")
+    log(f"{len(case_ids)} cases from {args.validation}")
+    log("=" * 60)
+
+    calls = []
+    for case_id in case_ids:
+        row = rows[case_id]
+        fillers = [r for c, r in by_task[row["task"]].items() if c != case_id]
+        calls += [(grade_packed, (case_id, rep, row, fillers, args.pack_size)) for rep in range(1, args.reps + 1)]
+        calls += [(grade_single, (case_id, rep, row)) for rep in range(1, args.single_reps + 1)]
+
+    with ThreadPoolExecutor(max_workers=max(1, grader.GRADER_WORKERS)) as pool:
+        results = list(pool.map(lambda call: call[0](*call[1]), calls))
+
+    fieldnames = ["case_id", "mode", "rep", "pack_size", "position"] + SCORE_COLUMNS + [
+        "grader_input_tokens", "grader_cached_tokens", "grader_cost_usd", "grader_pack"]
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+    # --- Scores: packed vs the validation file's single-answer reps ---
+    log("")
+    log(f"{'case':10s} {'dimension':20s} {'single':>14s} {'packed':>14s} {'diff':>7s}")
+    worst = 0.0
+    for case_id in case_ids:
+        reference = [r for r in validation if r["case_id"] == case_id]
+        packed = [r for r in results if r["case_id"] == case_id and r["mode"] == "packed"]
+        for column in SCORE_COLUMNS:
+            s_mean, s_sd, s_n = mean_sd([float(r[column]) for r in reference if r[column] not in ("", "None")])
+            p_mean, p_sd, p_n = mean_sd([r[column] for r in packed])
+            if s_mean is None or p_mean is None:
+                log(f"{case_id:10s} {column:20s} {'-':>14s} {'-':>14s}")
+                continue
+            diff = p_mean - s_mean
+            se = math.sqrt((s_sd ** 2) / s_n + (p_sd ** 2) / p_n) or 1.0
+            flag = "  ⚠" if abs(diff) > 2 * se else ""
+            worst = max(worst, abs(diff) / se)
+            log(f"{case_id:10s} {column:20s} {s_mean:7.1f} ±{s_sd:5.1f} {p_mean:7.1f} ±{p_sd:5.1f} {diff:+7.1f}{flag}")
+
+    # --- Position in the pack ---
+    by_position = {}
+    for r in results:
+        if r["mode"] == "packed" and r["position"] and r["total_score"] is not None:
+            by_position.setdefault(r["position"], []).append(r["total_score"])
+    if by_position:
+        log("")
+        log("Mean total by position in pack: " + ", ".join(
+            f"{p}: {statistics.fmean(v):.1f} (n={len(v)})" for p, v in sorted(by_position.items())))
+
+    # --- Tokens ---
+    log("")
+    for mode in ("single", "packed"):
+        tokens = [r["grader_input_tokens"] for r in results if r["mode"] == mode and r["grader_input_tokens"]]
+        cost = [r["grader_cost_usd"] for r in results if r["mode"] == mode]
+        if tokens:
+            log(f"{mode:7s}: {statistics.fmean(tokens):7.0f} input tokens / answer, "
+                f"${statistics.fmean(cost):.4f} / answer")
+
+    log("")
+    log(f"{'✓' if worst <= 2 else '⚠'} Largest packed-vs-single gap: {worst:.1f} standard errors "
+        f"(⚠ above 2). Details in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Run and grade at the same time: finished trials go straight to grader workers.
+
+In-process mode runs holiday_test_v3.run_experiment and feeds every row it writes (via holiday_test_v3.ON_TRIAL_DONE) into a queue.
+Follow mode tails a run CSV that another process is still writing. Either way
+each successful trial gets the next blind ID as it arrives and is graded (by
+every grader, if GRADER_MODEL is a list) on a pool of GRADER_WORKERS threads per
+grader with the normal grader_robusto_v3 settings. Graded
+rows are appended to graded_<run id>.csv as they finish, so partial results can
+be read mid-run, and the file is put in blind_id order at the end.
+
+    python pipeline.py                            # run + grade, settings from both scripts
+    python pipeline.py --follow data/run_20251211_084623.csv
+"""
+
+import argparse
+import csv
+import io
+import os
+import queue
+import sys
+import threading
+import time
+
+import grader_robusto_v3 as grader
+from checkpoint import load_checkpoint, rewrite_rows
+from cost_governor import BudgetGovernor, estimate_cost
+
+# === CONFIGURATION ===
+FOLLOW_POLL = 2.0         # seconds between checks of a followed CSV
+FOLLOW_IDLE_EXIT = 900    # stop following after this long without a new row (None = never)
+
+log = grader.log
+
+
+# =========================
+# GRADING SIDE
+# =========================
+
+class PipelineGrader:
+    """Queue of finished trial rows, graded by a pool of worker threads.
+
+    Blind IDs are handed out in arrival order. Graded rows are appended to
+    output_csv as they complete (completion order); finish() waits for the
+    queue to drain and rewrites the file in blind_id order.
+    """
+
+    def __init__(self, output_csv: str, fieldnames: list):
+        self.output_csv = output_csv
+        self.fieldnames = fieldnames
+        self.queue = queue.Queue()
+        self.models = grader.grader_models()
+        self.governor = BudgetGovernor(grader.GRADER_BUDGET_USD, {
+            m: estimate_cost(m, grader.PRIOR_INPUT_TOKENS_PER_GRADE, grader.PRIOR_OUTPUT_TOKENS_PER_GRADE)
+            for m in self.models
+        })
+        self.n_received = 0
+        self.n_skipped = 0
+        self.n_queued = 0
+        self.n_graded = 0
+        self.n_failed = 0
+        self.budget_hit = False
+        self._lock = threading.Lock()
+        self._workers = []
+
+        # Pick up where an earlier attempt on the same output stopped
+        done_rows, seen = load_checkpoint(output_csv, key=lambda r: (grader.answer_key(r), r.get("grader_model")),
+                                          is_done=grader.grade_succeeded)
+        self.done_pairs = {(grader.answer_key(r), r.get("grader_model")) for r in done_rows}
+        self.prev_blind_ids = {key: r["blind_id"] for (key, _), r in seen.items() if r.get("blind_id")}
+        self.next_blind = 1 + max([int(b[1:]) for b in self.prev_blind_ids.values() if b[1:].isdigit()] or [0])
+        if seen:
+            log(f"Continuing {output_csv}: {len(done_rows)} already graded")
+        rewrite_rows(output_csv, fieldnames, done_rows)
+        self._out_f = open(output_csv, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._out_f, fieldnames=fieldnames, extrasaction="ignore")
+
+    def submit(self, row: dict):
+        """Called for every finished trial row (any thread). Gradeable rows are queued with a blind ID."""
+        with self._lock:
+            self.n_received += 1
+            key = grader.answer_key(row)
+            models = [m for m in self.models if (key, m) not in self.done_pairs]
+            gradeable = (
+                str(row.get("task", "")).lower() in grader.RUBRIC_MAP
+                and (row.get("output") or "").strip()
+                and not row["output"].startswith("ERROR:")  # runner error row
+                and models
+            )
+            if not gradeable:
+                self.n_skipped += 1
+                return
+            # an answer (model + case_id) that shows up twice is only graded once
+            self.done_pairs.update((key, m) for m in models)
+            blind_id = self.prev_blind_ids.get(key)
+            if blind_id is None:
+                blind_id = f"B{self.next_blind:03d}"
+                self.next_blind += 1
+                self.prev_blind_ids[key] = blind_id
+            self.n_queued += len(models)
+        for model in models:
+            self.queue.put((blind_id, row, model))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            blind_id, row, model = item
+            reserved = self.governor.try_reserve(model)
+            if reserved is None:
+                with self._lock:
+                    if not self.budget_hit:
+                        log("⏸ Grader budget cap reached - remaining trials are left ungraded")
+                    self.budget_hit = True
+                continue
+            out_row = grader.grade_job(self.n_graded + self.n_failed + 1, self.n_queued, blind_id, row, model)
+            self.governor.settle(model, reserved, out_row["grader_cost_usd"])
+            with self._lock:
+                self._writer.writerow(out_row)
+                self._out_f.flush()
+                if out_row["total_score"] is not None:
+                    self.n_graded += 1
+                else:
+                    self.n_failed += 1
+                if (self.n_graded + self.n_failed) % grader.PROGRESS_EVERY == 0:
+                    log(f"  ⇢ graded {self.n_graded + self.n_failed}/{self.n_queued} queued, "
+                        + self.governor.summary())
+
+    def start(self):
+        for _ in range(max(1, grader.GRADER_WORKERS) * len(self.models)):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def finish(self):
+        """Wait for everything queued so far, then sort the output by blind_id."""
+        for _ in self._workers:
+            self.queue.put(None)
+        for t in self._workers:
+            t.join()
+        self._out_f.close()
+
+        with open(self.output_csv, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        order = {m: i for i, m in enumerate(self.models)}
+        rows.sort(key=lambda r: (int(r["blind_id"][1:]) if r.get("blind_id", "")[1:].isdigit() else 0,
+                                 order.get(r.get("grader_model"), len(order))))
+        rewrite_rows(self.output_csv, self.fieldnames, rows)
+
+
+# =========================
+# SOURCES
+# =========================
+
+def complete_records(buffer: str):
+    """Split text into (complete CSV records, leftover partial record) by quote parity."""
+    end = 0
+    in_quotes = False
+    for i, ch in enumerate(buffer):
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == "\n" and not in_quotes:
+            end = i + 1
+    return buffer[:end], buffer[end:]
+
+
+def wait_for_header(path: str, poll: float = FOLLOW_POLL) -> list:
+    """Column names of a CSV, waiting for the writer to create it and finish the header line."""
+    while True:
+        if os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                header = f.readline()
+            if header.endswith("\n"):
+                return next(csv.reader([header]))
+        time.sleep(poll)
+
+
+def follow_csv(path: str, on_row, idle_exit: float = FOLLOW_IDLE_EXIT, poll: float = FOLLOW_POLL):
+    """Feed every row of a CSV that's still being appended to into on_row, until it goes idle."""
+    fieldnames = wait_for_header(path, poll)
+    with open(path, newline="", encoding="utf-8") as f:
+        f.readline()
+        buffer = ""
+        last_new = time.monotonic()
+        while True:
+            chunk = f.read()
+            if chunk:
+                records, buffer = complete_records(buffer + chunk)
+                for row in csv.DictReader(io.StringIO(records, newline=""), fieldnames=fieldnames):
+                    on_row(row)
+                if records:
+                    last_new = time.monotonic()
+            elif idle_exit is not None and time.monotonic() - last_new > idle_exit:
+                log(f"No new rows in {path} for {idle_exit:.0f}s - done following")
+                return
+            else:
+                time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run trials and grade them as they finish")
+    parser.add_argument("--follow", help="grade rows from a run CSV another process is writing, instead of running trials")
+    parser.add_argument("--idle-exit", type=float, default=FOLLOW_IDLE_EXIT,
+                        help="follow mode: stop after this many seconds without a new row")
+    args = parser.parse_args()
+
+    t0 = time.monotonic()
+    if args.follow:
+        run_id = os.path.splitext(os.path.basename(args.follow))[0].replace("run_", "", 1)
+        output_csv = os.path.join(os.path.dirname(os.path.abspath(args.follow)), f"graded_{run_id}.csv")
+        run_fields = wait_for_header(args.follow)
+    else:
+        import holiday_test_v3 as runner
+        output_csv = os.path.join(grader.DATA_DIR, f"graded_{runner.RUN_ID}.csv")
+        run_fields = runner.FIELDNAMES
+
+    grader.get_grade_cache()
+    log("=" * 60)
+    log("HOLIDAY PIPELINE - RUN + GRADE")
+    log(f"Source: {args.follow or 'holiday_test_v3 (in-process)'}")
+    log(f"Grader: {', '.join(grader.grader_models())} x {grader.GRADER_WORKERS} workers")
+    log(f"Graded output: {output_csv}")
+    log("=" * 60)
+
+    pipe = PipelineGrader(output_csv, list(run_fields) + grader.GRADED_FIELDS)
+    pipe.start()
+
+    if args.follow:
+        follow_csv(args.follow, pipe.submit, idle_exit=args.idle_exit)
+    else:
+        runner.ON_TRIAL_DONE = pipe.submit
+        runner.run_experiment()  # grader workers pick rows up while this runs
+    produced_at = time.monotonic()
+    log(f"Trials finished after {produced_at - t0:.0f}s - {pipe.queue.qsize()} still waiting for a grader")
+
+    pipe.finish()
+    done_at = time.monotonic()
+    log("=" * 60)
+    log(pipe.governor.summary())
+    log(f"✓ {pipe.n_graded} graded, ✗ {pipe.n_failed} failed, {pipe.n_skipped} trial rows not gradeable")
+    log(f"Total {done_at - t0:.0f}s (grading finished {done_at - produced_at:.0f}s after the last trial)")
+    log(f"COMPLETE! Wrote {pipe.n_graded + pipe.n_failed} graded results to {output_csv}")
+    log("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
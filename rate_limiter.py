@@ -0,0 +1,192 @@
+"""
+Adaptive rate limiting, shared by every call that goes through api_transport.
+
+One limiter per (provider, model): a token bucket whose refill rate moves
+AIMD-style - creeps up by INCREASE_STEP on every success, halves on a 429.
+Retry-After and x-ratelimit-* headers override the guesswork whenever the
+provider tells us its real limit: a 429 that says when its window resets
+pauses the limiter until then and leaves the rate where it was, so one burst
+of 429s doesn't hold the rest of the run at a fraction of its pace. Replaces
+the old fixed sleeps.
+"""
+
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# === CONFIGURATION ===
+INITIAL_RATE = 2.0      # requests/sec each limiter starts at (seed_limiter raises it to the caller's concurrency)
+PROVIDER_INITIAL_RATE = {  # per-provider starting rates (req/s), override INITIAL_RATE
+    # "x-ai": 1.0,
+}
+MIN_RATE = 0.05         # never slower than one request per 20 s
+MAX_RATE = 20.0
+BURST = 4               # bucket size - how many calls may start back-to-back
+INCREASE_STEP = 0.1     # additive increase (req/s) per successful call
+DECREASE_FACTOR = 0.5   # multiplicative decrease on a 429
+
+# Exponential backoff with full jitter: uniform(0, min(CAP, BASE * 2**attempt))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+
+def backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry number `attempt` (0-based), full jitter."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+_duration_re = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_duration_units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value) -> float:
+    """Seconds until a rate-limit window resets, from any of the header styles we see.
+
+    OpenAI sends durations ("1s", "6m0s", "20ms"), OpenRouter sends an epoch in
+    milliseconds, others send epoch seconds or plain seconds. None if unreadable.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+
+    parts = _duration_re.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _duration_units[u] for n, u in parts)
+
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    if number > 1e12:  # epoch milliseconds
+        return max(number / 1000.0 - time.time(), 0.0)
+    if number > 1e9:   # epoch seconds
+        return max(number - time.time(), 0.0)
+    return max(number, 0.0)
+
+
+def parse_retry_after(headers) -> float:
+    """Retry-After in seconds (delta-seconds or HTTP-date), None if absent."""
+    value = headers.get("retry-after") if headers else None
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _remaining_and_reset(headers):
+    """(requests remaining, seconds to reset) from x-ratelimit-* headers, if present."""
+    if not headers:
+        return None, None
+    remaining = headers.get("x-ratelimit-remaining-requests", headers.get("x-ratelimit-remaining"))
+    reset = headers.get("x-ratelimit-reset-requests", headers.get("x-ratelimit-reset"))
+    try:
+        remaining = int(float(remaining)) if remaining is not None else None
+    except ValueError:
+        remaining = None
+    return remaining, parse_reset(reset)
+
+
+class AdaptiveLimiter:
+    """Token bucket with an AIMD-controlled refill rate and a hard cooldown."""
+
+    def __init__(self, name: str, rate: float = INITIAL_RATE, burst: int = BURST):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.n_throttled = 0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Block until this call is allowed to start."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _block_for(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def on_success(self, headers=None):
+        """Additive increase; respect an exhausted window if the headers say so."""
+        remaining, reset = _remaining_and_reset(headers)
+        with self._lock:
+            self.rate = min(MAX_RATE, self.rate + INCREASE_STEP)
+            if remaining == 0 and reset:
+                self._block_for(reset)
+
+    def on_throttle(self, headers=None, attempt: int = 0) -> float:
+        """Cooldown after a 429, plus a multiplicative decrease if the provider didn't say how long.
+
+        Returns the cooldown applied (seconds).
+        """
+        delay = parse_retry_after(headers)
+        if delay is None:
+            _, delay = _remaining_and_reset(headers)
+        told = delay is not None
+        if not told:
+            delay = backoff_delay(attempt)
+        with self._lock:
+            self.n_throttled += 1
+            if not told:
+                self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+            self._tokens = 0.0
+            self._block_for(delay)
+        return delay
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_of(model: str) -> str:
+    """'openai/gpt-5.1' -> 'openai' (OpenRouter model slugs are provider/model)."""
+    return model.split("/", 1)[0] if "/" in model else model
+
+
+def get_limiter(model: str) -> AdaptiveLimiter:
+    """Shared limiter for this model, e.g. 'openai/gpt-5.1' -> key ('openai', 'openai/gpt-5.1')."""
+    provider = provider_of(model)
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(f"{provider}:{model}", rate=PROVIDER_INITIAL_RATE.get(provider, INITIAL_RATE))
+            _limiters[key] = limiter
+    return limiter
+
+
+def seed_limiter(model: str, concurrency: int):
+    """Start this model's limiter no tighter than `concurrency` calls in flight.
+
+    A burst of `concurrency` calls and as many per second, so a fresh run isn't
+    paced by INITIAL_RATE while its slots sit idle; 429s bring it down from
+    there. A limiter that has already been throttled is left alone.
+    """
+    limiter = get_limiter(model)
+    with limiter._lock:
+        if limiter.n_throttled == 0:
+            limiter.burst = max(limiter.burst, concurrency)
+            limiter.rate = min(MAX_RATE, max(limiter.rate, float(concurrency)))
+            limiter._tokens = float(limiter.burst)
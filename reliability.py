@@ -0,0 +1,204 @@
+"""
+Grader reliability: grade the same answers repeatedly and measure the noise.
+
+Each chosen case is re-graded (fresh random blind ID every time, grade cache
+bypassed) on a worker pool. After every grading the case's running mean and
+variance are updated (Welford); once a case has MIN_REPS gradings and the 95% CI
+of its total score is narrower than CI_TARGET, it gets no more reps. MAX_REPS
+caps the rest. Finishes with per-dimension grader noise and ICC(1).
+
+Output is a logs/grader_validation_<run>.csv in the same layout as the existing
+validation files, so old files can be re-analysed with --report.
+
+    python reliability.py                                    # cases from VALIDATION_CSV
+    python reliability.py --cases 019-N-C 008-M-E --max-reps 12
+    python reliability.py --sample 12                        # random cases from ANSWERS_CSV
+    python reliability.py --report logs/grader_validation_20251210_195004.csv
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import grader_robusto_v3 as grader
+from csv_index import CsvIndex
+from grading_stats import RunningStats, icc_oneway, within_case_sd
+
+# === CONFIGURATION ===
+HERE = os.path.dirname(os.path.abspath(__file__))
+VALIDATION_CSV = os.path.join(HERE, "logs", "grader_validation_20251210_195004.csv")  # default case list
+ANSWERS_CSV = os.path.join(HERE, "merged_graded_minimal_with_batch.csv")  # case_id -> task/output
+OUTPUT_CSV = os.path.join(grader.LOG_DIR, f"grader_validation_{grader.RUN_ID}.csv")
+
+MIN_REPS = 3        # never judge a case's spread on fewer gradings than this
+MAX_REPS = 10       # hard cap per case
+CI_TARGET = 4.0     # stop a case once the 95% CI of its total score is narrower than this (points)
+STOP_ON = "total_score"
+
+SCORE_COLUMNS = ["content_score", "reasoning_score", "communication_score", "total_score"]
+FIELDNAMES = ["case_id", "category", "task", "rep", "blind_id", "grader_model"] + SCORE_COLUMNS
+
+log = grader.log
+
+
+def load_csv(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def grade_rep(case_id: str, rep: int, row: dict) -> dict:
+    blind_id = f"B{random.randint(100, 999)}"
+    result = grader.grade_one_answer(blind_id, row["task"], row["output"])
+    out = {"case_id": case_id, "category": row.get("category", ""), "task": row["task"], "rep": rep,
+           "blind_id": blind_id, "grader_model": grader.grader_models()[0]}
+    out.update({c: result[c] for c in SCORE_COLUMNS})
+    return out
+
+
+def run_reps(cases: dict, workers: int, writer, out_f) -> dict:
+    """Grade until every case is precise enough or capped. Returns case_id -> {column: RunningStats}."""
+    stats = {c: {col: RunningStats() for col in SCORE_COLUMNS} for c in cases}
+    scheduled = {c: 0 for c in cases}
+    stopped = {}  # case_id -> reason
+
+    def next_case():
+        open_cases = [c for c in cases if c not in stopped and scheduled[c] < MAX_REPS]
+        return min(open_cases, key=lambda c: scheduled[c]) if open_cases else None
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(in_flight) < workers:
+                case_id = next_case()
+                if case_id is None:
+                    break
+                scheduled[case_id] += 1
+                future = pool.submit(grade_rep, case_id, scheduled[case_id], cases[case_id])
+                in_flight[future] = case_id
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                case_id = in_flight.pop(future)
+                out = future.result()
+                writer.writerow(out)
+                out_f.flush()
+                if out["total_score"] is None:
+                    log(f"    ✗ {case_id} rep {out['rep']} failed")
+                    continue
+                for col in SCORE_COLUMNS:
+                    if out[col] is not None:
+                        stats[case_id][col].add(out[col])
+
+                s = stats[case_id][STOP_ON]
+                if case_id not in stopped:
+                    if s.n >= MIN_REPS and s.ci_width() <= CI_TARGET:
+                        stopped[case_id] = f"CI {s.ci_width():.1f} after {s.n}"
+                        log(f"  ✓ {case_id} precise enough: mean {s.mean:.1f}, CI width {s.ci_width():.1f} "
+                            f"after {s.n} reps")
+                    elif scheduled[case_id] >= MAX_REPS and not any(c == case_id for c in in_flight.values()):
+                        stopped[case_id] = f"cap {MAX_REPS}"
+                        log(f"  ⏸ {case_id} hit MAX_REPS: mean {s.mean:.1f}, CI width {s.ci_width():.1f}")
+    return stats
+
+
+def report(groups_by_column: dict, n_calls: int = None, n_cases: int = None):
+    """Log per-dimension noise and ICC for {column: [per-case score lists]}."""
+    log("")
+    log(f"{'dimension':22s} {'noise SD':>9s} {'ICC(1)':>8s}")
+    for col in SCORE_COLUMNS:
+        groups = groups_by_column[col]
+        noise = within_case_sd(groups)
+        icc = icc_oneway(groups)
+        log(f"{col:22s} {noise if noise is not None else float('nan'):9.2f} "
+            f"{icc if icc is not None else float('nan'):8.3f}")
+    if n_calls is not None and n_cases:
+        log(f"{n_calls} grader calls for {n_cases} cases "
+            f"(fixed {MAX_REPS} reps would have been {MAX_REPS * n_cases})")
+
+
+def report_file(path: str):
+    """Noise/ICC for an existing validation CSV."""
+    rows = load_csv(path)
+    log(f"Reliability of {path} ({len(rows)} gradings)")
+    case_ids = sorted({r["case_id"] for r in rows})
+    groups = {col: [[float(r[col]) for r in rows if r["case_id"] == c and r[col] not in ("", "None")]
+                    for c in case_ids] for col in SCORE_COLUMNS}
+    for c in case_ids:
+        totals = groups["total_score"][case_ids.index(c)]
+        s = RunningStats()
+        for x in totals:
+            s.add(x)
+        log(f"  {c:10s} n={s.n:2d}  total {s.mean:6.1f} ± {s.sd:4.1f}  CI width {s.ci_width():5.1f}")
+    report(groups)
+
+
+def main():
+    global MIN_REPS, MAX_REPS, CI_TARGET
+    parser = argparse.ArgumentParser(description="Repeat-grading reliability with early stopping")
+    parser.add_argument("--cases", nargs="+", help="case_ids to re-grade")
+    parser.add_argument("--sample", type=int, help="re-grade this many random cases from the answers CSV")
+    parser.add_argument("--validation", default=VALIDATION_CSV, help="take the case list from this validation CSV")
+    parser.add_argument("--answers", default=ANSWERS_CSV)
+    parser.add_argument("--min-reps", type=int, default=MIN_REPS)
+    parser.add_argument("--max-reps", type=int, default=MAX_REPS)
+    parser.add_argument("--ci-target", type=float, default=CI_TARGET)
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--report", help="only analyse an existing validation CSV")
+    args = parser.parse_args()
+    MIN_REPS, MAX_REPS, CI_TARGET = args.min_reps, args.max_reps, args.ci_target
+
+    if args.report:
+        report_file(args.report)
+        return 0
+
+    grader.USE_GRADE_CACHE = False  # a cached grade would just repeat itself
+
+    categories = {}
+    with CsvIndex(args.answers, key_columns=("case_id",)) as answers:  # looks up only the cases used
+        if args.cases:
+            case_ids = args.cases
+        elif args.sample:
+            case_ids = random.sample(sorted(answers.keys()), min(args.sample, len(answers.keys())))
+        else:
+            validation = load_csv(args.validation)
+            categories = {r["case_id"]: r.get("category", "") for r in validation}
+            case_ids = sorted(categories)
+        missing = [c for c in case_ids if c not in answers]
+        cases = {c: dict(answers[c], category=categories.get(c, "")) for c in case_ids if c in answers}
+
+    if missing:
+        log(f"⚠ No answer text for {missing} in {args.answers} - skipped")
+    if not cases:
+        log("ERROR: no cases to grade.")
+        return 1
+
+    log("=" * 60)
+    log(f"GRADER RELIABILITY - {grader.grader_models()[0]}")
+    log(f"{len(cases)} cases, {MIN_REPS}-{MAX_REPS} reps each, stop at 95% CI width <= {CI_TARGET} on {STOP_ON}")
+    log(f"Output: {args.output}")
+    log("=" * 60)
+
+    with open(args.output, "w", newline="", encoding="utf-8") as out_f:
+        writer = csv.DictWriter(out_f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        stats = run_reps(cases, max(1, grader.GRADER_WORKERS), writer, out_f)
+
+    rows = load_csv(args.output)
+    groups = {col: [[float(r[col]) for r in rows if r["case_id"] == c and r[col] not in ("", "None")]
+                    for c in cases] for col in SCORE_COLUMNS}
+    log("")
+    for c in cases:
+        s = stats[c][STOP_ON]
+        log(f"  {c:10s} n={s.n:2d}  total {s.mean:6.1f} ± {s.sd:4.1f}  CI width {s.ci_width():5.1f}")
+    report(groups, n_calls=len(rows), n_cases=len(cases))
+    log("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Repair pass: find the failed rows of a run, redo just those, merge the fixes.
+
+Scans runner output (run_*.csv) and grader output (graded_*.csv) and sorts every
+failure into a stage and a kind:
+
+    run   api_error    runner wrote an "ERROR: ..." row
+    run   empty        trial came back with no answer text
+    run   truncation   answer cut off (stream cut-off, or turn 2 used all its max_tokens)
+    grade api_error    grader call kept failing ("ERROR after N attempts")
+    grade empty        grader kept replying with nothing usable
+    grade truncation   grader reply stopped partway (some score lines, no total)
+    grade unparseable  grader replied but no scores could be read
+    grade missing      answer was never graded at all
+
+Failed trials are run again (holiday_test_v3.run_two_turn_trial) and graded;
+failed gradings are only re-graded. Fixed rows are merged into the master CSV
+(merged_graded_minimal_with_batch.csv layout), replacing the row with the same
+case_id/model/grader_model or adding it, with grader_batch = "repair_<run id>".
+Anything already scored in the master is left alone, so the pass can be run
+again after a partial repair and only does what's left.
+
+    python repair.py --graded data/graded_20251211_135942.csv --dry-run
+    python repair.py --run data/run_20251211_084623.csv --graded data/graded_20251211_135942.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import grader_robusto_v3 as grader
+from checkpoint import rewrite_rows
+
+# === CONFIGURATION ===
+HERE = os.path.dirname(os.path.abspath(__file__))
+MASTER_CSV = os.path.join(HERE, "merged_graded_minimal_with_batch.csv")
+MASTER_FIELDS = ["case_id", "phase", "grader_batch", "timestamp", "model", "grader_model", "task", "prime",
+                 "trial_num", "content_score", "reasoning_score", "communication_score", "total_score", "output"]
+MASTER_KEY = ("case_id", "model", "grader_model")
+
+RUN_MAX_TOKENS = 8000  # turn-2 max_tokens in holiday_test_v3 - an answer using all of it was cut off
+BATCH_PREFIX = "repair_"
+
+TRIAGE_FIELDS = ["case_id", "model", "grader_model", "stage", "kind", "detail", "result"]
+
+log = grader.log
+
+
+def load_csv(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def master_key(row: dict) -> tuple:
+    return tuple(row.get(k, "") for k in MASTER_KEY)
+
+
+# =========================
+# TRIAGE
+# =========================
+
+def classify_trial(row: dict):
+    """Failure kind of a runner row ('api_error' / 'empty' / 'truncation'), or None if it's fine."""
+    output = row.get("output") or ""
+    if output.startswith("ERROR:"):
+        return "api_error"
+    if not output.strip():
+        return "empty"
+    if str(row.get("stream_cut_off", "")).strip().lower() == "true":
+        return "truncation"
+    try:
+        if int(float(row.get("total_tokens") or 0)) >= RUN_MAX_TOKENS:
+            return "truncation"
+    except ValueError:
+        pass
+    return None
+
+
+def classify_grade(row: dict):
+    """Failure kind of a graded row, or None if it has a total score."""
+    if grader.grade_succeeded(row):
+        return None
+    raw = row.get("grader_raw") or ""
+    if raw.startswith("ERROR after"):
+        return "api_error"
+    if raw.startswith("ERROR") or not raw.strip():
+        return "empty"
+    if any(score is not None for score in grader.parse_scores(raw)) or grader.parse_json_scores(raw):
+        return "truncation"
+    return "unparseable"
+
+
+def triage(run_rows: list, graded_rows: list, master: dict) -> list:
+    """List of failures as dicts (TRIAGE_FIELDS + "row"), skipping keys the master already has scored."""
+    models = grader.grader_models()
+    graded = {}
+    for row in graded_rows:
+        graded.setdefault((row.get("case_id"), row.get("model")), {})[row.get("grader_model")] = row
+
+    # Every trial we know of: run CSVs first, then trials only seen in graded CSVs
+    trials = {(r.get("case_id"), r.get("model")): r for r in run_rows}
+    for key, by_grader in graded.items():
+        trials.setdefault(key, next(iter(by_grader.values())))
+
+    failures = []
+    for (case_id, model), trial in trials.items():
+        graders = list(graded.get((case_id, model), {})) or models
+        open_graders = [g for g in graders if not grader.grade_succeeded(master.get((case_id, model, g), {}))]
+        if not open_graders or str(trial.get("task", "")).lower() not in grader.RUBRIC_MAP:
+            continue
+
+        kind = classify_trial(trial)
+        if kind:
+            for g in open_graders:
+                failures.append({"case_id": case_id, "model": model, "grader_model": g, "stage": "run",
+                                 "kind": kind, "detail": (trial.get("output") or "")[:120], "row": trial})
+            continue
+
+        for g in open_graders:
+            graded_row = graded.get((case_id, model), {}).get(g)
+            kind = classify_grade(graded_row) if graded_row else "missing"
+            if kind:
+                failures.append({"case_id": case_id, "model": model, "grader_model": g, "stage": "grade",
+                                 "kind": kind, "detail": (graded_row or {}).get("grader_raw", "")[:120],
+                                 "row": graded_row or trial})
+    return failures
+
+
+def log_triage(failures: list):
+    counts = {}
+    for f in failures:
+        counts[(f["stage"], f["kind"])] = counts.get((f["stage"], f["kind"]), 0) + 1
+    log(f"{len(failures)} failed rows:")
+    for (stage, kind), n in sorted(counts.items()):
+        log(f"    {stage:6s} {kind:12s} {n:4d}")
+
+
+# =========================
+# REPAIR
+# =========================
+
+def rerun_trials(failures: list) -> dict:
+    """Run the failed trials again. Returns (case_id, model) -> new runner row."""
+    import holiday_test_v3 as runner
+
+    todo = {}
+    for f in failures:
+        if f["stage"] == "run":
+            todo[(f["case_id"], f["model"])] = f["row"]
+    if not todo:
+        return {}
+    log(f"Re-running {len(todo)} trials...")
+
+    def rerun(row):
+        prime, task, trial_num = row["prime"], row["task"], int(row["trial_num"])
+        try:
+            new_row = runner.run_two_turn_trial(prime, task, trial_num, row["model"])
+        except Exception as e:
+            new_row = runner.make_error_row(row["model"], prime, task, trial_num, e)
+        kind = classify_trial(new_row)
+        log(f"    {'✗' if kind else '✓'} {new_row['case_id']} {row['model']}" + (f" still {kind}" if kind else ""))
+        return new_row
+
+    with ThreadPoolExecutor(max_workers=max(1, runner.MAX_CONCURRENCY)) as pool:
+        new_rows = list(pool.map(rerun, todo.values()))
+    return {(r["case_id"], r["model"]): r for r in new_rows}
+
+
+def regrade(failures: list, new_trials: dict, graded_rows: list) -> list:
+    """Grade every failure whose trial is usable now. Returns (failure, out_row) pairs."""
+    # Keep each answer's blind ID; brand-new gradings continue the numbering
+    blind_ids = {(r.get("case_id"), r.get("model")): r["blind_id"] for r in graded_rows if r.get("blind_id")}
+    next_blind = 1 + max([int(b[1:]) for b in blind_ids.values() if b[1:].isdigit()] or [0])
+
+    jobs = []
+    for f in failures:
+        key = (f["case_id"], f["model"])
+        row = new_trials.get(key, f["row"]) if f["stage"] == "run" else f["row"]
+        if classify_trial(row):
+            f["result"] = "run failed again"
+            continue
+        if key not in blind_ids:
+            blind_ids[key] = f"B{next_blind:03d}"
+            next_blind += 1
+        # Graded rows carry the old grade columns - start from the trial columns only
+        trial = {k: v for k, v in row.items() if k not in grader.GRADED_FIELDS}
+        jobs.append((f, blind_ids[key], trial))
+    if not jobs:
+        return []
+
+    log(f"Re-grading {len(jobs)} answers...")
+    n_models = len({f["grader_model"] for f, _, _ in jobs})
+    with ThreadPoolExecutor(max_workers=max(1, grader.GRADER_WORKERS) * n_models) as pool:
+        out_rows = list(pool.map(
+            lambda i: grader.grade_job(i + 1, len(jobs), jobs[i][1], jobs[i][2], jobs[i][0]["grader_model"]),
+            range(len(jobs))))
+    for (f, _, _), out_row in zip(jobs, out_rows):
+        f["result"] = "fixed" if out_row["total_score"] is not None else "grade failed again"
+    return [(f, out_row) for (f, _, _), out_row in zip(jobs, out_rows)]
+
+
+def merge_into_master(path: str, fixed: list, batch: str, phase: str = None) -> int:
+    """Replace/add the successfully repaired rows in the master CSV. Returns how many were merged."""
+    rows = load_csv(path) if os.path.exists(path) else []
+    fieldnames = MASTER_FIELDS
+    if rows:
+        with open(path, newline="", encoding="utf-8") as f:
+            fieldnames = next(csv.reader(f))
+    index = {master_key(r): i for i, r in enumerate(rows)}
+
+    n_merged = 0
+    for f, out_row in fixed:
+        if out_row["total_score"] is None:
+            continue
+        key = master_key(out_row)
+        previous = rows[index[key]] if key in index else {}
+        merged = {k: out_row.get(k, previous.get(k, "")) for k in fieldnames}
+        merged["grader_batch"] = batch
+        if "phase" in fieldnames:
+            merged["phase"] = phase if phase is not None else previous.get("phase", "")
+        if key in index:
+            rows[index[key]] = merged
+        else:
+            index[key] = len(rows)
+            rows.append(merged)
+        n_merged += 1
+
+    rewrite_rows(path, fieldnames, rows)
+    return n_merged
+
+
+def write_csv(path: str, fieldnames: list, rows: list):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Triage failed rows, redo them, merge into the master CSV")
+    parser.add_argument("--run", nargs="*", default=[], help="runner output CSV(s)")
+    parser.add_argument("--graded", nargs="*", default=[], help="grader output CSV(s)")
+    parser.add_argument("--master", default=MASTER_CSV)
+    parser.add_argument("--phase", help="phase value for rows new to the master (default: keep / blank)")
+    parser.add_argument("--dry-run", action="store_true", help="only classify and list the failures")
+    args = parser.parse_args()
+    if not args.run and not args.graded:
+        parser.error("give at least one --run or --graded CSV")
+
+    batch = BATCH_PREFIX + grader.RUN_ID
+    triage_csv = os.path.join(grader.LOG_DIR, f"repair_{grader.RUN_ID}.csv")
+    log("=" * 60)
+    log(f"REPAIR PASS - {batch}")
+    for path in args.run + args.graded:
+        log(f"Scanning: {path}")
+    log(f"Master: {args.master}")
+    log("=" * 60)
+
+    run_rows = [r for path in args.run for r in load_csv(path)]
+    graded_rows = [r for path in args.graded for r in load_csv(path)]
+    master = {master_key(r): r for r in load_csv(args.master)} if os.path.exists(args.master) else {}
+    failures = triage(run_rows, graded_rows, master)
+    log_triage(failures)
+    for f in failures:
+        f["result"] = "not attempted"
+    if not failures or args.dry_run:
+        write_csv(triage_csv, TRIAGE_FIELDS, failures)
+        log(f"Triage written to {triage_csv}")
+        return 0
+
+    new_trials = rerun_trials(failures)
+    if new_trials:
+        import holiday_test_v3 as runner
+        run_csv = os.path.join(grader.DATA_DIR, f"run_REPAIR_{grader.RUN_ID}.csv")
+        write_csv(run_csv, runner.FIELDNAMES, new_trials.values())
+        log(f"Re-run trials written to {run_csv}")
+
+    fixed = regrade(failures, new_trials, graded_rows)
+    if fixed:
+        graded_csv = os.path.join(grader.DATA_DIR, f"graded_REPAIR_{grader.RUN_ID}.csv")
+        fieldnames = list(dict.fromkeys(k for _, out_row in fixed for k in out_row))
+        write_csv(graded_csv, fieldnames, [out_row for _, out_row in fixed])
+        log(f"Re-graded rows written to {graded_csv}")
+
+    n_merged = merge_into_master(args.master, fixed, batch, args.phase) if fixed else 0
+    write_csv(triage_csv, TRIAGE_FIELDS, failures)
+
+    log("=" * 60)
+    results = {}
+    for f in failures:
+        results[f["result"]] = results.get(f["result"], 0) + 1
+    log("Results: " + ", ".join(f"{n} {result}" for result, n in sorted(results.items())))
+    log(f"COMPLETE! Merged {n_merged} repaired rows into {args.master} (grader_batch={batch})")
+    log(f"Triage: {triage_csv}")
+    log("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
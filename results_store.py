@@ -0,0 +1,252 @@
+"""
+Columnar results store: numbers in arrays, long text out of line.
+
+The run/graded CSVs carry every answer inline, so even "just load the scores"
+means parsing megabytes of text. A store directory splits that up:
+
+    <store>/columns.npz        one array per column - float64 for numeric columns
+                               (NaN = missing), fixed-width unicode for short strings
+    <store>/text_refs.npz      per long-text column, the sha256 of each row's text
+    <store>/blobs/ab/<sha256>.gz   the text itself, gzip'd, stored once per distinct value
+
+np.load() on an .npz is lazy per column, so load_columns(store, ["total_score"])
+never touches the answers.
+
+    python results_store.py import merged_graded_minimal_with_batch.csv results_store
+    python results_store.py show results_store
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+# Columns that hold long free text -> blob store
+TEXT_COLUMNS = ("output", "assistant_ack", "reasoning", "grader_raw")
+
+# Columns that look numeric but are really labels
+FORCE_STRING_COLUMNS = ("case_id", "blind_id", "timestamp")
+
+COLUMNS_FILE = "columns.npz"
+TEXT_REFS_FILE = "text_refs.npz"
+BLOB_DIR = "blobs"
+
+
+def _to_float(value) -> float:
+    if value is None:
+        return math.nan
+    value = str(value).strip()
+    if value in ("", "None", "nan", "NaN"):
+        return math.nan
+    if value in ("True", "False"):
+        return 1.0 if value == "True" else 0.0
+    return float(value)
+
+
+def _is_numeric_column(values: list) -> bool:
+    try:
+        for v in values:
+            _to_float(v)
+    except ValueError:
+        return False
+    return True
+
+
+# =========================
+# BLOBS
+# =========================
+
+def text_ref(text: str) -> str:
+    """Content address for a piece of text ('' for empty/missing text)."""
+    if not text:
+        return ""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _blob_path(store_dir: str, ref: str) -> str:
+    return os.path.join(store_dir, BLOB_DIR, ref[:2], ref + ".gz")
+
+
+def put_blob(store_dir: str, text: str) -> str:
+    """Store text once (no-op if already present) and return its ref."""
+    ref = text_ref(text)
+    if not ref:
+        return ref
+    path = _blob_path(store_dir, ref)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            f.write(text.encode("utf-8"))
+        os.replace(tmp_path, path)
+    return ref
+
+
+def read_blob(store_dir: str, ref: str) -> str:
+    """Text for a ref ('' for the empty ref)."""
+    if not ref:
+        return ""
+    with gzip.open(_blob_path(store_dir, ref), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+# =========================
+# TABLES
+# =========================
+
+def write_store(rows: list, store_dir: str):
+    """Write rows (list of dicts, e.g. from csv.DictReader) as a store, replacing any existing table.
+
+    Blobs are never deleted, so re-writing a store after adding rows only adds new text.
+    """
+    if not rows:
+        raise ValueError("No rows to store")
+    os.makedirs(store_dir, exist_ok=True)
+
+    # Every column any row has, in first-seen order (rows from older runs lack newer columns)
+    columns = list(dict.fromkeys(k for r in rows for k in r))
+    arrays = {}
+    refs = {}
+
+    for col in columns:
+        values = [r.get(col) for r in rows]
+        if col in TEXT_COLUMNS:
+            refs[col] = np.array([put_blob(store_dir, v or "") for v in values], dtype="U64")
+        elif col not in FORCE_STRING_COLUMNS and _is_numeric_column(values):
+            arrays[col] = np.array([_to_float(v) for v in values], dtype=np.float64)
+        else:
+            arrays[col] = np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+    # Keep the original column order so the table round-trips to the same CSV layout
+    arrays["__columns__"] = np.array(columns, dtype=str)
+
+    for name, payload in ((COLUMNS_FILE, arrays), (TEXT_REFS_FILE, refs)):
+        tmp_path = os.path.join(store_dir, name + ".tmp.npz")
+        np.savez(tmp_path, **payload)
+        os.replace(tmp_path, os.path.join(store_dir, name))
+
+
+def import_csv(csv_path: str, store_dir: str) -> int:
+    """Convert a run/graded CSV into a store. Returns the number of rows."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    write_store(rows, store_dir)
+    return len(rows)
+
+
+def load_columns(store_dir: str, columns=None) -> dict:
+    """Load the requested non-text columns (default: all) as NumPy arrays."""
+    with np.load(os.path.join(store_dir, COLUMNS_FILE), allow_pickle=False) as data:
+        names = [c for c in data.files if c != "__columns__"]
+        wanted = names if columns is None else columns
+        missing = [c for c in wanted if c not in names]
+        if missing:
+            raise KeyError(f"Columns not in store (text columns need load_text_refs): {missing}")
+        return {c: data[c] for c in wanted}
+
+
+def load_scores(store_dir: str) -> dict:
+    """case_id plus the four score columns - the usual starting point for analysis."""
+    return load_columns(store_dir, [
+        "case_id", "content_score", "reasoning_score", "communication_score", "total_score",
+    ])
+
+
+def load_text_refs(store_dir: str, column: str) -> np.ndarray:
+    """sha256 refs for one text column (resolve with read_blob)."""
+    with np.load(os.path.join(store_dir, TEXT_REFS_FILE), allow_pickle=False) as data:
+        return data[column]
+
+
+def load_text(store_dir: str, column: str, index: int) -> str:
+    """Text of one cell, e.g. load_text(store, "output", 17)."""
+    return read_blob(store_dir, str(load_text_refs(store_dir, column)[index]))
+
+
+def read_rows(store_dir: str, with_text: bool = True) -> list:
+    """Reassemble the table as a list of dicts (the CSV view), optionally with text."""
+    with np.load(os.path.join(store_dir, COLUMNS_FILE), allow_pickle=False) as data:
+        columns = [str(c) for c in data["__columns__"]]
+        arrays = {c: data[c] for c in data.files if c != "__columns__"}
+    with np.load(os.path.join(store_dir, TEXT_REFS_FILE), allow_pickle=False) as data:
+        text_refs = {c: data[c] for c in data.files}
+
+    n = len(next(iter(arrays.values()))) if arrays else len(next(iter(text_refs.values())))
+    rows = []
+    for i in range(n):
+        row = {}
+        for col in columns:
+            if col in text_refs:
+                row[col] = read_blob(store_dir, str(text_refs[col][i])) if with_text else str(text_refs[col][i])
+            else:
+                value = arrays[col][i]
+                if arrays[col].dtype.kind == "f":
+                    row[col] = "" if math.isnan(value) else (int(value) if value.is_integer() else float(value))
+                else:
+                    row[col] = str(value)
+        rows.append(row)
+    return rows
+
+
+def append_rows(store_dir: str, new_rows: list):
+    """Add rows to an existing store (rewrites the small column files, adds blobs).
+
+    Columns new to the store are added, blank for the rows already in it.
+    """
+    if not os.path.exists(os.path.join(store_dir, COLUMNS_FILE)):
+        write_store(new_rows, store_dir)
+        return
+    write_store(read_rows(store_dir) + list(new_rows), store_dir)
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar results store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_import = sub.add_parser("import", help="convert a run/graded CSV into a store")
+    p_import.add_argument("csv_path")
+    p_import.add_argument("store_dir")
+    p_show = sub.add_parser("show", help="load the scores and print a summary")
+    p_show.add_argument("store_dir")
+    p_export = sub.add_parser("export", help="write a store back out as CSV")
+    p_export.add_argument("store_dir")
+    p_export.add_argument("csv_path")
+    args = parser.parse_args()
+
+    if args.cmd == "import":
+        t0 = time.perf_counter()
+        n = import_csv(args.csv_path, args.store_dir)
+        print(f"Imported {n} rows into {args.store_dir} in {time.perf_counter() - t0:.2f}s")
+
+    elif args.cmd == "show":
+        t0 = time.perf_counter()
+        cols = load_columns(args.store_dir)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        n = len(next(iter(cols.values())))
+        print(f"{n} rows, {len(cols)} columns loaded in {elapsed_ms:.1f} ms (no answer text read)")
+        for name, arr in cols.items():
+            if arr.dtype.kind == "f":
+                print(f"  {name:22s} mean={np.nanmean(arr):8.2f}  missing={int(np.isnan(arr).sum())}")
+            else:
+                print(f"  {name:22s} {len(set(arr.tolist()))} distinct")
+
+    elif args.cmd == "export":
+        rows = read_rows(args.store_dir)
+        with open(args.csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Exported {len(rows)} rows to {args.csv_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Text features of the model answers - is a primed answer shorter, flatter, more hedged?
+
+char_count is the only length measure the runner records. This pass reads the
+`output` column of a run/graded CSV and writes one numeric row per answer,
+keyed by case_id (+ model, for sweeps): word and approximate token counts,
+structure (headings, bullets, numbered items), math/LaTeX density, code blocks,
+questions put back to the user, hedging and politeness markers. Markdown
+structure is counted outside code blocks only.
+
+The CSV is indexed once (csv_index) and every worker reads its own slice of
+records straight from the file, so no answer text is pickled between
+processes. Answers already in the output table are skipped, so it's cheap to
+re-run after every batch; --full recomputes everything.
+
+    python text_features.py                                   # merged master CSV
+    python text_features.py data/run_20251211_084623.csv --output logs/features_run.csv
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from csv_index import CsvIndex
+
+# === CONFIGURATION ===
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT = os.path.join(HERE, "merged_graded_minimal_with_batch.csv")
+OUTPUT = os.path.join(HERE, "logs", "text_features.csv")
+WORKERS = None          # process pool size (None = one per CPU)
+RECORDS_PER_TASK = 2000
+
+FEATURES = [
+    "chars", "words", "tokens_approx", "lines", "headings", "bullets", "numbered",
+    "math_spans", "latex_commands", "math_per_kword", "code_blocks", "question_marks", "user_questions",
+    "hedges", "hedges_per_kword", "politeness",
+]
+FIELDNAMES = ["case_id", "model"] + FEATURES
+
+HEDGES = ("might", "may", "perhaps", "possibly", "probably", "likely", "arguably", "seem", "seems", "appear to",
+          "appears to", "somewhat", "generally", "typically", "i think", "i believe", "i'm not sure", "not entirely",
+          "it depends")
+POLITENESS = ("please", "thanks", "thank you", "happy to", "glad to", "hope this helps", "hope that helps",
+              "feel free", "let me know", "great question", "sorry")
+
+_MARKERS = {m: "hedges" for m in HEDGES}
+_MARKERS.update({m: "politeness" for m in POLITENESS})
+
+_code_block_re = re.compile(r"```.*?(?:```|\Z)", re.DOTALL)
+# One pass over the lowercased text: every token, with the marker phrases tried first so
+# they come out whole (tokens start at word starts, so the leading word boundary is free)
+_token_re = re.compile(r"(?:%s)\b|\w+|[^\w\s]" % "|".join(
+    re.escape(m) for m in sorted(_MARKERS, key=len, reverse=True)))
+_line_start_re = re.compile(r"^[ \t]*(?:(#{1,6})|([-*+•])|(\d+[.)]))[ \t]", re.MULTILINE)
+_math_re = re.compile(r"\$\$.+?\$\$|\\\[.+?\\\]|\\\(.+?\\\)|(?<![\\$])\$(?=\S)[^$\n]+?(?<=\S)\$", re.DOTALL)
+_latex_command_re = re.compile(r"\\[A-Za-z]+")
+_you_re = re.compile(r"\b(?:you|your|you'd|you're|you'll)\b", re.IGNORECASE)
+
+_done = frozenset()  # (model, case_id) pairs already in the output, set per worker
+
+
+def user_questions(text: str) -> int:
+    """Sentences ending in '?' that address the reader ("Would you like ...?")."""
+    n = 0
+    pos = text.find("?")
+    while pos >= 0:
+        start = max(text.rfind(".", 0, pos), text.rfind("!", 0, pos), text.rfind("\n", 0, pos)) + 1
+        if _you_re.search(text, start, pos):
+            n += 1
+        pos = text.find("?", pos + 1)
+    return n
+
+
+def extract(text: str) -> dict:
+    """Feature dict for one answer."""
+    code_blocks = _code_block_re.findall(text) if "```" in text else []
+    prose = _code_block_re.sub("", text) if code_blocks else text
+    words = len(text.split())
+    per_kword = 1000 / words if words else 0.0
+
+    counts = {"hedges": 0, "politeness": 0}
+    tokens = _token_re.findall(prose.lower())
+    n_tokens = len(tokens)
+    for token in tokens:
+        kind = _MARKERS.get(token)
+        if kind:
+            counts[kind] += 1
+            n_tokens += token.count(" ")  # a multi-word marker came out as one token
+    if code_blocks:
+        n_tokens += sum(len(_token_re.findall(block)) for block in code_blocks)
+
+    headings = bullets = numbered = 0
+    for heading, bullet, _ in _line_start_re.findall(prose):
+        if heading:
+            headings += 1
+        elif bullet:
+            bullets += 1
+        else:
+            numbered += 1
+
+    has_math = "$" in prose or "\\" in prose
+    math_spans = len(_math_re.findall(prose)) if has_math else 0
+    return {
+        "chars": len(text),
+        "words": words,
+        "tokens_approx": n_tokens,
+        "lines": text.count("\n") + 1 if text else 0,
+        "headings": headings,
+        "bullets": bullets,
+        "numbered": numbered,
+        "math_spans": math_spans,
+        "latex_commands": len(_latex_command_re.findall(prose)) if has_math else 0,
+        "math_per_kword": round(math_spans * per_kword, 2),
+        "code_blocks": len(code_blocks),
+        "question_marks": prose.count("?"),
+        "user_questions": user_questions(prose),
+        "hedges": counts["hedges"],
+        "hedges_per_kword": round(counts["hedges"] * per_kword, 2),
+        "politeness": counts["politeness"],
+    }
+
+
+def _init_worker(done: frozenset):
+    global _done
+    _done = done
+
+
+def extract_records(path: str, start: int, stop: int) -> list:
+    """Feature rows for records start..stop-1 of an indexed CSV (runs in a worker)."""
+    out = []
+    with CsvIndex(path, save=False) as index:
+        for i in range(start, stop):
+            row = index.row(i)
+            key = (row.get("model", ""), row.get("case_id", ""))
+            text = row.get("output") or ""
+            if key in _done or not text.strip() or text.startswith("ERROR:"):
+                continue
+            out.append(dict(extract(text), case_id=key[1], model=key[0]))
+    return out
+
+
+def run_features(path: str, output: str, workers: int = WORKERS, full: bool = False) -> tuple:
+    """Append features for every answer in path that output doesn't have yet. Returns (n new, n total)."""
+    done_rows = []
+    if not full and os.path.exists(output):
+        with open(output, newline="", encoding="utf-8") as f:
+            done_rows = list(csv.DictReader(f))
+    done = frozenset((r["model"], r["case_id"]) for r in done_rows)
+
+    with CsvIndex(path) as index:  # builds/refreshes the sidecar the workers read
+        n_records = len(index)
+        if "output" not in index.fieldnames:
+            raise ValueError(f"{path} has no output column")
+    starts = list(range(0, n_records, RECORDS_PER_TASK))
+    stops = [min(start + RECORDS_PER_TASK, n_records) for start in starts]
+
+    new_rows = []
+    seen = set(done)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(done,)) as pool:
+        for rows in pool.map(extract_records, [path] * len(starts), starts, stops):
+            for row in rows:
+                key = (row["model"], row["case_id"])
+                if key not in seen:  # graded files repeat an answer once per grader
+                    seen.add(key)
+                    new_rows.append(row)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    mode = "a" if done_rows else "w"
+    with open(output, mode, newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        if mode == "w":
+            writer.writeheader()
+        writer.writerows(new_rows)
+    return len(new_rows), len(done_rows) + len(new_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Numeric text features of the model answers, by case_id")
+    parser.add_argument("input", nargs="?", default=INPUT, help="run or graded CSV with an output column")
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--full", action="store_true", help="recompute every answer, not just new ones")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    n_new, n_total = run_features(args.input, args.output, args.workers, args.full)
+    print(f"{n_new} new answers featurised in {time.perf_counter() - t0:.1f}s -> {args.output} ({n_total} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())